@@ -0,0 +1,267 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import vtk
+
+from slice_interactor import SlicePlanes
+from volume_multimodal import VolumeRenderer
+from mask_overlay import MaskOverlay
+from subject_manifest import SubjectManifest
+from volume_cache import get_volume_cache, load_volumes
+from disk_cache import DiskVolumeCache
+from intensity_stats import get_stats_engine
+from volume_mappers import get_mapper_factory, offscreen_mapper_backend
+
+MODALITIES = ['t1', 'flair', 'swi_mag', 'swi_phase']
+
+# Slicing directions as used by MRIViewer.change_slicing
+DIRECTION_AXES = {'axial': 'y', 'coronal': 'x', 'sagittal': 'z'}
+
+# Tile layout matching the viewer grid: top row T1 | SWI Mag, bottom row FLAIR | SWI Phase
+TILE_ROWS = [['t1', 'swi_mag'], ['flair', 'swi_phase']]
+
+
+class BatchScene:
+    """
+    Headless stand-in for MRIViewer that renders the four modalities offscreen.
+
+    Provides the attributes VolumeRenderer, SlicePlanes and MaskOverlay expect
+    from the viewer (camera, SlicePlanes, mask_overlay, manifest, set_view), so
+    snapshots go through exactly the same pipelines and transfer functions as
+    the interactive views.
+    """
+
+    def __init__(self, subject_path, tile_size=384, thickness=10, show_masks=True):
+        """
+        Args:
+            subject_path (str): Subject directory containing ses-YYYYMMDD folders
+            tile_size (int): Width and height of each modality tile in pixels
+            thickness (float): Slab thickness
+            show_masks (bool): Overlay lesion and PRL masks when available
+        """
+        self.subject_path = os.path.abspath(subject_path)
+        self.tile_size = tile_size
+        self.thickness = thickness
+        self.show_masks = show_masks
+
+        self.camera = vtk.vtkCamera()
+        self.mask_overlay = None
+        self.manifest = SubjectManifest(self.subject_path)
+        self.SlicePlanes = SlicePlanes(self)
+        self.SlicePlanes.thickness = thickness
+        self.renderers = {}
+
+    def set_view(self, viewUp=None, position=None, focalPoint=None):
+        """Apply camera parameters requested by SlicePlanes."""
+        if viewUp is not None:
+            self.camera.SetViewUp(viewUp)
+        if position is not None:
+            self.camera.SetPosition(position)
+        if focalPoint is not None:
+            self.camera.SetFocalPoint(focalPoint)
+
+    def load_session(self, session):
+        """
+        Show a session, building the offscreen pipelines on first use and reusing them after.
+
+        Raises:
+            FileNotFoundError: If a modality is missing from the session
+        """
+        files = []
+        for modality in MODALITIES:
+            path = self.manifest.find_file(session, modality)
+            if not path:
+                raise FileNotFoundError(f"No {modality} file found in {session}")
+            files.append(path)
+        mask_files = [self.manifest.find_file(session, role) for role in ['lesion', 'prl']]
+        mask_files = [path for path in mask_files if path] if self.show_masks else []
+
+        volumes = load_volumes(files + mask_files)
+
+        if not self.renderers:
+            for modality, filename in zip(MODALITIES, files):
+                renderer = VolumeRenderer(
+                    viewer_instance=self,
+                    frame=None,
+                    layout=None,
+                    filename=filename,
+                    modality=modality,
+                    image_data=volumes[filename],
+                    offscreen_size=(self.tile_size, self.tile_size)
+                )
+                self.renderers[modality] = renderer
+                self.SlicePlanes.addRenderer(renderer)
+            self.SlicePlanes.initPlanes()
+            for renderer in self.renderers.values():
+                renderer.set_slab_projection(get_mapper_factory().slab_projection)
+        else:
+            for modality, filename in zip(MODALITIES, files):
+                renderer = self.renderers[modality]
+                bounds = renderer.set_image(filename, volumes[filename])
+                self.SlicePlanes.updateWindowBounds(renderer.volume_mapper, bounds)
+            self.SlicePlanes.resetPlanes()
+
+        self.SlicePlanes.setSliceThickness(self.thickness)
+        self._load_masks(session, volumes, len(mask_files) == 2)
+        
+        # Persist intensity statistics so later runs skip them
+        self.manifest.save()
+
+    def _load_masks(self, session, volumes, available):
+        """Attach or swap the mask overlays of the session."""
+        session_path = os.path.join(self.subject_path, session)
+        if not available:
+            if self.mask_overlay:
+                for modality, renderer in self.renderers.items():
+                    self.mask_overlay.remove_from_renderer(renderer.renderer, modality)
+                self.mask_overlay = None
+            return
+
+        if self.mask_overlay:
+            self.mask_overlay.replace_masks(session_path, volumes)
+            return
+
+        self.mask_overlay = MaskOverlay(session_path, volumes, manifest=self.manifest)
+        self.mask_overlay.set_slice_planes(self.SlicePlanes)
+        self.mask_overlay.load_masks()
+        for modality, renderer in self.renderers.items():
+            self.mask_overlay.add_to_renderer(renderer.renderer, modality)
+
+    def set_slab(self, direction, fraction):
+        """
+        Place the slab along a slicing direction.
+
+        Args:
+            direction (str): 'axial', 'coronal' or 'sagittal'
+            fraction (float): Slab centre as a fraction of the volume extent (0-1)
+        """
+        self.SlicePlanes.setSliceDirection(DIRECTION_AXES[direction])
+        bounds = self.SlicePlanes.global_bounds
+        low = bounds[self.SlicePlanes.direction_min]
+        high = bounds[self.SlicePlanes.direction_max]
+        self.SlicePlanes.current_slice = low + fraction * (high - low) - self.SlicePlanes.thickness / 2
+        self.SlicePlanes._updateCroppingPlanes()
+
+    def render(self):
+        """Render all modalities offscreen."""
+        for renderer in self.renderers.values():
+            renderer.renderer.ResetCameraClippingRange()
+            renderer.window.Render()
+
+    def snapshot(self, filename):
+        """Render all modalities and write them tiled into one PNG."""
+        self.render()
+        tiles = {}
+        for modality, renderer in self.renderers.items():
+            grabber = vtk.vtkWindowToImageFilter()
+            grabber.SetInput(renderer.window)
+            grabber.ReadFrontBufferOff()
+            grabber.Update()
+            tiles[modality] = grabber.GetOutput()
+
+        # vtkImageAppend stacks along +y, so the bottom row goes first
+        rows = vtk.vtkImageAppend()
+        rows.SetAppendAxis(1)
+        for row in reversed(TILE_ROWS):
+            columns = vtk.vtkImageAppend()
+            columns.SetAppendAxis(0)
+            for modality in row:
+                columns.AddInputData(tiles[modality])
+            columns.Update()
+            rows.AddInputData(columns.GetOutput())
+
+        writer = vtk.vtkPNGWriter()
+        writer.SetFileName(filename)
+        writer.SetInputConnection(rows.GetOutputPort())
+        writer.Write()
+
+
+def render_subject(subject_path, output_dir, directions, positions, thickness=10,
+                   tile_size=384, show_masks=True, volume_cache_mb=None, disk_cache_dir=None,
+                   range_percentiles=None, foreground_stats=False, mapper_backend=None,
+                   render_threads=None):
+    """
+    Render snapshots of every session of one subject.
+
+    Runs in a worker process, so cache settings are passed explicitly.
+
+    Returns:
+        tuple: (subject name, number of PNGs written, seconds spent)
+    """
+    start = time.perf_counter()
+    if volume_cache_mb is not None:
+        get_volume_cache().set_budget(volume_cache_mb)
+    if disk_cache_dir:
+        get_volume_cache().set_disk_cache(DiskVolumeCache(disk_cache_dir))
+    if range_percentiles is not None:
+        get_stats_engine().configure(range_percentiles, foreground_stats)
+    # Without an explicit backend, render on the CPU: headless nodes would emulate the GPU mapper
+    get_mapper_factory().configure(offscreen_mapper_backend(mapper_backend), render_threads)
+
+    subject = os.path.basename(os.path.normpath(subject_path))
+    subject_dir = os.path.join(output_dir, subject)
+    os.makedirs(subject_dir, exist_ok=True)
+
+    scene = BatchScene(subject_path, tile_size=tile_size, thickness=thickness,
+                       show_masks=show_masks)
+    frames = 0
+    for session in scene.manifest.sessions():
+        try:
+            scene.load_session(session)
+        except FileNotFoundError as e:
+            print(f"Warning: Skipping {subject}/{session} - {str(e)}")
+            continue
+
+        for direction in directions:
+            for fraction in positions:
+                scene.set_slab(direction, fraction)
+                filename = os.path.join(
+                    subject_dir, f"{session}_{direction}_{int(round(fraction * 100)):03d}.png"
+                )
+                scene.snapshot(filename)
+                frames += 1
+
+    return subject, frames, time.perf_counter() - start
+
+
+def run_batch(subject_paths, output_dir, directions, positions, workers=None, **options):
+    """
+    Render snapshots of many subjects, spreading subjects across a process pool.
+
+    Args:
+        subject_paths (list): Subject directories
+        output_dir (str): Directory receiving one PNG folder per subject
+        directions (list): Slicing directions ('axial', 'coronal', 'sagittal')
+        positions (list): Slab centres as fractions of the volume extent
+        workers (int): Number of worker processes (default: CPU count)
+        **options: Forwarded to render_subject
+
+    Returns:
+        int: Total number of PNGs written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or min(len(subject_paths), os.cpu_count() or 1)
+
+    start = time.perf_counter()
+    total_frames = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(render_subject, path, output_dir, directions, positions, **options): path
+            for path in subject_paths
+        }
+        for future in as_completed(futures):
+            try:
+                subject, frames, seconds = future.result()
+            except Exception as e:
+                print(f"Error rendering {futures[future]}: {str(e)}")
+                continue
+            total_frames += frames
+            fps = frames / seconds if seconds > 0 else 0.0
+            print(f"{subject}: {frames} frames in {seconds:.1f} s ({fps:.2f} fps)")
+
+    elapsed = time.perf_counter() - start
+    fps = total_frames / elapsed if elapsed > 0 else 0.0
+    print(f"Batch complete: {total_frames} frames from {len(subject_paths)} subjects "
+          f"in {elapsed:.1f} s ({fps:.2f} fps, {workers} workers)")
+    return total_frames
@@ -0,0 +1,536 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import multiprocessing
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import vtk
+from vtk.util.numpy_support import numpy_to_vtk
+
+from subject_manifest import FILE_PATTERNS, MANIFEST_FILENAME
+from volume_mappers import MAPPER_BACKENDS
+from slab_projection import SLAB_PROJECTIONS
+from mapper_benchmark import DEFAULT_BENCHMARK_SIZE
+
+# Bumped whenever a measurement changes meaning, so old result files are not compared blindly
+SUITE_VERSION = 1
+
+DEFAULT_PHANTOM_SHAPE = (128, 128, 96)
+DEFAULT_PHANTOM_SESSIONS = 4
+DEFAULT_PHANTOM_LESIONS = 12
+DEFAULT_SUITE_FRAMES = 20
+
+# Sessions are dated this many days apart from the first one
+PHANTOM_FIRST_SESSION = date(2020, 1, 6)
+PHANTOM_SESSION_INTERVAL_DAYS = 91
+
+# Intensity of (background, CSF, grey matter, white matter, lesion) per magnitude modality
+PHANTOM_INTENSITIES = {
+    't1': (0, 300, 650, 850, 450),
+    'flair': (0, 150, 550, 450, 950),
+    'swi_mag': (0, 700, 550, 600, 500),
+}
+
+# Labels of the phantom tissue map
+_BACKGROUND, _CSF, _GREY, _WHITE = 0, 1, 2, 3
+
+
+def parse_shape(value):
+    """Parse a matrix size such as '256x256x180', or a single number for a cube."""
+    try:
+        shape = tuple(int(item) for item in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid matrix size: {value}")
+    if len(shape) == 1:
+        shape = shape * 3
+    if len(shape) != 3 or min(shape) < 16:
+        raise argparse.ArgumentTypeError(f"Matrix size must be NxNxN with every side at least 16: {value}")
+    return shape
+
+
+def _phantom_tissue(shape):
+    """Return the tissue labels of a head-like ellipsoid: CSF rim, grey and white matter, ventricles."""
+    axes = [np.linspace(-1.0, 1.0, n, dtype=np.float32) for n in shape]
+    x, y, z = np.meshgrid(*axes, indexing='ij', sparse=True)
+    radius = np.sqrt((x / 0.85) ** 2 + (y / 0.9) ** 2 + (z / 0.8) ** 2)
+
+    tissue = np.full(shape, _BACKGROUND, dtype=np.uint8)
+    tissue[radius < 1.0] = _CSF
+    tissue[radius < 0.95] = _GREY
+    tissue[radius < 0.75] = _WHITE
+    tissue[(x / 0.12) ** 2 + (y / 0.3) ** 2 + (z / 0.15) ** 2 < 1.0] = _CSF
+    return tissue
+
+
+def _phantom_lesions(rng, tissue, count, sessions, spacing):
+    """
+    Draw lesions inside the white matter, each with its own onset and growth rate.
+
+    Returns:
+        list: One dict per lesion with its centre voxel, radius in mm, onset
+        session, relative growth per session and whether it has a paramagnetic rim
+    """
+    white = np.argwhere(tissue == _WHITE)
+    lesions = []
+    for _ in range(count):
+        lesions.append({
+            'centre': white[rng.integers(len(white))],
+            'radius_mm': rng.uniform(1.5, 5.0) * max(1.0, spacing),
+            # Most lesions exist from the start; the others appear at a later session
+            'onset': 0 if rng.random() < 0.7 else int(rng.integers(1, max(2, sessions))),
+            'growth': rng.uniform(-0.3, 0.4),
+            'prl': rng.random() < 0.25,
+        })
+    return lesions
+
+
+def _draw_lesion(lesion_mask, prl_mask, centre, radius_mm, spacing, prl):
+    """Mark an ovoid lesion, elongated along the third axis, and its rim if it is a PRL."""
+    radii = np.array([radius_mm, radius_mm, 1.5 * radius_mm]) / spacing
+    low = np.maximum(0, np.floor(centre - radii).astype(int))
+    high = np.minimum(lesion_mask.shape, np.ceil(centre + radii).astype(int) + 1)
+    if np.any(high <= low):
+        return
+    grids = np.ogrid[low[0]:high[0], low[1]:high[1], low[2]:high[2]]
+    distance = sum(((grid - c) / r) ** 2 for grid, c, r in zip(grids, centre, radii))
+    region = (slice(low[0], high[0]), slice(low[1], high[1]), slice(low[2], high[2]))
+
+    lesion_mask[region][distance <= 1.0] = 1
+    if prl:
+        prl_mask[region][(distance <= 1.0) & (distance > 0.5)] = 1
+
+
+def _write_nifti(path, data, spacing, origin):
+    """Write an [x, y, z] array as a NIfTI volume whose qform places voxel (0, 0, 0) at origin."""
+    image = vtk.vtkImageData()
+    image.SetDimensions(data.shape)
+    image.SetSpacing(spacing, spacing, spacing)
+    # VTK stores x fastest
+    image.GetPointData().SetScalars(numpy_to_vtk(np.ravel(data, order='F'), deep=True))
+
+    matrix = vtk.vtkMatrix4x4()
+    for axis in range(3):
+        matrix.SetElement(axis, 3, origin[axis])
+
+    writer = vtk.vtkNIFTIImageWriter()
+    writer.SetFileName(path)
+    writer.SetInputData(image)
+    writer.SetQFormMatrix(matrix)
+    writer.SetSFormMatrix(matrix)
+    writer.Write()
+
+
+def make_phantom_subject(subject_path, shape=DEFAULT_PHANTOM_SHAPE, sessions=DEFAULT_PHANTOM_SESSIONS,
+                         lesions=DEFAULT_PHANTOM_LESIONS, spacing=1.0, seed=0):
+    """
+    Write a synthetic subject laid out like real data: ses-YYYYMMDD/*Lreg_*.nii.gz.
+
+    Every session holds T1, FLAIR, SWI magnitude and phase volumes of the same
+    head-like phantom, with noise and a small scanner gain drift, plus lesion
+    and PRL masks. Lesions appear, grow and shrink between sessions, so the
+    progression frames have stable, growth and reduction voxels. The same
+    seed always writes the same volumes.
+
+    Args:
+        subject_path (str): Directory to create; its name prefixes the file names
+        shape (tuple): Matrix size of every volume
+        sessions (int): Number of sessions
+        lesions (int): Number of lesions over the whole series
+        spacing (float): Isotropic voxel spacing in mm
+        seed (int): Random seed
+
+    Returns:
+        list: Session directory names in chronological order
+    """
+    rng = np.random.default_rng(seed)
+    shape = tuple(shape)
+    subject = os.path.basename(os.path.normpath(subject_path))
+
+    # Centred on the scanner origin
+    origin = -spacing * (np.array(shape) - 1) / 2
+
+    tissue = _phantom_tissue(shape)
+    lesion_list = _phantom_lesions(rng, tissue, lesions, sessions, spacing)
+    axes = [np.linspace(-np.pi, np.pi, n, dtype=np.float32) for n in shape]
+    x, y, z = np.meshgrid(*axes, indexing='ij', sparse=True)
+    background_phase = 2.0 * np.sin(x) * np.cos(0.5 * y) + 0.5 * z
+
+    session_names = []
+    for index in range(sessions):
+        session = f"ses-{PHANTOM_FIRST_SESSION + timedelta(days=index * PHANTOM_SESSION_INTERVAL_DAYS):%Y%m%d}"
+        session_path = os.path.join(subject_path, session)
+        os.makedirs(session_path, exist_ok=True)
+        session_names.append(session)
+
+        lesion_mask = np.zeros(shape, dtype=np.uint8)
+        prl_mask = np.zeros(shape, dtype=np.uint8)
+        for lesion in lesion_list:
+            if index < lesion['onset']:
+                continue
+            radius = lesion['radius_mm'] * (1.0 + lesion['growth'] * (index - lesion['onset']))
+            if radius >= 0.75 * spacing:
+                _draw_lesion(lesion_mask, prl_mask, lesion['centre'], radius, spacing, lesion['prl'])
+
+        volumes = {}
+        gain = rng.uniform(0.95, 1.05)
+        for modality, intensities in PHANTOM_INTENSITIES.items():
+            values = np.array(intensities[:4], dtype=np.float32)[tissue]
+            values[lesion_mask > 0] = intensities[4]
+            if modality == 'swi_mag':
+                # Paramagnetic rims are dark on SWI
+                values[prl_mask > 0] *= 0.5
+            values *= gain
+            values += rng.normal(0.0, 0.03 * max(intensities), shape).astype(np.float32)
+            volumes[modality] = np.clip(values, 0, None).astype(np.int16)
+
+        phase = background_phase + rng.normal(0.0, 0.2, shape).astype(np.float32)
+        phase[prl_mask > 0] += 1.5
+        phase = np.angle(np.exp(1j * phase)).astype(np.float32)
+        phase[tissue == _BACKGROUND] = 0.0
+        volumes['swi_phase'] = phase
+        volumes['lesion'] = lesion_mask
+        volumes['prl'] = prl_mask
+
+        for role, data in volumes.items():
+            filename = f"{subject}_{session}_{FILE_PATTERNS[role].lstrip('*')}"
+            _write_nifti(os.path.join(session_path, filename), data, spacing, origin)
+
+    return session_names
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB, None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _summarize_ms(seconds):
+    """Return the mean, median and maximum of durations in milliseconds."""
+    values = [1000 * value for value in seconds]
+    return {
+        'mean_ms': statistics.mean(values),
+        'median_ms': statistics.median(values),
+        'max_ms': max(values),
+    }
+
+
+def run_suite(subject_path, frames=DEFAULT_SUITE_FRAMES, mapper=None, render_threads=None,
+              slab_projection=None, direction='axial', size=DEFAULT_BENCHMARK_SIZE):
+    """
+    Time the viewer's loading, intensity statistics, slab scrolling and progression on a subject.
+
+    Runs in a fresh process, so caches start empty and the peak RSS covers
+    this subject only. The viewer runs on Qt's offscreen platform, where its
+    windows have no GL surface: setup_file_paths and load_session are timed
+    without drawing. Slab scrolling is drawn by a BatchScene with VTK's own
+    offscreen rendering, through the same pipelines as the viewer.
+
+    Returns:
+        dict: Stage timings and the peak RSS after each stage
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    # Imported in the worker so the parent never creates a window
+    from PyQt5 import QtWidgets
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    from render import MRIViewer
+    from batch_render import BatchScene
+    from volume_cache import get_volume_cache, load_volumes
+    from intensity_stats import get_stats_engine
+    from volume_mappers import get_mapper_factory, offscreen_mapper_backend
+    from progression import ProgressionFrames
+    from progression_export import subject_lesion_masks
+
+    backend = offscreen_mapper_backend(mapper)
+    results = {}
+    memory = {'start': peak_rss_mb()}
+
+    class TimedViewer(MRIViewer):
+        def setup_file_paths(self, base_path, manifest=None):
+            start = time.perf_counter()
+            super().setup_file_paths(base_path, manifest)
+            self.setup_seconds = time.perf_counter() - start
+
+    # Draw calls fail without a GL surface; GPU mappers skip them, the CPU ray caster would crash
+    get_mapper_factory().configure('gpu')
+
+    # setup_file_paths: manifest scan, first session decode, pipelines and statistics, all cold
+    viewer = TimedViewer(subject_path, interactive_frame_ms=0)
+    app.processEvents()
+    results['setup_file_paths_s'] = viewer.setup_seconds
+    memory['setup_file_paths'] = peak_rss_mb()
+
+    # load_session: switching sessions once the neighbours are prefetched, as when browsing
+    order = list(range(1, len(viewer.session_dirs))) + [0]
+    switches = []
+    for index in order:
+        viewer.prefetcher.wait_idle()
+        start = time.perf_counter()
+        viewer.load_session(index)
+        switches.append(time.perf_counter() - start)
+    # and with nothing decoded yet
+    viewer.prefetcher.wait_idle()
+    viewer.prefetcher.clear()
+    get_volume_cache().clear()
+    start = time.perf_counter()
+    viewer.load_session(order[-2])
+    cold = time.perf_counter() - start
+    viewer.prefetcher.wait_idle()
+    results['load_session'] = dict(_summarize_ms(switches), sessions=len(switches), cold_ms=1000 * cold)
+    memory['load_session'] = peak_rss_mb()
+
+    # _calculate_optimal_range: histograms from the voxels, with no memo in memory or in the manifest
+    ranges = {}
+    manifest, viewer.manifest = viewer.manifest, None
+    try:
+        for renderer in viewer.SlicePlanes.renderer_instances:
+            get_stats_engine().clear()
+            start = time.perf_counter()
+            renderer._calculate_optimal_range()
+            ranges[renderer.modality] = 1000 * (time.perf_counter() - start)
+    finally:
+        viewer.manifest = manifest
+    results['calculate_optimal_range_ms'] = dict(ranges, total=sum(ranges.values()))
+    memory['calculate_optimal_range'] = peak_rss_mb()
+
+    # Progression label frames (formerly compute_difference_volumes) from decoded masks
+    mask_files = subject_lesion_masks(manifest)
+    viewer.close()
+    load_volumes(mask_files)
+    progression = ProgressionFrames(mask_files, max_frames=len(mask_files), workers=1)
+    label_times = []
+    for index in range(len(progression)):
+        start = time.perf_counter()
+        progression.compute_frame(index)
+        label_times.append(time.perf_counter() - start)
+    progression.shutdown()
+    results['progression_frames'] = dict(_summarize_ms(label_times), frames=len(label_times),
+                                         total_ms=1000 * sum(label_times))
+    memory['progression_frames'] = peak_rss_mb()
+
+    # Slab scrolling: wheel-sized steps forward then back from the middle, all four views drawn
+    get_mapper_factory().configure(backend, render_threads)
+    results['mapper'] = get_mapper_factory().describe()
+    scene = BatchScene(subject_path, tile_size=size)
+    scene.load_session(scene.manifest.sessions()[0])
+    if slab_projection:
+        for renderer in scene.renderers.values():
+            renderer.set_slab_projection(slab_projection)
+    scene.set_slab(direction, 0.5)
+    start = time.perf_counter()
+    scene.render()
+    first_frame = time.perf_counter() - start
+
+    planes = scene.SlicePlanes
+    frame_times = []
+    for frame in range(frames):
+        step = planes.step if frame < frames // 2 else -planes.step
+        start = time.perf_counter()
+        planes.current_slice = planes.clampSlice(planes.current_slice + step)
+        planes._updateCroppingPlanes()
+        scene.render()
+        frame_times.append(time.perf_counter() - start)
+    scroll = _summarize_ms(frame_times)
+    scroll['fps'] = 1000 / scroll['mean_ms'] if scroll['mean_ms'] > 0 else 0.0
+    results['slab_scroll'] = dict(scroll, frames=frames, direction=direction, size=size,
+                                  projection=slab_projection or get_mapper_factory().slab_projection,
+                                  first_frame_ms=1000 * first_frame)
+    memory['slab_scroll'] = peak_rss_mb()
+
+    results['peak_rss_mb'] = memory
+    return results
+
+
+def summary_metrics(results):
+    """Return the headline numbers of a suite run, lower is better for all of them."""
+    stages = results['stages']
+    return {
+        'setup_file_paths_s': stages['setup_file_paths_s'],
+        'load_session_ms': stages['load_session']['mean_ms'],
+        'load_session_cold_ms': stages['load_session']['cold_ms'],
+        'calculate_optimal_range_ms': stages['calculate_optimal_range_ms']['total'],
+        'slab_scroll_mean_ms': stages['slab_scroll']['mean_ms'],
+        'slab_scroll_max_ms': stages['slab_scroll']['max_ms'],
+        'progression_frames_ms': stages['progression_frames']['total_ms'],
+        'peak_rss_mb': stages['peak_rss_mb']['slab_scroll'],
+    }
+
+
+def compare_results(baseline, results):
+    """Print the headline numbers of two suite runs side by side."""
+    if baseline.get('suite_version') != results['suite_version']:
+        print(f"Warning: Baseline was written by suite version {baseline.get('suite_version')}, "
+              f"this is version {results['suite_version']}")
+    if baseline.get('config') != results['config']:
+        print("Warning: Baseline used a different configuration, differences are not only due to the code")
+
+    print(f"{'metric':<28} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, value in results['summary'].items():
+        old = baseline.get('summary', {}).get(name)
+        if old is None or value is None:
+            print(f"{name:<28} {'-':>12} {value if value is not None else '-':>12}")
+            continue
+        change = f"{100 * (value - old) / old:+.1f}%" if old else "-"
+        print(f"{name:<28} {old:12.2f} {value:12.2f} {change:>9}")
+
+
+def _git_commit():
+    """Return the commit the code was run from, None outside a git checkout."""
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def run_benchmark_suite(shape=DEFAULT_PHANTOM_SHAPE, sessions=DEFAULT_PHANTOM_SESSIONS,
+                        lesions=DEFAULT_PHANTOM_LESIONS, spacing=1.0, seed=0, phantom_dir=None, **options):
+    """
+    Generate a phantom subject and run the suite on it in a fresh process.
+
+    Args:
+        shape, sessions, lesions, spacing, seed: Phantom settings, see make_phantom_subject
+        phantom_dir (str): Keep the phantom in this directory, reusing it if
+            already there (default: a temporary directory removed afterwards)
+        **options: Forwarded to run_suite
+
+    Returns:
+        dict: Configuration, environment, stage results and summary metrics
+    """
+    config = {
+        'shape': list(shape), 'sessions': sessions, 'lesions': lesions, 'spacing': spacing, 'seed': seed,
+        'frames': options.get('frames', DEFAULT_SUITE_FRAMES),
+        'mapper': options.get('mapper'),
+        'render_threads': options.get('render_threads'),
+        'slab_projection': options.get('slab_projection'),
+        'direction': options.get('direction', 'axial'),
+        'size': options.get('size', DEFAULT_BENCHMARK_SIZE),
+    }
+    workdir = tempfile.mkdtemp(prefix="mri_viewer_bench_") if phantom_dir is None else None
+    subject_path = os.path.join(workdir, "sub-phantom") if workdir else os.path.abspath(phantom_dir)
+
+    try:
+        if os.path.isdir(subject_path) and os.listdir(subject_path):
+            print(f"Reusing phantom subject in {subject_path}")
+            # The manifest memoizes statistics, so a kept one would make setup warm
+            manifest_path = os.path.join(subject_path, MANIFEST_FILENAME)
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+        else:
+            start = time.perf_counter()
+            make_phantom_subject(subject_path, shape, sessions, lesions, spacing, seed)
+            print(f"Phantom subject written in {time.perf_counter() - start:.1f} s")
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            stages = pool.submit(run_suite, subject_path, **options).result()
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'suite_version': SUITE_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+        },
+        'config': config,
+        'stages': stages,
+    }
+    results['summary'] = summary_metrics(results)
+    return results
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Time the viewer offscreen on a synthetic phantom subject and write the results as JSON")
+    parser.add_argument("--shape", type=parse_shape, default=DEFAULT_PHANTOM_SHAPE,
+                        help="Matrix size, e.g. 256x256x180 (default: %s)" % 'x'.join(map(str, DEFAULT_PHANTOM_SHAPE)))
+    parser.add_argument("--sessions", type=int, default=DEFAULT_PHANTOM_SESSIONS,
+                        help="Sessions of the phantom subject (default: %d)" % DEFAULT_PHANTOM_SESSIONS)
+    parser.add_argument("--lesions", type=int, default=DEFAULT_PHANTOM_LESIONS,
+                        help="Lesions over the whole series (default: %d)" % DEFAULT_PHANTOM_LESIONS)
+    parser.add_argument("--spacing", type=float, default=1.0, help="Isotropic voxel spacing in mm (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the phantom (default: 0)")
+    parser.add_argument("--phantom-dir", default=None,
+                        help="Write the phantom subject here and keep it, or reuse it if it exists")
+    parser.add_argument("--frames", type=int, default=DEFAULT_SUITE_FRAMES,
+                        help="Slab scroll steps timed (default: %d)" % DEFAULT_SUITE_FRAMES)
+    parser.add_argument("--direction", choices=['axial', 'coronal', 'sagittal'], default='axial',
+                        help="Scrolling direction (default: axial)")
+    parser.add_argument("--size", type=int, default=DEFAULT_BENCHMARK_SIZE,
+                        help="Width and height of each view while scrolling (default: %d)" % DEFAULT_BENCHMARK_SIZE)
+    parser.add_argument("--mapper", choices=MAPPER_BACKENDS, default=None,
+                        help="Volume mapper backend of the slab scroll (default: $MRI_VIEWER_MAPPER, or cpu)")
+    parser.add_argument("--render-threads", type=int, default=None,
+                        help="Threads used for CPU ray casting (default: one per core)")
+    parser.add_argument("--slab-projection", choices=SLAB_PROJECTIONS, default=None,
+                        help="Scroll through 2D slab projections instead of ray cast slabs")
+    parser.add_argument("--json", metavar="FILE", default=None, help="Write the results to FILE")
+    parser.add_argument("--compare", metavar="FILE", default=None,
+                        help="Compare with the results of an earlier run, e.g. on another commit")
+    args = parser.parse_args(argv)
+    if args.sessions < 2:
+        parser.error("--sessions must be at least 2")
+    if args.frames < 2:
+        parser.error("--frames must be at least 2")
+    return args
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Error reading baseline {args.compare}: {str(e)}")
+            sys.exit(1)
+
+    try:
+        results = run_benchmark_suite(args.shape, args.sessions, args.lesions, args.spacing, args.seed,
+                                      args.phantom_dir, frames=args.frames, mapper=args.mapper,
+                                      render_threads=args.render_threads,
+                                      slab_projection=args.slab_projection, direction=args.direction,
+                                      size=args.size)
+    except Exception as e:
+        print(f"Error running benchmark suite: {str(e)}")
+        sys.exit(1)
+
+    print(f"\nBenchmark suite ({results['stages']['mapper']}, "
+          f"{'x'.join(map(str, args.shape))} x {args.sessions} sessions):")
+    for name, value in results['summary'].items():
+        print(f"  {name:<28} {value:10.2f}" if value is not None else f"  {name:<28} {'-':>10}")
+
+    if baseline:
+        print()
+        compare_results(baseline, results)
+
+    if args.json:
+        with open(args.json, mode='w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
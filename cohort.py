@@ -0,0 +1,176 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtWidgets import QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QMessageBox
+
+from render import MRIViewer
+from subject_manifest import SubjectManifest
+from volume_cache import load_volumes
+
+
+def find_subject_dirs(cohort_root):
+    """
+    List subject folders of a cohort root, sorted by name.
+
+    A subject folder is any direct subdirectory holding at least one ses-* directory.
+    """
+    subjects = []
+    for entry in sorted(os.scandir(cohort_root), key=lambda e: e.name):
+        if not entry.is_dir() or entry.name.startswith('.'):
+            continue
+        try:
+            has_sessions = any(
+                child.name.startswith('ses-') and child.is_dir()
+                for child in os.scandir(entry.path)
+            )
+        except OSError:
+            continue
+        if has_sessions:
+            subjects.append(entry.path)
+    return subjects
+
+
+class CohortViewer(MRIViewer):
+    """
+    MRIViewer that walks a review queue of subjects inside one process.
+
+    While the current subject is reviewed, the manifest and first session of
+    the next subject in the queue are decoded in the background into the
+    shared volume cache, so moving on reuses the open windows and pipelines
+    instead of restarting the application.
+    """
+
+    def __init__(self, cohort_root, **viewer_options):
+        """
+        Args:
+            cohort_root (str): Directory containing one folder per subject
+            **viewer_options: Forwarded to MRIViewer
+        """
+        self.cohort_root = os.path.abspath(cohort_root)
+        self.subject_queue = find_subject_dirs(self.cohort_root)
+        if not self.subject_queue:
+            raise ValueError(f"No subject directories found in {self.cohort_root}")
+
+        self.queue_index = 0
+        self.preload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="subject-preload")
+        self.preloads = {}  # queue index -> Future returning a SubjectManifest
+
+        super().__init__(self.subject_queue[0], **viewer_options)
+
+        self.addCohortControls()
+        self.update_queue_display()
+        self.preload_subject(self.queue_index + 1)
+
+    def addCohortControls(self):
+        """Add the review queue section below the case information."""
+        queue_group = self.create_group_box("Review Queue")
+        queue_layout = QVBoxLayout(queue_group)
+
+        self.queue_label = QLabel()
+        self.queue_label.setStyleSheet("font-size: 11pt; color: #FFFFFF;")
+
+        buttons = QHBoxLayout()
+        self.prev_subject_button = QPushButton("◀ Previous Subject")
+        self.next_subject_button = QPushButton("Next Subject ▶")
+        for button in [self.prev_subject_button, self.next_subject_button]:
+            button.setStyleSheet("""
+                QPushButton {
+                    background-color: #404040;
+                    color: white;
+                    border: none;
+                    padding: 8px;
+                    font-size: 11pt;
+                    border-radius: 4px;
+                }
+                QPushButton:hover {
+                    background-color: #505050;
+                }
+                QPushButton:disabled {
+                    background-color: #2D2D2D;
+                    color: #808080;
+                }
+            """)
+            buttons.addWidget(button)
+
+        self.prev_subject_button.clicked.connect(self.previous_subject)
+        self.next_subject_button.clicked.connect(self.next_subject)
+
+        queue_layout.addWidget(self.queue_label)
+        queue_layout.addLayout(buttons)
+        self.control_layout.insertWidget(1, queue_group)
+
+    def update_queue_display(self):
+        """Show the queue position and enable the subject navigation buttons."""
+        self.queue_label.setText(f"Subject {self.queue_index + 1} of {len(self.subject_queue)}")
+        self.prev_subject_button.setEnabled(self.queue_index > 0)
+        self.next_subject_button.setEnabled(self.queue_index < len(self.subject_queue) - 1)
+
+    def preload_subject(self, queue_index):
+        """Build the manifest and decode the first session of a queued subject in the background."""
+        if not 0 <= queue_index < len(self.subject_queue) or queue_index in self.preloads:
+            return
+
+        # Only the upcoming subject is worth keeping queued
+        for index, future in list(self.preloads.items()):
+            if index != queue_index and future.cancel():
+                del self.preloads[index]
+
+        self.preloads[queue_index] = self.preload_executor.submit(
+            self._preload, self.subject_queue[queue_index]
+        )
+
+    def _preload(self, subject_path):
+        """Worker: index the subject and decode its first session into the volume cache."""
+        manifest = SubjectManifest(subject_path)
+        sessions = manifest.sessions()
+        if sessions:
+            roles = self.modalities + ['lesion', 'prl']
+            files = [manifest.find_file(sessions[0], role) for role in roles]
+            load_volumes([path for path in files if path], max_workers=self.prefetcher.load_workers)
+        return manifest
+
+    def take_preloaded_manifest(self, queue_index):
+        """Return the preloaded manifest of a queued subject, waiting if it is still loading."""
+        future = self.preloads.pop(queue_index, None)
+        if future is None or future.cancelled():
+            return None
+        try:
+            manifest = future.result()
+            # Pick up sessions added since the preload ran
+            manifest.refresh()
+            return manifest
+        except Exception as e:
+            print(f"Warning: Preloading {self.subject_queue[queue_index]} failed - {str(e)}")
+            return None
+
+    def go_to_subject(self, queue_index):
+        """Show another subject of the queue without restarting the viewer."""
+        if not 0 <= queue_index < len(self.subject_queue):
+            return
+
+        manifest = self.take_preloaded_manifest(queue_index)
+        try:
+            self.load_subject(self.subject_queue[queue_index], manifest)
+        except ValueError as e:
+            print(f"Error loading subject: {str(e)}")
+            QMessageBox.warning(self, "Subject Error", f"Could not load subject: {str(e)}")
+            return
+
+        self.queue_index = queue_index
+        self.update_queue_display()
+        self.preload_subject(queue_index + 1)
+
+    def next_subject(self):
+        """Move to the next subject in the review queue."""
+        self.go_to_subject(self.queue_index + 1)
+
+    def previous_subject(self):
+        """Move to the previous subject in the review queue."""
+        self.go_to_subject(self.queue_index - 1)
+
+    def closeEvent(self, event):
+        """Stop the preload thread before the window goes away."""
+        for future in self.preloads.values():
+            future.cancel()
+        self.preload_executor.shutdown(wait=False)
+        super().closeEvent(event)
@@ -0,0 +1,150 @@
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+from volume_cache import read_nifti_image
+
+CACHE_FORMAT_VERSION = 1
+
+
+class DiskVolumeCache:
+    """
+    On-disk cache of decompressed volumes that are memory-mapped on load.
+
+    Each source file is stored once as raw voxels plus a JSON sidecar holding
+    its geometry and the source mtime/size. Loading maps the raw file
+    read-only and wraps it in vtkImageData without copying, so reopening a
+    subject skips gzip inflation and the page cache is shared by every viewer
+    process on the workstation.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        Args:
+            cache_dir (str): Directory holding the raw volumes and sidecars
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_paths(self, source_path):
+        """Return (raw path, sidecar path) for a source file."""
+        digest = hashlib.sha1(source_path.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, digest)
+        return base + '.raw', base + '.json'
+
+    def load(self, filename):
+        """
+        Return the volume for a NIfTI file, from the disk cache when it is current.
+
+        Args:
+            filename (str): Path to a NIfTI file
+
+        Returns:
+            vtkImageData: Volume whose scalars are backed by a read-only memory map
+        """
+        source_path = os.path.abspath(filename)
+        stat = os.stat(source_path)
+        raw_path, meta_path = self._entry_paths(source_path)
+
+        meta = self._read_sidecar(meta_path)
+        if (meta is not None
+                and meta.get('version') == CACHE_FORMAT_VERSION
+                and meta.get('source') == source_path
+                and meta.get('mtime_ns') == stat.st_mtime_ns
+                and meta.get('size') == stat.st_size
+                and os.path.exists(raw_path)):
+            try:
+                image = self._map_entry(raw_path, meta)
+                self.hits += 1
+                return image
+            except (OSError, ValueError) as e:
+                print(f"Warning: Discarding unreadable cache entry for {source_path} - {str(e)}")
+
+        self.misses += 1
+        image = read_nifti_image(source_path)
+        try:
+            self._write_entry(image, raw_path, meta_path, source_path, stat)
+        except OSError as e:
+            print(f"Warning: Could not write disk cache entry for {source_path} - {str(e)}")
+            return image
+
+        # Hand out the mapped copy so this process shares pages with the others
+        return self._map_entry(raw_path, self._read_sidecar(meta_path))
+
+    def _read_sidecar(self, meta_path):
+        """Read a sidecar, returning None if it is missing or corrupt."""
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _map_entry(self, raw_path, meta):
+        """Wrap a raw voxel file into vtkImageData without copying."""
+        dims = meta['dimensions']
+        components = meta['components']
+        voxels = np.memmap(raw_path, dtype=np.dtype(meta['dtype']), mode='r')
+
+        expected = dims[0] * dims[1] * dims[2] * components
+        if voxels.size != expected:
+            raise ValueError(f"expected {expected} values, found {voxels.size}")
+        if components > 1:
+            voxels = voxels.reshape(-1, components)
+
+        scalars = numpy_support.numpy_to_vtk(voxels, deep=False)
+        scalars.SetName(meta.get('scalar_name') or 'scalars')
+
+        image = vtk.vtkImageData()
+        image.SetDimensions(dims)
+        image.SetSpacing(meta['spacing'])
+        image.SetOrigin(meta['origin'])
+        image.SetDirectionMatrix(meta['direction'])
+        image.GetPointData().SetScalars(scalars)
+        return image
+
+    def _write_entry(self, image, raw_path, meta_path, source_path, stat):
+        """Write raw voxels and sidecar atomically so concurrent viewers never see partial files."""
+        scalars = image.GetPointData().GetScalars()
+        voxels = numpy_support.vtk_to_numpy(scalars)
+
+        direction = image.GetDirectionMatrix()
+        meta = {
+            'version': CACHE_FORMAT_VERSION,
+            'source': source_path,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'dimensions': list(image.GetDimensions()),
+            'spacing': list(image.GetSpacing()),
+            'origin': list(image.GetOrigin()),
+            'direction': [direction.GetElement(i, j) for i in range(3) for j in range(3)],
+            'dtype': voxels.dtype.str,
+            'components': scalars.GetNumberOfComponents(),
+            'scalar_name': scalars.GetName(),
+        }
+
+        fd, tmp_raw = tempfile.mkstemp(dir=self.cache_dir, suffix='.raw.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.ascontiguousarray(voxels).tofile(f)
+            os.replace(tmp_raw, raw_path)
+        except BaseException:
+            if os.path.exists(tmp_raw):
+                os.remove(tmp_raw)
+            raise
+
+        fd, tmp_meta = tempfile.mkstemp(dir=self.cache_dir, suffix='.json.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
+        except BaseException:
+            if os.path.exists(tmp_meta):
+                os.remove(tmp_meta)
+            raise
@@ -0,0 +1,237 @@
+import threading
+
+import numpy as np
+from vtk.util import numpy_support
+
+from volume_cache import file_key
+
+DEFAULT_PERCENTILES = (1, 99)
+HISTOGRAM_BINS = 256
+
+# Bumped when stats are computed differently, so memos in older manifests are not reused
+STATS_VERSION = 2
+
+# Voxels binned per step, bounding the temporary arrays to a few tens of MB
+CHUNK_VOXELS = 1 << 22
+
+# Integer volumes spanning fewer distinct values are histogrammed value by value
+INTEGER_VALUE_LIMIT = 1 << 20
+
+
+def percentile_name(q):
+    """Return the key under which a percentile is stored, e.g. 1 -> 'p1', 99.5 -> 'p99.5'."""
+    return f"p{q:g}"
+
+
+def _histogram_percentiles(counts, percentiles, low, spacing):
+    """
+    Read percentiles off a histogram as the lower edge of the first bin reaching each fraction.
+
+    Like the vtkImageAccumulate walk this replaces, the lowest percentile
+    never stops in the first bin, which usually holds the background,
+    unless the highest one does too.
+    """
+    total = counts.sum()
+    if total == 0:
+        return {percentile_name(q): low for q in percentiles}
+    cumulative = np.cumsum(counts)
+    bins = np.searchsorted(cumulative, [total * q / 100.0 for q in percentiles], side='left')
+    bins = np.minimum(bins, len(counts) - 1)
+    if len(bins) > 1 and bins[0] == 0 and bins[-1] > 0:
+        bins[0] = 1
+    return {percentile_name(q): float(low + i * spacing) for q, i in zip(percentiles, bins)}
+
+
+def _summary(counts, count, value_sum, square_sum, percentiles, low, spacing):
+    """Assemble moments, histogram and percentiles of one voxel population."""
+    mean = value_sum / count if count else 0.0
+    variance = square_sum / count - mean * mean if count else 0.0
+    return {
+        'mean': float(mean),
+        'std': float(np.sqrt(max(variance, 0.0))),
+        'voxels': int(count),
+        'histogram': counts.tolist(),
+        'percentiles': _histogram_percentiles(counts, percentiles, low, spacing),
+    }
+
+
+def _integer_value_counts(voxels, low, high):
+    """Count the occurrences of every value of an integer volume, chunk by chunk."""
+    value_counts = np.zeros(int(high) - int(low) + 1, dtype=np.int64)
+    offset = int(low)
+    for start in range(0, voxels.size, CHUNK_VOXELS):
+        chunk = voxels[start:start + CHUNK_VOXELS]
+        if offset or chunk.dtype.kind != 'u':
+            chunk = np.subtract(chunk, offset, dtype=np.intp)
+        value_counts += np.bincount(chunk, minlength=value_counts.size)
+    return value_counts
+
+
+def compute_intensity_stats(voxels, value_range=None, percentiles=DEFAULT_PERCENTILES,
+                            bins=HISTOGRAM_BINS, foreground=False):
+    """
+    Compute histogram, moments and percentiles of a volume in one sweep.
+
+    Bins span [min, max] with (max - min) / (bins - 1) wide bins, the layout
+    vtkImageAccumulate used before, and percentiles are read off them the
+    same way (see _histogram_percentiles), so they land on the same values.
+    Integer volumes are reduced to a count per distinct value with a single
+    bincount; everything else is derived from those counts.
+
+    Args:
+        voxels (ndarray): Voxel values (any shape, single component)
+        value_range (tuple): Known (min, max), computed from voxels if None
+        percentiles (tuple): Percentiles to report, in [0, 100]
+        bins (int): Number of histogram bins
+        foreground (bool): Also report stats of the non-zero voxels
+
+    Returns:
+        dict: min, max, mean, std, voxels, histogram, percentiles and, with
+        foreground, a 'foreground' dict holding the same for non-zero voxels
+    """
+    voxels = np.ravel(voxels)
+    if value_range is None:
+        value_range = (float(voxels.min()), float(voxels.max())) if voxels.size else (0.0, 0.0)
+    low, high = float(value_range[0]), float(value_range[1])
+    spacing = (high - low) / (bins - 1)
+    # Divide rather than multiply by 1/spacing so values on bin edges fall like in VTK
+    divisor = spacing if spacing > 0 else np.inf
+
+    if voxels.dtype.kind in 'iu' and high - low < INTEGER_VALUE_LIMIT:
+        value_counts = _integer_value_counts(voxels, low, high)
+        values = low + np.arange(value_counts.size, dtype=np.float64)
+        index = np.minimum(np.floor((values - low) / divisor).astype(np.intp), bins - 1)
+        counts = np.bincount(index, weights=value_counts, minlength=bins).astype(np.int64)
+        total = np.dot(values, value_counts)
+        total_sq = np.dot(values * values, value_counts)
+
+        if foreground:
+            fg_counts = counts.copy()
+            zeros = int(value_counts[int(-low)]) if low <= 0 <= high else 0
+            if zeros:
+                fg_counts[index[int(-low)]] -= zeros
+            fg = (fg_counts, voxels.size - zeros, total, total_sq)
+    else:
+        counts = np.zeros(bins, dtype=np.int64)
+        fg_counts = np.zeros(bins, dtype=np.int64)
+        total = total_sq = fg_total = fg_total_sq = 0.0
+        for start in range(0, voxels.size, CHUNK_VOXELS):
+            chunk = voxels[start:start + CHUNK_VOXELS].astype(np.float64)
+            index = np.floor((chunk - low) / divisor).astype(np.intp)
+            np.clip(index, 0, bins - 1, out=index)
+            counts += np.bincount(index, minlength=bins)
+            total += chunk.sum()
+            total_sq += np.dot(chunk, chunk)
+
+            if foreground:
+                nonzero = chunk != 0
+                fg_counts += np.bincount(index[nonzero], minlength=bins)
+                fg_chunk = chunk[nonzero]
+                fg_total += fg_chunk.sum()
+                fg_total_sq += np.dot(fg_chunk, fg_chunk)
+        fg = (fg_counts, int(fg_counts.sum()), fg_total, fg_total_sq)
+
+    stats = {'min': low, 'max': high}
+    stats.update(_summary(counts, voxels.size, total, total_sq, percentiles, low, spacing))
+    if foreground:
+        stats['foreground'] = _summary(*fg, percentiles, low, spacing)
+    return stats
+
+
+def image_intensity_stats(image, percentiles=DEFAULT_PERCENTILES, bins=HISTOGRAM_BINS,
+                          foreground=False):
+    """Compute intensity stats of a vtkImageData without copying its scalars."""
+    voxels = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars())
+    return compute_intensity_stats(voxels, image.GetScalarRange(), percentiles, bins, foreground)
+
+
+class IntensityStatsEngine:
+    """
+    Per-file intensity statistics used to set transfer-function ranges.
+
+    Results are memoized in memory by file path plus mtime/size, and on disk
+    in the subject manifest when one is given, so a file is only analysed
+    the first time it is ever shown.
+    """
+
+    def __init__(self, percentiles=DEFAULT_PERCENTILES, foreground_only=False, bins=HISTOGRAM_BINS):
+        """
+        Args:
+            percentiles (tuple): Percentiles to compute; the lowest and highest give the range
+            foreground_only (bool): Derive the range from non-zero voxels only
+            bins (int): Number of histogram bins
+        """
+        self._lock = threading.Lock()
+        self._memo = {}  # (file key, signature) -> stats
+        self.configure(percentiles, foreground_only, bins)
+
+    def configure(self, percentiles=DEFAULT_PERCENTILES, foreground_only=False, bins=HISTOGRAM_BINS):
+        """Change what is computed; stats memoized under other settings are kept."""
+        percentiles = tuple(sorted(set(float(q) for q in percentiles)))
+        if not percentiles or percentiles[0] < 0 or percentiles[-1] > 100:
+            raise ValueError(f"Percentiles must lie between 0 and 100: {percentiles}")
+        self.percentiles = percentiles
+        self.foreground_only = foreground_only
+        self.bins = bins
+
+    @property
+    def signature(self):
+        """Identify the settings stats were computed with, e.g. 'v2-b256-p1,p99-fg'."""
+        names = ','.join(percentile_name(q) for q in self.percentiles)
+        return f"v{STATS_VERSION}-b{self.bins}-{names}" + ("-fg" if self.foreground_only else "")
+
+    def get_stats(self, filename, image, manifest=None):
+        """
+        Return the stats of a file, computing them only if no memo has them.
+
+        Args:
+            filename (str): Path of the NIfTI file the image was read from
+            image (vtkImageData): The decoded volume
+            manifest (SubjectManifest): Subject manifest used as the on-disk memo
+
+        Returns:
+            dict: Stats as returned by compute_intensity_stats
+        """
+        signature = self.signature
+        key = (file_key(filename), signature)
+        with self._lock:
+            stats = self._memo.get(key)
+        if stats is not None:
+            return stats
+
+        stats = manifest.get_stats(filename, signature) if manifest else None
+        if stats is None:
+            stats = image_intensity_stats(image, self.percentiles, self.bins, self.foreground_only)
+            if manifest:
+                manifest.record_stats(filename, signature, stats)
+
+        with self._lock:
+            self._memo[key] = stats
+        return stats
+
+    def optimal_range(self, filename, image, manifest=None):
+        """
+        Return the (low, high) intensity range for a file's transfer functions.
+
+        Returns:
+            tuple: Values at the lowest and highest configured percentiles
+        """
+        stats = self.get_stats(filename, image, manifest)
+        if self.foreground_only and stats['foreground']['voxels']:
+            stats = stats['foreground']
+        values = stats['percentiles']
+        return (values[percentile_name(self.percentiles[0])],
+                values[percentile_name(self.percentiles[-1])])
+
+    def clear(self):
+        """Forget the in-memory memo."""
+        with self._lock:
+            self._memo.clear()
+
+
+_stats_engine = IntensityStatsEngine()
+
+
+def get_stats_engine():
+    """Return the process-wide intensity statistics engine."""
+    return _stats_engine
@@ -0,0 +1,156 @@
+from PyQt5.QtCore import QTimer
+
+# Frame time aimed for while the user scrolls, zooms or rotates (all views together)
+DEFAULT_INTERACTIVE_FRAME_MS = 50.0
+
+# Input idle time after which the views are redrawn at full quality
+DEFAULT_REFINE_DELAY_MS = 300
+
+# Interactive detail levels, coarsest last: (ray step in units of the smallest
+# voxel spacing, image sample distance in pixels). Level 0 is full quality.
+LOD_LEVELS = [None, (1.0, 1.5), (2.0, 2.0), (3.0, 3.0), (4.0, 4.0)]
+
+
+class InteractiveLOD:
+    """
+    Lowers volume rendering quality while the user interacts and refines afterwards.
+
+    While interacting, every volume mapper in the scheduler's windows casts
+    coarser rays (larger sample distance) into fewer pixels (larger image
+    sample distance). vtkSmartVolumeMapper has no image sample distance,
+    so under the 'smart' backend only the ray step is coarsened. The detail level adapts to the measured render times
+    so that redrawing all views takes about the target frame time, and is
+    remembered for the next interaction. Once input has been idle for the
+    refine delay, the mappers get their original settings back and every
+    view is redrawn at full quality.
+    """
+
+    def __init__(self, scheduler, parent=None, target_frame_ms=DEFAULT_INTERACTIVE_FRAME_MS,
+                 refine_delay_ms=DEFAULT_REFINE_DELAY_MS):
+        """
+        Args:
+            scheduler (RenderScheduler): Scheduler owning the render windows
+            parent: QObject owning the refine timer
+            target_frame_ms (float): Interactive frame time to aim for, 0 to disable LOD
+            refine_delay_ms (int): Idle time before the full-quality redraw
+        """
+        self.scheduler = scheduler
+        self.target_frame_ms = target_frame_ms
+        self.level = 1            # detail level used by the next interaction
+        self.interacting = False  # a mouse drag is in progress
+        self.coarse = False       # mappers currently use interactive settings
+        self._originals = {}      # mapper -> (auto adjust, sample distance, image sample distance or None)
+        self._render_ms = {}      # window name -> last interactive render time
+
+        self.refine_timer = QTimer(parent)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.setInterval(int(refine_delay_ms))
+        self.refine_timer.timeout.connect(self.refine)
+
+        scheduler.render_observers.append(self._on_render)
+
+    @property
+    def enabled(self):
+        return bool(self.target_frame_ms and self.target_frame_ms > 0)
+
+    def start_interaction(self):
+        """A drag (rotate, pan, zoom) began: stay coarse until it ends."""
+        self.interacting = True
+        self.refine_timer.stop()
+        self._coarsen()
+
+    def end_interaction(self):
+        """A drag ended: refine once input stays idle."""
+        self.interacting = False
+        if self.coarse:
+            self.refine_timer.start()
+
+    def touch(self):
+        """A single input step (wheel scroll or zoom): coarsen now, refine when idle."""
+        self._coarsen()
+        if self.coarse and not self.interacting:
+            self.refine_timer.start()
+
+    def refine(self):
+        """Restore full quality and redraw every view."""
+        self.refine_timer.stop()
+        if not self.coarse:
+            return
+        for mapper, original in self._originals.items():
+            _restore(mapper, original)
+        # Forget the mappers, so ones replaced since are not kept alive; the next coarsen records afresh
+        self._originals.clear()
+        self.coarse = False
+        self._render_ms.clear()
+        self.scheduler.request_render()
+
+    def _mappers(self):
+        """Yield the volume mappers of all windows, overlays included."""
+        for window in self.scheduler.windows.values():
+            renderers = window.GetRenderers()
+            renderers.InitTraversal()
+            for _ in range(renderers.GetNumberOfItems()):
+                volumes = renderers.GetNextItem().GetVolumes()
+                volumes.InitTraversal()
+                for _ in range(volumes.GetNumberOfItems()):
+                    mapper = volumes.GetNextVolume().GetMapper()
+                    if mapper is not None and hasattr(mapper, 'SetSampleDistance'):
+                        yield mapper
+
+    def _coarsen(self):
+        """Switch every mapper to the current interactive level."""
+        if not self.enabled:
+            return
+        self.coarse = True
+        self._apply_level()
+
+    def _apply_level(self):
+        for mapper in self._mappers():
+            has_image_step = hasattr(mapper, 'SetImageSampleDistance')
+            if mapper not in self._originals:
+                self._originals[mapper] = (
+                    mapper.GetAutoAdjustSampleDistances(),
+                    mapper.GetSampleDistance(),
+                    mapper.GetImageSampleDistance() if has_image_step else None,
+                )
+            if self.level == 0:
+                _restore(mapper, self._originals[mapper])
+                continue
+            step, image_step = LOD_LEVELS[self.level]
+            mapper.AutoAdjustSampleDistancesOff()
+            mapper.SetSampleDistance(step * _smallest_spacing(mapper))
+            if has_image_step:
+                mapper.SetImageSampleDistance(image_step)
+
+    def _on_render(self, name, seconds):
+        """Adapt the detail level to the render times seen while coarse."""
+        if not self.coarse:
+            return
+        self._render_ms[name] = 1000 * seconds
+        # Views redraw one after another, so a frame costs about the sum of their last renders
+        frame_ms = sum(self._render_ms.values())
+        if frame_ms > 1.2 * self.target_frame_ms and self.level < len(LOD_LEVELS) - 1:
+            self.level += 1
+        elif frame_ms < 0.5 * self.target_frame_ms and self.level > 0:
+            self.level -= 1
+        else:
+            return
+        self._render_ms.clear()
+        self._apply_level()
+
+
+def _restore(mapper, original):
+    """Give a mapper back the settings recorded before it was first coarsened."""
+    auto_adjust, sample_distance, image_sample_distance = original
+    mapper.SetAutoAdjustSampleDistances(auto_adjust)
+    mapper.SetSampleDistance(sample_distance)
+    if image_sample_distance is not None:
+        mapper.SetImageSampleDistance(image_sample_distance)
+
+
+def _smallest_spacing(mapper):
+    """Return the smallest voxel spacing of a mapper's input, 1 if it has none yet."""
+    image = mapper.GetInput()
+    if image is None:
+        return 1.0
+    return min(image.GetSpacing()) or 1.0
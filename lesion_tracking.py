@@ -0,0 +1,297 @@
+import os
+import csv
+
+import numpy as np
+
+from volume_cache import load_volume
+from progression import mask_voxels, image_geometry
+
+# Neighbour offsets (dx, dy, dz) preceding a voxel in memory order; linking
+# every voxel to these covers each neighbouring pair exactly once
+_PRECEDING_26 = [(dx, dy, dz) for dz in (-1, 0, 1) for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                 if (dz, dy, dx) < (0, 0, 0)]
+CONNECTIVITY_OFFSETS = {
+    6: [offset for offset in _PRECEDING_26 if sum(map(abs, offset)) == 1],
+    18: [offset for offset in _PRECEDING_26 if sum(map(abs, offset)) <= 2],
+    26: _PRECEDING_26,
+}
+
+# Relative volume change beyond which a tracked lesion counts as enlarging or shrinking
+DEFAULT_CHANGE_THRESHOLD = 0.2
+
+LESION_STATUSES = ['baseline', 'new', 'stable', 'enlarging', 'shrinking', 'split', 'merged', 'disappeared']
+
+
+def _connected_roots(count, src, dst):
+    """
+    Return the smallest member index of the component of every node.
+
+    Vectorized union-find: each round hooks the larger of two linked roots
+    onto the smaller one, then compresses all paths by pointer jumping, and
+    drops the links that already join the same component.
+    """
+    parent = np.arange(count)
+    while src.size:
+        root_src = parent[src]
+        root_dst = parent[dst]
+        differ = root_src != root_dst
+        if not differ.any():
+            break
+        src, dst = src[differ], dst[differ]
+        root_src, root_dst = root_src[differ], root_dst[differ]
+        np.minimum.at(parent, np.maximum(root_src, root_dst), np.minimum(root_src, root_dst))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+def label_components(mask, dimensions, connectivity=26):
+    """
+    Label the connected components of a flat 3D mask.
+
+    Works on the foreground voxels only, so the cost scales with lesion
+    load rather than with the matrix size.
+
+    Args:
+        mask: Flat boolean array in x-fastest order
+        dimensions (tuple): (nx, ny, nz)
+        connectivity (int): 6, 18 or 26
+
+    Returns:
+        tuple: (sorted flat indices of the foreground voxels,
+                1-based component label of each of them, number of components)
+    """
+    nx, ny, nz = dimensions
+    foreground = np.flatnonzero(mask)
+    count = foreground.size
+    if count == 0:
+        return foreground, np.zeros(0, dtype=np.int32), 0
+
+    x = foreground % nx
+    y = (foreground // nx) % ny
+    z = foreground // (nx * ny)
+    coords = [(x, nx), (y, ny), (z, nz)]
+
+    sources, targets = [], []
+    for offset in CONNECTIVITY_OFFSETS[connectivity]:
+        inside = np.ones(count, dtype=bool)
+        for (axis, size), step in zip(coords, offset):
+            if step < 0:
+                inside &= axis > 0
+            elif step > 0:
+                inside &= axis < size - 1
+        candidates = np.flatnonzero(inside)
+        neighbours = foreground[candidates] + offset[0] + offset[1] * nx + offset[2] * nx * ny
+        positions = np.minimum(np.searchsorted(foreground, neighbours), count - 1)
+        linked = foreground[positions] == neighbours
+        sources.append(candidates[linked])
+        targets.append(positions[linked])
+
+    roots = _connected_roots(count, np.concatenate(sources), np.concatenate(targets))
+    _, labels = np.unique(roots, return_inverse=True)
+    labels = labels.astype(np.int32) + 1
+    return foreground, labels, int(labels.max())
+
+
+def _component_centroids(foreground, labels, count, dimensions, geometry):
+    """Return the world-space centroid (mm) of every component as an (count, 3) array."""
+    nx, ny, _ = dimensions
+    voxels = np.bincount(labels, minlength=count + 1)[1:]
+    index = np.stack([
+        np.bincount(labels, weights=coordinate, minlength=count + 1)[1:] / voxels
+        for coordinate in (foreground % nx, (foreground // nx) % ny, foreground // (nx * ny))
+    ], axis=1)
+    direction = np.array(geometry['direction']).reshape(3, 3)
+    return np.array(geometry['origin']) + (index * np.array(geometry['spacing'])) @ direction.T
+
+
+def _match_lesions(prev_labels, prev_foreground, curr_labels, curr_foreground, curr_count):
+    """
+    Pair lesions of consecutive sessions by voxel overlap.
+
+    Returns:
+        tuple: (dict current label -> previous label for the one-to-one matches,
+                set of previous labels overlapping any current lesion,
+                set of current labels overlapping any previous lesion)
+    """
+    _, prev_index, curr_index = np.intersect1d(prev_foreground, curr_foreground,
+                                               assume_unique=True, return_indices=True)
+    if prev_index.size == 0:
+        return {}, set(), set()
+
+    pairs = prev_labels[prev_index].astype(np.int64) * (curr_count + 1) + curr_labels[curr_index]
+    pairs, overlap = np.unique(pairs, return_counts=True)
+    prev_ids = pairs // (curr_count + 1)
+    curr_ids = pairs % (curr_count + 1)
+
+    # Largest overlaps claim their partners first
+    matches = {}
+    used_prev = set()
+    for i in np.argsort(-overlap, kind='stable'):
+        p, c = int(prev_ids[i]), int(curr_ids[i])
+        if c not in matches and p not in used_prev:
+            matches[c] = p
+            used_prev.add(p)
+    return matches, set(prev_ids.tolist()), set(curr_ids.tolist())
+
+
+def track_lesions(mask_files, connectivity=26, change_threshold=DEFAULT_CHANGE_THRESHOLD,
+                  should_stop=None):
+    """
+    Measure lesion load per session and follow individual lesions over time.
+
+    A lesion continues the track of the previous-session lesion it overlaps
+    most (one-to-one). Unmatched lesions are 'new', or 'split' if they
+    overlap a tracked lesion; previous lesions left without a partner are
+    'disappeared', or 'merged' if they overlap a current lesion.
+
+    Args:
+        mask_files (list): Chronologically sorted lesion mask paths on one voxel grid
+        connectivity (int): Voxel connectivity of a lesion (6, 18 or 26)
+        change_threshold (float): Relative volume change marking enlarging/shrinking
+        should_stop (callable): Polled between sessions; returning True aborts with None
+
+    Returns:
+        dict: 'sessions' (one summary row per session) and 'lesions' (one row
+        per lesion and session), or None if stopped
+    """
+    sessions, lesions = [], []
+    previous = None
+    next_track = 1
+
+    for path in mask_files:
+        if should_stop and should_stop():
+            return None
+
+        image = load_volume(path)
+        geometry = image_geometry(image)
+        dimensions = tuple(geometry['dimensions'])
+        voxel_mm3 = float(np.prod(geometry['spacing']))
+        if previous is not None and dimensions != previous['dimensions']:
+            raise ValueError(f"{os.path.basename(path)} is not on the voxel grid of the previous mask")
+
+        foreground, labels, count = label_components(mask_voxels(image) > 0, dimensions, connectivity)
+        volumes = np.bincount(labels, minlength=count + 1)[1:] * voxel_mm3
+        centroids = _component_centroids(foreground, labels, count, dimensions, geometry) if count else []
+        session = os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+        session_rows = []
+        tracks = np.zeros(count + 1, dtype=np.int64)
+        statuses = {}
+        previous_volumes = {}
+        if previous is None:
+            for label in range(1, count + 1):
+                statuses[label] = 'baseline'
+        else:
+            matches, prev_overlapping, curr_overlapping = _match_lesions(
+                previous['labels'], previous['foreground'], labels, foreground, count
+            )
+            for label in range(1, count + 1):
+                prev_label = matches.get(label)
+                if prev_label is None:
+                    statuses[label] = 'split' if label in curr_overlapping else 'new'
+                    continue
+                tracks[label] = previous['tracks'][prev_label]
+                prev_volume = previous['volumes'][prev_label - 1]
+                previous_volumes[label] = prev_volume
+                change = (volumes[label - 1] - prev_volume) / prev_volume
+                if change > change_threshold:
+                    statuses[label] = 'enlarging'
+                elif change < -change_threshold:
+                    statuses[label] = 'shrinking'
+                else:
+                    statuses[label] = 'stable'
+
+            # Lesions of the previous session that no current lesion continues
+            matched_prev = set(matches.values())
+            for prev_label in range(1, previous['count'] + 1):
+                if prev_label in matched_prev:
+                    continue
+                session_rows.append({
+                    'session': session,
+                    'track_id': int(previous['tracks'][prev_label]),
+                    'volume_mm3': 0.0,
+                    'previous_volume_mm3': float(previous['volumes'][prev_label - 1]),
+                    'status': 'merged' if prev_label in prev_overlapping else 'disappeared',
+                    'centroid_mm': [float(v) for v in previous['centroids'][prev_label - 1]],
+                })
+
+        for label in range(1, count + 1):
+            if tracks[label] == 0:
+                tracks[label] = next_track
+                next_track += 1
+            session_rows.append({
+                'session': session,
+                'track_id': int(tracks[label]),
+                'volume_mm3': float(volumes[label - 1]),
+                'previous_volume_mm3': (float(previous_volumes[label])
+                                        if label in previous_volumes else None),
+                'status': statuses[label],
+                'centroid_mm': [float(v) for v in centroids[label - 1]],
+            })
+
+        summary = {'session': session, 'total_volume_mm3': float(volumes.sum()), 'lesion_count': count}
+        for status in LESION_STATUSES:
+            summary[status] = sum(1 for row in session_rows if row['status'] == status)
+        sessions.append(summary)
+        lesions.extend(session_rows)
+
+        previous = {
+            'dimensions': dimensions,
+            'foreground': foreground,
+            'labels': labels,
+            'count': count,
+            'volumes': volumes,
+            'tracks': tracks,
+            'centroids': centroids,
+        }
+
+    return {'sessions': sessions, 'lesions': lesions}
+
+
+def write_lesion_csv(result, session_csv, lesion_csv=None):
+    """
+    Export a track_lesions result.
+
+    Args:
+        result (dict): Output of track_lesions
+        session_csv (str): File receiving one row per session
+        lesion_csv (str): File receiving one row per lesion and session
+            (default: session_csv with a _lesions suffix)
+
+    Returns:
+        tuple: Paths of the session and lesion files
+    """
+    if lesion_csv is None:
+        stem, extension = os.path.splitext(session_csv)
+        lesion_csv = f"{stem}_lesions{extension or '.csv'}"
+
+    with open(session_csv, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=['session', 'total_volume_mm3', 'lesion_count']
+                                + LESION_STATUSES)
+        writer.writeheader()
+        for row in result['sessions']:
+            writer.writerow(dict(row, total_volume_mm3=f"{row['total_volume_mm3']:.2f}"))
+
+    with open(lesion_csv, mode='w', newline='', encoding='utf-8') as file:
+        fieldnames = ['session', 'track_id', 'status', 'volume_mm3', 'previous_volume_mm3',
+                      'centroid_x_mm', 'centroid_y_mm', 'centroid_z_mm']
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in result['lesions']:
+            previous_volume = row['previous_volume_mm3']
+            writer.writerow({
+                'session': row['session'],
+                'track_id': row['track_id'],
+                'status': row['status'],
+                'volume_mm3': f"{row['volume_mm3']:.2f}",
+                'previous_volume_mm3': '' if previous_volume is None else f"{previous_volume:.2f}",
+                'centroid_x_mm': f"{row['centroid_mm'][0]:.1f}",
+                'centroid_y_mm': f"{row['centroid_mm'][1]:.1f}",
+                'centroid_z_mm': f"{row['centroid_mm'][2]:.1f}",
+            })
+
+    return session_csv, lesion_csv
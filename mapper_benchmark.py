@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from volume_mappers import MAPPER_BACKENDS
+
+DEFAULT_BENCHMARK_FRAMES = 20
+DEFAULT_BENCHMARK_SIZE = 384
+
+
+def benchmark_backend(subject_path, session, backend, threads=None, size=DEFAULT_BENCHMARK_SIZE,
+                      frames=DEFAULT_BENCHMARK_FRAMES, direction='axial', thickness=10):
+    """
+    Time one mapper backend rendering a session offscreen, scrolling the slab through the volume.
+
+    Runs in its own process, so the backend is configured before any
+    pipeline exists and a failing GPU context cannot affect other runs.
+    Volumes are decoded before timing starts.
+
+    Returns:
+        dict: Backend description, pipeline setup time and per-frame render times
+    """
+    # Imported in the worker so the parent never creates a render window
+    from batch_render import BatchScene, MODALITIES
+    from volume_cache import load_volumes
+    from volume_mappers import get_mapper_factory
+
+    get_mapper_factory().configure(backend, threads)
+    scene = BatchScene(subject_path, tile_size=size, thickness=thickness)
+    files = [scene.manifest.find_file(session, role) for role in MODALITIES + ['lesion', 'prl']]
+    load_volumes([path for path in files if path])
+
+    start = time.perf_counter()
+    scene.load_session(session)
+    setup = time.perf_counter() - start
+
+    scene.set_slab(direction, 0.5)
+    start = time.perf_counter()
+    scene.render()
+    first_frame = time.perf_counter() - start
+
+    frame_times = []
+    for i in range(frames):
+        scene.set_slab(direction, 0.2 + 0.6 * i / max(1, frames - 1))
+        start = time.perf_counter()
+        scene.render()
+        frame_times.append(time.perf_counter() - start)
+
+    mean = statistics.mean(frame_times)
+    return {
+        'backend': backend,
+        'description': get_mapper_factory().describe(),
+        'setup_s': setup,
+        'first_frame_ms': 1000 * first_frame,
+        'mean_frame_ms': 1000 * mean,
+        'median_frame_ms': 1000 * statistics.median(frame_times),
+        'max_frame_ms': 1000 * max(frame_times),
+        'fps': 1 / mean if mean > 0 else 0.0,
+    }
+
+
+def run_benchmark(subject_path, session=None, backends=None, **options):
+    """
+    Compare mapper backends on the same session, one fresh process per backend.
+
+    Args:
+        subject_path (str): Subject directory containing ses-YYYYMMDD folders
+        session (str): Session to render (default: the first one)
+        backends (list): Backends to compare (default: all)
+        **options: Forwarded to benchmark_backend
+
+    Returns:
+        list: One result dict per backend that completed
+    """
+    from subject_manifest import SubjectManifest
+
+    if session is None:
+        sessions = SubjectManifest(subject_path).sessions()
+        if not sessions:
+            raise ValueError(f"No sessions found in {subject_path}")
+        session = sessions[0]
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for backend in backends or MAPPER_BACKENDS:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                result = pool.submit(benchmark_backend, subject_path, session, backend, **options).result()
+            except Exception as e:
+                print(f"Error benchmarking {backend}: {str(e)}")
+                continue
+        result['session'] = session
+        results.append(result)
+        print(f"{result['description']:<20} setup {result['setup_s']:6.2f} s   "
+              f"first frame {result['first_frame_ms']:8.1f} ms   "
+              f"scroll {result['mean_frame_ms']:8.1f} ms/frame (median {result['median_frame_ms']:.1f}, "
+              f"max {result['max_frame_ms']:.1f}, {result['fps']:.1f} fps)")
+    return results
+
+
+def parse_backend_list(value):
+    backends = [backend.strip().lower() for backend in value.split(',') if backend.strip()]
+    unknown = [backend for backend in backends if backend not in MAPPER_BACKENDS]
+    if unknown or not backends:
+        raise argparse.ArgumentTypeError(
+            f"Backends must be a comma-separated subset of {','.join(MAPPER_BACKENDS)}")
+    return backends
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Compare the volume mapper backends rendering one session offscreen")
+    parser.add_argument("subject_path", help="Subject directory containing ses-YYYYMMDD folders")
+    parser.add_argument("--session", default=None, help="Session to render (default: the first one)")
+    parser.add_argument("--backends", type=parse_backend_list, default=MAPPER_BACKENDS,
+                        help="Comma-separated backends to compare (default: %s)" % ','.join(MAPPER_BACKENDS))
+    parser.add_argument("--frames", type=int, default=DEFAULT_BENCHMARK_FRAMES,
+                        help="Slab positions rendered per backend (default: %d)" % DEFAULT_BENCHMARK_FRAMES)
+    parser.add_argument("--size", type=int, default=DEFAULT_BENCHMARK_SIZE,
+                        help="Width and height of each view in pixels (default: %d)" % DEFAULT_BENCHMARK_SIZE)
+    parser.add_argument("--threads", type=int, default=None,
+                        help="CPU ray casting threads (default: one per core)")
+    parser.add_argument("--direction", choices=['axial', 'coronal', 'sagittal'], default='axial',
+                        help="Scrolling direction (default: axial)")
+    parser.add_argument("--thickness", type=float, default=10, help="Slab thickness (default: 10)")
+    parser.add_argument("--json", metavar="FILE", default=None, help="Also write the results to FILE")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    subject_path = os.path.abspath(args.subject_path)
+    if not os.path.isdir(subject_path):
+        print(f"Error: Directory not found: {subject_path}")
+        sys.exit(1)
+
+    try:
+        results = run_benchmark(subject_path, args.session, args.backends, threads=args.threads,
+                                size=args.size, frames=args.frames, direction=args.direction,
+                                thickness=args.thickness)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+    if args.json:
+        with open(args.json, mode='w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.json}")
+    sys.exit(0 if results else 1)
+
+
+if __name__ == "__main__":
+    main()
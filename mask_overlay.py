@@ -1,12 +1,16 @@
 import os
 import glob
 import vtk
+from volume_cache import load_volume
+from volume_mappers import create_volume_mapper
 
 class MaskOverlay:
     """Handles loading and visualization of lesion and PRL masks with slice synchronization."""
     
-    def __init__(self, session_path):
+    def __init__(self, session_path, images=None, manifest=None):
         self.session_path = session_path
+        self.images = images or {}  # Pre-decoded masks keyed by file path
+        self.manifest = manifest    # SubjectManifest used instead of globbing when given
         self.lesion_mask = None
         self.prl_mask = None
         self.actors = {}
@@ -25,6 +29,13 @@ class MaskOverlay:
         
     def load_masks(self):
         """Load lesion and PRL masks for the current session."""
+        if self.manifest is not None:
+            self.lesion_mask = self.manifest.find_file(self.session_path, 'lesion')
+            self.prl_mask = self.manifest.find_file(self.session_path, 'prl')
+            if not self.lesion_mask or not self.prl_mask:
+                raise FileNotFoundError(f"Mask files not found in {self.session_path}")
+            return
+            
         lesion_pattern = os.path.join(self.session_path, "*Lreg_lesionmask.nii.gz")
         prl_pattern = os.path.join(self.session_path, "*Lreg_PRLmask.nii.gz")
         
@@ -37,14 +48,17 @@ class MaskOverlay:
         self.lesion_mask = lesion_files[0]
         self.prl_mask = prl_files[0]
         
+    def get_mask_image(self, mask_file):
+        """Return the decoded mask, shared across viewports through the volume cache."""
+        image = self.images.get(mask_file)
+        if image is None:
+            image = load_volume(mask_file)
+        return image
+        
     def create_mask_actor(self, mask_file, mask_type):
         """Create a VTK actor for solid mask visualization using volume rendering."""
-        reader = vtk.vtkNIFTIImageReader()
-        reader.SetFileName(mask_file)
-        reader.Update()
-        
-        mapper = vtk.vtkGPUVolumeRayCastMapper()
-        mapper.SetInputConnection(reader.GetOutputPort())
+        mapper = create_volume_mapper()
+        mapper.SetInputData(self.get_mask_image(mask_file))
         mapper.CroppingOn()
         mapper.SetCroppingRegionFlags(vtk.VTK_CROP_SUBVOLUME)
         
@@ -114,6 +128,30 @@ class MaskOverlay:
         if self.slice_planes and self.slice_planes.global_bounds:
             self.update_clipping_bounds(modality)
         
+    def replace_masks(self, session_path, images=None):
+        """
+        Point the existing mask volumes at the masks of another session.
+        
+        Mappers, volumes and properties are kept, so visibility and opacity
+        settings carry over without rebuilding anything.
+        
+        Args:
+            session_path (str): Path to the new session directory
+            images (dict): Pre-decoded masks keyed by file path
+        """
+        self.session_path = session_path
+        self.images = images or {}
+        self.load_masks()
+        
+        lesion_image = self.get_mask_image(self.lesion_mask)
+        prl_image = self.get_mask_image(self.prl_mask)
+        for mappers in self.volume_mappers.values():
+            mappers['lesion'].SetInputData(lesion_image)
+            mappers['prl'].SetInputData(prl_image)
+            
+        if self.slice_planes and self.slice_planes.global_bounds:
+            self.update_clipping_bounds()
+        
     def remove_from_renderer(self, renderer, modality):
         """Remove mask overlays from a specific renderer."""
         if modality in self.actors:
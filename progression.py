@@ -0,0 +1,427 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+from volume_cache import load_volume
+from progression_interpolation import interpolation_support, interpolate_mask, MAX_INTERPOLATION_DISTANCE_MM
+
+# Label values of the per-timepoint progression volumes
+LABEL_NONE = 0
+LABEL_STABLE = 1
+LABEL_GROWTH = 2
+LABEL_REDUCTION = 3
+
+# Region type -> (label value, RGB colour)
+REGION_LABELS = {
+    'stable': (LABEL_STABLE, (1.0, 0.5, 1.0)),         # Magenta
+    'growth': (LABEL_GROWTH, (1.0, 0.25, 0.25)),       # Red
+    'reduction': (LABEL_REDUCTION, (0.25, 0.5, 1.0)),  # Blue
+}
+
+# Label of a voxel indexed by 2 * (in previous mask) + (in current mask)
+TRANSITION_LABELS = np.array([LABEL_NONE, LABEL_GROWTH, LABEL_REDUCTION, LABEL_STABLE], dtype=np.uint8)
+
+
+def compute_transition_labels(prev_data, curr_data):
+    """
+    Classify every voxel of two consecutive masks into a single uint8 label map.
+
+    Args:
+        prev_data: Mask of the previous timepoint
+        curr_data: Mask of the current timepoint (same shape)
+
+    Returns:
+        np.ndarray: LABEL_NONE, LABEL_STABLE, LABEL_GROWTH or LABEL_REDUCTION per voxel
+    """
+    index = (prev_data > 0).view(np.uint8) << 1
+    index |= (curr_data > 0).view(np.uint8)
+    return TRANSITION_LABELS[index]
+
+
+def mask_voxels(image):
+    """Return the voxels of a mask image as a flat array sharing its buffer."""
+    return numpy_support.vtk_to_numpy(image.GetPointData().GetScalars())
+
+
+def image_geometry(image):
+    """
+    Describe where the voxels of an image lie in space.
+
+    Returns:
+        dict: dimensions, spacing, origin and the 9 row-major direction matrix values
+    """
+    direction = image.GetDirectionMatrix()
+    return {
+        'dimensions': list(image.GetDimensions()),
+        'spacing': list(image.GetSpacing()),
+        'origin': list(image.GetOrigin()),
+        'direction': [direction.GetElement(i, j) for i in range(3) for j in range(3)],
+    }
+
+
+def set_label_opacity(opacity_tf, opacity, visible=None):
+    """
+    Fill a label opacity function, making the labels of hidden region types fully transparent.
+
+    Args:
+        opacity_tf (vtkPiecewiseFunction): Opacity function to refill
+        opacity (float): Opacity of the visible labels
+        visible (dict): Region type -> shown; region types left out are shown
+    """
+    visible = visible or {}
+    opacity_tf.RemoveAllPoints()
+    opacity_tf.AddPoint(LABEL_NONE, 0)
+    for region_type, (label, _) in REGION_LABELS.items():
+        opacity_tf.AddPoint(label, opacity if visible.get(region_type, True) else 0)
+
+
+def create_label_property(opacity=0.6, visible=None):
+    """
+    Create the volume property rendering label frames with one colour per region type.
+
+    Returns:
+        tuple: (vtkVolumeProperty, its opacity vtkPiecewiseFunction for set_label_opacity)
+    """
+    volume_property = vtk.vtkVolumeProperty()
+    volume_property.ShadeOn()
+
+    color_tf = vtk.vtkColorTransferFunction()
+    color_tf.AddRGBPoint(LABEL_NONE, 0, 0, 0)
+    for label, color in REGION_LABELS.values():
+        color_tf.AddRGBPoint(label, *color)
+
+    opacity_tf = vtk.vtkPiecewiseFunction()
+    set_label_opacity(opacity_tf, opacity, visible)
+
+    volume_property.SetColor(color_tf)
+    volume_property.SetScalarOpacity(opacity_tf)
+    # Interpolating between labels would invent classes at region borders
+    volume_property.SetInterpolationTypeToNearest()
+
+    # Enhanced lighting for better depth perception
+    volume_property.SetAmbient(0.4)
+    volume_property.SetDiffuse(0.6)
+    volume_property.SetSpecular(0.2)
+    volume_property.SetSpecularPower(10)
+    return volume_property, opacity_tf
+
+
+def aim_camera(camera, bounds):
+    """Point a camera at the centre of a volume from the front (+y side), as progression is viewed."""
+    center = [
+        (bounds[1] + bounds[0]) / 2,
+        (bounds[3] + bounds[2]) / 2,
+        (bounds[5] + bounds[4]) / 2
+    ]
+    camera.SetViewUp(0, 0, -1)
+    camera.SetPosition(center[0], bounds[3] + (bounds[3] - bounds[2]), center[2])
+    camera.SetFocalPoint(center)
+
+
+class ProgressionFrames:
+    """
+    Label frames of a longitudinal mask series, computed on demand.
+
+    Frame i labels the change from mask i-1 to mask i; in frame 0 the whole
+    first mask is stable. With substeps, that many intermediate frames
+    interpolated from signed distance transforms precede each timepoint
+    after the first (see frame_time). Only the max_frames most recently used frames are
+    kept. Frames can be scheduled on a worker pool (mask decoding and the
+    NumPy comparisons release the GIL) and picked up with peek once done, so
+    a GUI never has to block on them. With a ProgressionCache, frames
+    computed once are read back from disk instead of decoding the masks.
+    """
+
+    def __init__(self, mask_files, max_frames=10, workers=None, cache=None, substeps=0,
+                 max_distance=None):
+        """
+        Args:
+            mask_files (list): Chronologically sorted lesion mask paths
+            max_frames (int): Number of materialized frames kept in memory
+            workers (int): Worker threads computing scheduled frames (default: up to 4)
+            cache (ProgressionCache): On-disk cache of computed frames, or None
+            substeps (int): Interpolated frames between consecutive timepoints
+            max_distance (float): Clipping distance of the signed distances in mm
+                (default: MAX_INTERPOLATION_DISTANCE_MM)
+        """
+        self.mask_files = list(mask_files)
+        self.cache = cache
+        self.max_frames = max(1, max_frames)
+        self.substeps = max(0, int(substeps))
+        self.max_distance = max_distance or MAX_INTERPOLATION_DISTANCE_MM
+        self._supports = {}           # timepoint -> (indices, prev distances, curr distances, geometry)
+        self._support_locks = {}      # timepoint -> Lock held while its support is computed
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()  # frame index -> vtkImageData
+        self._pending = {}            # frame index -> Future
+        self._errors = {}             # frame index -> exception of the last attempt
+        self._cancelled = threading.Event()
+        workers = workers or max(1, min(4, os.cpu_count() or 1))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="progression")
+        self.computed = 0
+
+    def __len__(self):
+        if not self.mask_files:
+            return 0
+        return (len(self.mask_files) - 1) * (self.substeps + 1) + 1
+
+    def frame_time(self, index):
+        """
+        Return which timepoint a frame leads up to and how far.
+
+        Returns:
+            tuple: (timepoint, fraction), fraction 1.0 for the frame of the timepoint itself
+        """
+        steps = self.substeps + 1
+        timepoint = -(-index // steps)
+        return timepoint, 1.0 - (timepoint * steps - index) / steps
+
+    def keyframe(self, timepoint):
+        """Return the index of the frame showing a timepoint itself."""
+        return timepoint * (self.substeps + 1)
+
+    def _load_mask(self, path):
+        """Decode a mask unless the frames were shut down meanwhile."""
+        if self._cancelled.is_set():
+            raise CancelledError()
+        return load_volume(path)
+
+    def compute_labels(self, timepoint):
+        """Compute the flat uint8 label array of a timepoint."""
+        curr_data = mask_voxels(self._load_mask(self.mask_files[timepoint]))
+        if timepoint == 0:
+            # Reinterpret the boolean mask in place instead of converting it
+            labels = (curr_data > 0).view(np.uint8)
+            labels *= LABEL_STABLE
+            return labels
+        prev_data = mask_voxels(self._load_mask(self.mask_files[timepoint - 1]))
+        return compute_transition_labels(prev_data, curr_data)
+
+    def get_support(self, timepoint):
+        """
+        Return the interpolation support between a timepoint and its predecessor.
+
+        Computed once per mask pair, then kept in memory (it only covers the
+        lesion voxels) and in the disk cache.
+
+        Returns:
+            tuple: (flat indices, previous signed distances, current signed distances, geometry)
+        """
+        with self._lock:
+            support = self._supports.get(timepoint)
+            lock = self._support_locks.setdefault(timepoint, threading.Lock())
+        if support is not None:
+            return support
+
+        # Workers interpolating the same pair wait for one computation
+        with lock:
+            with self._lock:
+                support = self._supports.get(timepoint)
+            if support is not None:
+                return support
+
+            prev_path, curr_path = self.mask_files[timepoint - 1], self.mask_files[timepoint]
+            support = self.cache.load_support(prev_path, curr_path, self.max_distance) if self.cache else None
+            if support is None:
+                prev_image = self._load_mask(prev_path)
+                geometry = image_geometry(prev_image)
+                distances = interpolation_support(mask_voxels(prev_image),
+                                                  mask_voxels(self._load_mask(curr_path)),
+                                                  geometry, self.max_distance)
+                if self.cache:
+                    self.cache.store_support(prev_path, curr_path, self.max_distance, distances, geometry)
+                support = distances + (geometry,)
+
+            with self._lock:
+                self._supports[timepoint] = support
+        return support
+
+    def compute_frame(self, index):
+        """Return the label image of a frame, from the disk cache if possible, bypassing the memory LRU."""
+        timepoint, fraction = self.frame_time(index)
+        if fraction < 1.0:
+            # Intermediate masks lie within the union of both masks, so only it is labelled
+            indices, prev_distance, curr_distance, geometry = self.get_support(timepoint)
+            inside = interpolate_mask(prev_distance, curr_distance, fraction)
+            labels = np.zeros(int(np.prod(geometry['dimensions'])), dtype=np.uint8)
+            labels[indices] = compute_transition_labels(prev_distance < 0, inside)
+            return self.create_label_image(labels, geometry)
+
+        prev_path = self.mask_files[timepoint - 1] if timepoint > 0 else None
+        curr_path = self.mask_files[timepoint]
+
+        cached = self.cache.load(prev_path, curr_path) if self.cache else None
+        if cached is not None:
+            labels, geometry = cached
+        else:
+            reference = self._load_mask(curr_path)
+            labels = self.compute_labels(timepoint)
+            geometry = image_geometry(reference)
+            with self._lock:
+                self.computed += 1
+            if self.cache:
+                self.cache.store(prev_path, curr_path, labels, geometry)
+        return self.create_label_image(labels, geometry)
+
+    def create_label_image(self, labels, geometry):
+        """
+        Wrap a flat uint8 label array into a VTK image without copying it.
+
+        The flat array is already in VTK's x-fastest voxel order because it
+        was computed from the masks' own buffers, so no reshape is needed.
+
+        Args:
+            labels: Flat, contiguous uint8 array in the voxel order of the masks
+            geometry (dict): Geometry of the masks, as returned by image_geometry
+
+        Returns:
+            vtk.vtkImageData: Label image ready to be set as mapper input
+        """
+        # numpy_to_vtk keeps a reference to labels on the VTK array
+        vtk_data = numpy_support.numpy_to_vtk(
+            labels,
+            deep=False,
+            array_type=vtk.VTK_UNSIGNED_CHAR
+        )
+
+        img = vtk.vtkImageData()
+        img.SetDimensions(geometry['dimensions'])
+        img.SetSpacing(geometry['spacing'])
+        img.SetOrigin(geometry['origin'])
+        img.SetDirectionMatrix(geometry['direction'])
+        img.GetPointData().SetScalars(vtk_data)
+        return img
+
+    def get(self, index):
+        """
+        Return the label image of a frame, computing it if it is not cached.
+
+        Waits for a read-ahead that is already computing the frame.
+        """
+        with self._lock:
+            image = self._frames.get(index)
+            if image is not None:
+                self._frames.move_to_end(index)
+                return image
+            future = self._pending.get(index)
+
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass  # Recompute below so the error surfaces here
+
+        image = self.compute_frame(index)
+        self._store(index, image)
+        return image
+
+    def peek(self, index):
+        """Return the label image of a frame if it is materialized, else None."""
+        with self._lock:
+            image = self._frames.get(index)
+            if image is not None:
+                self._frames.move_to_end(index)
+            return image
+
+    def is_ready(self, index):
+        """Return True if a frame is materialized."""
+        with self._lock:
+            return index in self._frames
+
+    def is_pending(self, index):
+        """Return True if a frame is scheduled or being computed."""
+        with self._lock:
+            return index in self._pending
+
+    def error(self, index):
+        """Return the exception of a failed frame computation, or None."""
+        with self._lock:
+            return self._errors.get(index)
+
+    def schedule(self, frames):
+        """
+        Compute frames on the worker pool, skipping cached and already scheduled ones.
+
+        Args:
+            frames (iterable): Frame indices, submitted in the given order
+        """
+        if self._cancelled.is_set():
+            return
+        with self._lock:
+            for frame in frames:
+                if frame in self._frames or frame in self._pending:
+                    continue
+                self._errors.pop(frame, None)
+                self._pending[frame] = self._executor.submit(self._compute_and_store, frame)
+
+    def read_ahead(self, index, count):
+        """
+        Compute up to count frames starting at index in the background.
+
+        Args:
+            index (int): First frame to compute
+            count (int): Number of frames, capped so they fit the cache next to the shown one
+        """
+        count = min(count, self.max_frames - 1)
+        self.schedule(range(index, min(index + count, len(self))))
+
+    def schedule_supports(self, first_timepoint=1):
+        """
+        Compute the interpolation supports of all timepoints on the worker pool.
+
+        Starts at first_timepoint and wraps around, so the pairs playback
+        reaches first are ready first. Does nothing without substeps.
+        """
+        if not self.substeps or self._cancelled.is_set():
+            return
+        count = len(self.mask_files)
+        for offset in range(count - 1):
+            timepoint = (max(1, first_timepoint) - 1 + offset) % (count - 1) + 1
+            with self._lock:
+                if timepoint in self._supports:
+                    continue
+            self._executor.submit(self.get_support, timepoint)
+
+    def _compute_and_store(self, index):
+        """Worker: compute and cache one frame."""
+        try:
+            image = self.compute_frame(index)
+            self._store(index, image)
+            return image
+        except CancelledError:
+            raise
+        except Exception as e:
+            with self._lock:
+                self._errors[index] = e
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(index, None)
+
+    def _store(self, index, image):
+        """Cache a frame, evicting least recently used frames beyond max_frames."""
+        with self._lock:
+            self._frames[index] = image
+            self._frames.move_to_end(index)
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+
+    def clear(self):
+        """Drop all materialized frames."""
+        with self._lock:
+            self._frames.clear()
+
+    def shutdown(self):
+        """Cancel scheduled frames, stop running ones at their next step and release all frames."""
+        self._cancelled.set()
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._frames.clear()
+        self._executor.shutdown(wait=False)
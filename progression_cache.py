@@ -0,0 +1,165 @@
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+
+CACHE_FORMAT_VERSION = 2
+
+# Directory inside the subject folder holding the cached progression frames
+PROGRESSION_CACHE_DIRNAME = ".mri_viewer_progression"
+
+
+def _source_stat(path):
+    """Return the (mtime in ns, size) of a mask file, or None for the missing predecessor of frame 0."""
+    if path is None:
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class ProgressionCache:
+    """
+    On-disk cache of the progression label frame of each pair of consecutive masks.
+
+    An entry is keyed by the previous and current mask paths and validated
+    against their mtime and size, so an edited mask is recomputed. Labels
+    are stored sparsely (flat indices and values of the non-zero voxels)
+    together with the frame geometry: lesions cover a tiny fraction of the
+    brain, so entries are small and load without decoding either mask.
+    Interpolation supports (signed distances on the union of both masks)
+    are cached per pair the same way.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        Args:
+            cache_dir (str): Directory holding the cached frames
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.hits = 0
+        self.misses = 0
+        self.writable = True
+
+    def _entry_path(self, prev_path, curr_path, kind=None):
+        """Return the cache file of a mask pair; kind tells other entry types apart from label frames."""
+        key = f"{os.path.abspath(prev_path) if prev_path else ''}|{os.path.abspath(curr_path)}"
+        if kind:
+            key += f"|{kind}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.npz')
+
+    def _meta(self, prev_path, curr_path):
+        """Describe the sources of an entry as stored in and compared against the cache."""
+        return {
+            'version': CACHE_FORMAT_VERSION,
+            'previous': os.path.abspath(prev_path) if prev_path else None,
+            'current': os.path.abspath(curr_path),
+            'previous_stat': _source_stat(prev_path),
+            'current_stat': _source_stat(curr_path),
+        }
+
+    def _read(self, prev_path, curr_path, kind=None):
+        """Return (meta, arrays) of a current entry, or None on a miss."""
+        path = self._entry_path(prev_path, curr_path, kind)
+        try:
+            expected = self._meta(prev_path, curr_path)
+            with np.load(path) as entry:
+                meta = json.loads(str(entry['meta']))
+                if any(meta.get(key) != value for key, value in expected.items()):
+                    self.misses += 1
+                    return None
+                arrays = {name: entry[name] for name in entry.files if name != 'meta'}
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return meta, arrays
+
+    def _write(self, prev_path, curr_path, meta, arrays, kind=None):
+        """Atomically write an entry; an unwritable cache directory only costs recomputation."""
+        if not self.writable:
+            return
+        meta = dict(self._meta(prev_path, curr_path), **meta)
+
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.npz.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+            os.replace(tmp_path, self._entry_path(prev_path, curr_path, kind))
+        except OSError as e:
+            print(f"Warning: Could not write progression cache - {str(e)}")
+            self.writable = False
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, prev_path, curr_path):
+        """
+        Return the cached frame of a mask pair if it is current.
+
+        Args:
+            prev_path (str): Previous mask, None for the first timepoint
+            curr_path (str): Current mask
+
+        Returns:
+            tuple: (flat uint8 labels, geometry dict), or None on a miss
+        """
+        cached = self._read(prev_path, curr_path)
+        if cached is None:
+            return None
+        meta, arrays = cached
+        labels = np.zeros(meta['voxels'], dtype=np.uint8)
+        labels[arrays['indices']] = arrays['values']
+        return labels, meta['geometry']
+
+    def store(self, prev_path, curr_path, labels, geometry):
+        """
+        Write the frame of a mask pair.
+
+        Args:
+            prev_path (str): Previous mask, None for the first timepoint
+            curr_path (str): Current mask
+            labels: Flat uint8 label array
+            geometry (dict): Geometry needed to rebuild the label image
+        """
+        indices = np.flatnonzero(labels)
+        self._write(prev_path, curr_path,
+                    {'voxels': int(labels.size), 'geometry': geometry},
+                    {'indices': indices.astype(_index_type(labels.size)), 'values': labels[indices]})
+
+    def load_support(self, prev_path, curr_path, max_distance):
+        """
+        Return the cached interpolation support of a mask pair if it is current.
+
+        Returns:
+            tuple: (flat indices, previous signed distances, current signed distances,
+                    geometry dict), or None on a miss
+        """
+        cached = self._read(prev_path, curr_path, _support_kind(max_distance))
+        if cached is None:
+            return None
+        meta, arrays = cached
+        return arrays['indices'], arrays['previous'], arrays['current'], meta['geometry']
+
+    def store_support(self, prev_path, curr_path, max_distance, support, geometry):
+        """Write the interpolation support of a mask pair (see interpolation_support)."""
+        indices, prev_distance, curr_distance = support
+        voxels = int(np.prod(geometry['dimensions']))
+        self._write(prev_path, curr_path, {'geometry': geometry},
+                    {'indices': indices.astype(_index_type(voxels)),
+                     'previous': prev_distance, 'current': curr_distance},
+                    kind=_support_kind(max_distance))
+
+
+def _index_type(voxels):
+    """Return the smallest unsigned type able to hold flat indices of a volume."""
+    return np.uint32 if voxels <= np.iinfo(np.uint32).max else np.uint64
+
+
+def _support_kind(max_distance):
+    """Name interpolation support entries after their clipping distance."""
+    return f"support-{max_distance:g}mm"
@@ -0,0 +1,281 @@
+import os
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import vtk
+
+from progression import ProgressionFrames, create_label_property, aim_camera
+from progression_cache import ProgressionCache
+from volume_mappers import VolumeMapperFactory
+
+DEFAULT_EXPORT_SIZE = (1280, 720)
+
+# Containers encoded by the Theora writer built into VTK; anything else needs ffmpeg
+VTK_VIDEO_EXTENSIONS = ['.ogv', '.ogg']
+FFMPEG_VIDEO_EXTENSIONS = ['.mp4', '.mov', '.mkv', '.avi', '.webm']
+
+FRAME_PATTERN = "frame_{:04d}.png"
+
+
+def subject_lesion_masks(manifest):
+    """Return the lesion mask of every session of a subject that has one, in chronological order."""
+    masks = [manifest.find_file(session, 'lesion') for session in manifest.sessions()]
+    return [path for path in masks if path]
+
+
+def camera_settings(camera):
+    """Capture the pose of a camera so worker processes can reproduce it."""
+    return {
+        'position': camera.GetPosition(),
+        'focal_point': camera.GetFocalPoint(),
+        'view_up': camera.GetViewUp(),
+        'view_angle': camera.GetViewAngle(),
+    }
+
+
+def _apply_camera(camera, settings):
+    """Restore a pose captured by camera_settings."""
+    camera.SetPosition(settings['position'])
+    camera.SetFocalPoint(settings['focal_point'])
+    camera.SetViewUp(settings['view_up'])
+    camera.SetViewAngle(settings['view_angle'])
+
+
+def _split_timepoints(count, chunks):
+    """Split timepoints into contiguous runs so every worker computes each of its frames once."""
+    bounds = [round(i * count / chunks) for i in range(chunks + 1)]
+    return [list(range(bounds[i], bounds[i + 1])) for i in range(chunks) if bounds[i] < bounds[i + 1]]
+
+
+def render_timepoints(mask_files, timepoints, frame_pattern, size=DEFAULT_EXPORT_SIZE,
+                      frames_per_timepoint=1, orbit_degrees=0.0, camera=None, visible=None,
+                      opacity=0.6, cache_dir=None, threads=None):
+    """
+    Render the progression frames of some timepoints offscreen into numbered PNGs.
+
+    Uses the fixed-point CPU ray caster, so no GPU is needed. Runs in a
+    worker process, so everything is passed as plain values.
+
+    Args:
+        mask_files (list): Chronologically sorted lesion mask paths (the whole series)
+        timepoints (list): Timepoints to render
+        frame_pattern (str): Path format of the PNGs, numbered over the whole video
+        size (tuple): Output width and height in pixels
+        frames_per_timepoint (int): Video frames showing each timepoint
+        orbit_degrees (float): Camera rotation about the volume over the whole video
+        camera (dict): Pose from camera_settings, or None to frame the volume like the viewer
+        visible (dict): Region type -> shown, see set_label_opacity
+        opacity (float): Opacity of the visible labels
+        cache_dir (str): Progression cache directory, or None
+        threads (int): Ray casting threads (default: VTK's choice)
+
+    Returns:
+        int: Number of PNGs written
+    """
+    cache = ProgressionCache(cache_dir) if cache_dir else None
+    frames = ProgressionFrames(mask_files, max_frames=1, workers=1, cache=cache)
+    total_frames = len(mask_files) * frames_per_timepoint
+
+    window = vtk.vtkRenderWindow()
+    window.SetOffScreenRendering(1)
+    window.SetSize(*size)
+    renderer = vtk.vtkRenderer()
+    renderer.SetBackground(0.0, 0.0, 0.0)
+    window.AddRenderer(renderer)
+
+    # Workers render on the CPU whatever backend the viewer uses
+    mapper = VolumeMapperFactory('cpu', threads).create()
+    # Keep full quality; the adaptive sampling only pays off interactively
+    mapper.AutoAdjustSampleDistancesOff()
+    volume = vtk.vtkVolume()
+    volume.SetMapper(mapper)
+    volume.SetProperty(create_label_property(opacity, visible)[0])
+    renderer.AddVolume(volume)
+
+    caption = vtk.vtkTextActor()
+    caption.GetTextProperty().SetFontSize(max(12, size[1] // 36))
+    caption.GetTextProperty().SetColor(1.0, 1.0, 1.0)
+    caption.SetDisplayPosition(10, 10)
+    renderer.AddViewProp(caption)
+
+    grabber = vtk.vtkWindowToImageFilter()
+    grabber.SetInput(window)
+    grabber.ReadFrontBufferOff()
+    writer = vtk.vtkPNGWriter()
+    writer.SetInputConnection(grabber.GetOutputPort())
+
+    written = 0
+    try:
+        for timepoint in timepoints:
+            mapper.SetInputData(frames.get(timepoint))
+            if camera is None:
+                # Every mask lies on the same grid, so all workers frame the volume alike
+                aim_camera(renderer.GetActiveCamera(), volume.GetBounds())
+                renderer.ResetCamera()
+                camera = camera_settings(renderer.GetActiveCamera())
+
+            session = os.path.basename(os.path.dirname(os.path.abspath(mask_files[timepoint])))
+            caption.SetInput(f"Timepoint {timepoint + 1}/{len(mask_files)}  {session}")
+
+            for step in range(frames_per_timepoint):
+                frame = timepoint * frames_per_timepoint + step
+                # With a fixed camera the frames of a timepoint are identical; render only the first
+                if orbit_degrees or step == 0:
+                    _apply_camera(renderer.GetActiveCamera(), camera)
+                    renderer.GetActiveCamera().Azimuth(orbit_degrees * frame / total_frames)
+                    renderer.ResetCameraClippingRange()
+                    window.Render()
+                    grabber.Modified()
+                writer.SetFileName(frame_pattern.format(frame))
+                writer.Write()
+                written += 1
+    finally:
+        frames.shutdown()
+        window.Finalize()
+    return written
+
+
+def encode_video(frame_dir, frame_count, output, fps):
+    """
+    Encode numbered PNGs into a video file.
+
+    Ogg/Theora is written by VTK itself; other containers are handed to an
+    ffmpeg executable on the PATH.
+
+    Raises:
+        RuntimeError: If the container needs ffmpeg and none is installed, or encoding fails
+    """
+    extension = os.path.splitext(output)[1].lower()
+    frame_paths = [os.path.join(frame_dir, FRAME_PATTERN.format(i)) for i in range(frame_count)]
+
+    if extension in VTK_VIDEO_EXTENSIONS:
+        reader = vtk.vtkPNGReader()
+        writer = vtk.vtkOggTheoraWriter()
+        writer.SetInputConnection(reader.GetOutputPort())
+        writer.SetFileName(output)
+        writer.SetRate(max(1, int(round(fps))))
+        writer.SetQuality(2)
+        reader.SetFileName(frame_paths[0])
+        reader.Update()
+        writer.Start()
+        for path in frame_paths:
+            reader.SetFileName(path)
+            reader.Modified()
+            writer.Write()
+        writer.End()
+        if writer.GetError():
+            raise RuntimeError(f"Theora encoding of {output} failed")
+        return
+
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError(f"Writing {extension} video requires ffmpeg on the PATH; "
+                           f"use {' or '.join(VTK_VIDEO_EXTENSIONS)} or a PNG sequence instead")
+    command = [
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-framerate', f"{fps:g}",
+        '-i', os.path.join(frame_dir, 'frame_%04d.png'),
+        # Most players only decode 4:2:0 video, which needs even dimensions
+        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+        '-pix_fmt', 'yuv420p',
+        output
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()}")
+
+
+def export_progression(mask_files, output, size=DEFAULT_EXPORT_SIZE, fps=10.0,
+                       frames_per_timepoint=5, orbit_degrees=0.0, camera=None, visible=None,
+                       opacity=0.6, cache_dir=None, workers=None, progress=None):
+    """
+    Render the tumor progression of a mask series offscreen as a PNG sequence or video.
+
+    Timepoints are split into contiguous runs rendered by separate worker
+    processes. The CPU threads are divided among them.
+
+    Args:
+        mask_files (list): Chronologically sorted lesion mask paths
+        output (str): A video file (.ogv, or .mp4/.mov/.mkv/.avi/.webm with ffmpeg),
+            a .png file name whose stem prefixes the numbered frames, or a directory
+        size (tuple): Output width and height in pixels
+        fps (float): Video frame rate
+        frames_per_timepoint (int): Video frames showing each timepoint
+        orbit_degrees (float): Camera rotation about the volume over the whole video (0: fixed camera)
+        camera (dict): Pose from camera_settings, or None to frame the volume like the viewer
+        visible (dict): Region type -> shown, see set_label_opacity
+        opacity (float): Opacity of the visible labels
+        cache_dir (str): Progression cache directory, or None
+        workers (int): Worker processes (default: CPU count, at most one per timepoint)
+        progress (callable): Called with (frames written, total frames) as workers finish
+
+    Returns:
+        str: The video file, or the directory holding the PNGs
+
+    Raises:
+        ValueError: If there is nothing to render or the output type is unknown
+        RuntimeError: If video encoding fails
+    """
+    if not mask_files:
+        raise ValueError("No lesion masks to export")
+    output = os.path.abspath(output)
+    stem, extension = os.path.splitext(output)
+    extension = extension.lower()
+    if extension and extension not in VTK_VIDEO_EXTENSIONS + FFMPEG_VIDEO_EXTENSIONS + ['.png']:
+        raise ValueError(f"Unsupported export format: {extension}")
+    if extension in FFMPEG_VIDEO_EXTENSIONS and shutil.which('ffmpeg') is None:
+        raise RuntimeError(f"Writing {extension} video requires ffmpeg on the PATH; "
+                           f"use {' or '.join(VTK_VIDEO_EXTENSIONS)} or a PNG sequence instead")
+
+    frames_per_timepoint = max(1, int(frames_per_timepoint))
+    total_frames = len(mask_files) * frames_per_timepoint
+    workers = max(1, min(workers or os.cpu_count() or 1, len(mask_files)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    is_video = extension not in ('', '.png')
+    if is_video:
+        frame_dir = tempfile.mkdtemp(prefix='.progression_frames_', dir=os.path.dirname(output))
+        frame_pattern = os.path.join(frame_dir, FRAME_PATTERN)
+    elif extension == '.png':
+        frame_dir = os.path.dirname(output)
+        frame_pattern = stem + "_{:04d}.png"
+    else:
+        frame_dir = output
+        frame_pattern = os.path.join(frame_dir, FRAME_PATTERN)
+    os.makedirs(frame_dir, exist_ok=True)
+
+    options = {
+        'size': tuple(size),
+        'frames_per_timepoint': frames_per_timepoint,
+        'orbit_degrees': orbit_degrees,
+        'camera': camera,
+        'visible': visible,
+        'opacity': opacity,
+        'cache_dir': cache_dir,
+        'threads': threads,
+    }
+
+    try:
+        written = 0
+        # Spawned rather than forked: the caller may hold a Qt application and GL contexts
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(render_timepoints, mask_files, chunk, frame_pattern, **options)
+                for chunk in _split_timepoints(len(mask_files), workers)
+            ]
+            for future in as_completed(futures):
+                written += future.result()
+                if progress:
+                    progress(written, total_frames)
+
+        if is_video:
+            encode_video(frame_dir, written, output, fps)
+            return output
+        return frame_dir
+    finally:
+        if is_video:
+            shutil.rmtree(frame_dir, ignore_errors=True)
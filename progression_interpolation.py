@@ -0,0 +1,126 @@
+import numpy as np
+
+# Signed distances are clipped to this many mm; boundaries farther apart morph as if this close
+MAX_INTERPOLATION_DISTANCE_MM = 10.0
+
+# Intermediate frames synthesized between consecutive timepoints when interpolation is on
+DEFAULT_INTERPOLATION_STEPS = 5
+
+# Neighbour offsets tested per vectorized step of the distance search
+OFFSET_BATCH = 64
+
+
+def _offsets_by_distance(spacing, max_distance):
+    """
+    List the voxel offsets within max_distance mm, nearest first.
+
+    Returns:
+        tuple: (dx, dy, dz, distance in mm) arrays sorted by distance
+    """
+    radius = [int(max_distance // s) for s in spacing]
+    dz, dy, dx = np.mgrid[-radius[2]:radius[2] + 1, -radius[1]:radius[1] + 1, -radius[0]:radius[0] + 1]
+    dx, dy, dz = dx.ravel(), dy.ravel(), dz.ravel()
+    distance = np.sqrt((dx * spacing[0]) ** 2 + (dy * spacing[1]) ** 2 + (dz * spacing[2]) ** 2)
+    keep = (distance > 0) & (distance <= max_distance)
+    order = np.argsort(distance[keep], kind='stable')
+    return dx[keep][order], dy[keep][order], dz[keep][order], distance[keep][order]
+
+
+def signed_distance_at(mask, dimensions, spacing, indices, max_distance=MAX_INTERPOLATION_DISTANCE_MM):
+    """
+    Signed distance to the boundary of a mask, evaluated at selected voxels only.
+
+    A voxel outside the mask gets its distance to the nearest mask voxel, a
+    voxel inside minus its distance to the nearest voxel outside (the volume
+    border counts as outside). Offsets are tested nearest first, in batches
+    shared by all voxels still unresolved, so the cost follows the number of
+    selected voxels and how far their boundaries are, not the matrix size.
+    Distances are exact in mm for anisotropic spacing and clipped to
+    ±max_distance.
+
+    Args:
+        mask: Flat boolean array in x-fastest order
+        dimensions (tuple): (nx, ny, nz)
+        spacing (tuple): Voxel size in mm
+        indices: Flat indices of the voxels to evaluate
+        max_distance (float): Clipping distance in mm
+
+    Returns:
+        np.ndarray: float32 signed distance per selected voxel
+    """
+    nx, ny, nz = dimensions
+    inside = mask[indices]
+    result = np.where(inside, -max_distance, max_distance).astype(np.float32)
+
+    x = indices % nx
+    y = (indices // nx) % ny
+    z = indices // (nx * ny)
+    dx, dy, dz, distance = _offsets_by_distance(spacing, max_distance)
+    flat_offsets = dx + dy * nx + dz * nx * ny
+
+    pending = np.arange(indices.size)
+    for start in range(0, distance.size, OFFSET_BATCH):
+        if pending.size == 0:
+            break
+        batch = slice(start, start + OFFSET_BATCH)
+        px = x[pending, None] + dx[None, batch]
+        py = y[pending, None] + dy[None, batch]
+        pz = z[pending, None] + dz[None, batch]
+        valid = (px >= 0) & (px < nx) & (py >= 0) & (py < ny) & (pz >= 0) & (pz < nz)
+
+        neighbour_inside = np.zeros(valid.shape, dtype=bool)
+        neighbour_inside[valid] = mask[(indices[pending, None] + flat_offsets[None, batch])[valid]]
+        differs = neighbour_inside != inside[pending, None]
+
+        hit = differs.any(axis=1)
+        if hit.any():
+            # Offsets are sorted, so the first differing one in the batch is the nearest
+            nearest = distance[batch][differs[hit].argmax(axis=1)]
+            rows = pending[hit]
+            result[rows] = np.where(inside[rows], -nearest, nearest)
+            pending = pending[~hit]
+    return result
+
+
+def interpolation_support(prev_mask, curr_mask, geometry, max_distance=MAX_INTERPOLATION_DISTANCE_MM):
+    """
+    Compute what is needed to morph one mask into the next.
+
+    A convex combination of two signed distances is only negative where one
+    of them is, so every intermediate mask lies within the union of both
+    masks; distances are only needed there.
+
+    Args:
+        prev_mask: Flat mask of the previous timepoint
+        curr_mask: Flat mask of the current timepoint (same grid)
+        geometry (dict): Geometry of the masks, as returned by image_geometry
+        max_distance (float): Clipping distance in mm
+
+    Returns:
+        tuple: (flat indices of the union, previous signed distances, current signed distances)
+    """
+    prev_inside = prev_mask > 0
+    curr_inside = curr_mask > 0
+    indices = np.flatnonzero(prev_inside | curr_inside)
+    dimensions = geometry['dimensions']
+    spacing = geometry['spacing']
+    return (
+        indices,
+        signed_distance_at(prev_inside, dimensions, spacing, indices, max_distance),
+        signed_distance_at(curr_inside, dimensions, spacing, indices, max_distance),
+    )
+
+
+def interpolate_mask(prev_distance, curr_distance, fraction):
+    """
+    Return the intermediate mask between two timepoints on the support voxels.
+
+    Args:
+        prev_distance: Signed distances to the previous mask on the support
+        curr_distance: Signed distances to the current mask on the support
+        fraction (float): Position between the timepoints, 0 (previous) to 1 (current)
+
+    Returns:
+        np.ndarray: Boolean mask, True where the blended signed distance is negative
+    """
+    return (1.0 - fraction) * prev_distance + fraction * curr_distance < 0
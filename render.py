@@ -1,10 +1,11 @@
 import vtk
 import sys
 import os
-import glob
+import argparse
+import time
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QDesktopWidget, QMessageBox
+from PyQt5.QtCore import QTimer
 
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 from slice_interactor import SliceInteractor, SlicePlanes
@@ -12,16 +13,66 @@ from volume_multimodal import VolumeRenderer
 from ui import MainWindowUI
 from mask_overlay import MaskOverlay
 from tumor_animation import TumorAnimationWindow
+from progression_cache import PROGRESSION_CACHE_DIRNAME
+from session_prefetch import SessionPrefetcher
+from volume_cache import get_volume_cache
+from disk_cache import DiskVolumeCache
+from intensity_stats import get_stats_engine
+from subject_manifest import SubjectManifest, FILE_PATTERNS
+from batch_render import run_batch, DIRECTION_AXES
+from render_scheduler import RenderScheduler, DEFAULT_MAX_FPS
+from slab_projection import SLAB_PROJECTIONS
+from volume_mappers import get_mapper_factory, MAPPER_BACKENDS
+from interactive_lod import InteractiveLOD, DEFAULT_INTERACTIVE_FRAME_MS, DEFAULT_REFINE_DELAY_MS
+from progression_export import export_progression, subject_lesion_masks, DEFAULT_EXPORT_SIZE
+
+# Delay between a slab change and projecting its neighbours ahead; not restarted while scrolling
+SLAB_PRECOMPUTE_DELAY_MS = 30
 
 class MRIViewer(MainWindowUI):
-    def __init__(self, base_path):
+    def __init__(self, base_path, prefetch_memory_mb=2048, prefetch_workers=2, load_workers=None,
+                 interpolation_steps=0, max_fps=DEFAULT_MAX_FPS,
+                 interactive_frame_ms=DEFAULT_INTERACTIVE_FRAME_MS, refine_delay_ms=DEFAULT_REFINE_DELAY_MS,
+                 slab_projection=None, swi_minip=False):
         super().__init__()
         
+        # 'mean', 'max' or 'min' to show slabs as 2D projections, None to ray cast them
+        self.slab_projection = slab_projection
+        # The SWI magnitude view shows a minimum intensity projection regardless (central vein sign reading)
+        self.swi_minip = swi_minip
+        
+        # Projects the slabs around the current one shortly after the slab moved
+        self.slab_precompute_timer = QTimer(self)
+        self.slab_precompute_timer.setSingleShot(True)
+        self.slab_precompute_timer.setInterval(SLAB_PRECOMPUTE_DELAY_MS)
+        self.slab_precompute_timer.timeout.connect(self.precompute_slabs)
+        
         # Initialize mask_overlay first
         self.mask_overlay = None
         
+        # Intermediate frames between timepoints in the tumor animation (0: off)
+        self.interpolation_steps = interpolation_steps
+        
+        # Background decoding of neighbouring sessions
+        self.prefetcher = SessionPrefetcher(
+            max_workers=prefetch_workers,
+            memory_limit_mb=prefetch_memory_mb,
+            load_workers=load_workers
+        )
+        
+        # Windows are only rendered when what they show changed; the camera is shared by all
+        self.render_scheduler = RenderScheduler(self, max_fps=max_fps)
+        
+        # Coarser volume rendering while scrolling, zooming or rotating, refined when idle
+        self.interactive_lod = InteractiveLOD(
+            self.render_scheduler, self,
+            target_frame_ms=interactive_frame_ms,
+            refine_delay_ms=refine_delay_ms
+        )
+        
         # Set up camera FIRST
         self.setup_camera()
+        self.render_scheduler.watch(self.camera)
         
         # Set up SlicePlanes SECOND
         self.SlicePlanes = SlicePlanes(self)
@@ -37,22 +88,27 @@ class MRIViewer(MainWindowUI):
         
         self.animation_button.clicked.connect(self.show_tumor_animation)
         
-        # Timer for rendering sync
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.render_all)
-        self.timer.start(8)  # msec per frame
-        
         self.show()
     
 
-    def setup_mask_overlay(self, session_path):
+    def setup_mask_overlay(self, session_path, images=None):
         """Set up mask overlay for current session."""
         try:
+            # Reuse the mask volumes of the previous session when every viewport has them
+            if self.mask_overlay and len(self.mask_overlay.actors) == len(self.modalities):
+                try:
+                    self.mask_overlay.replace_masks(session_path, images)
+                    return
+                except FileNotFoundError:
+                    self.remove_current_masks()
+                    self.mask_overlay = None
+                    raise
+            
             # Remove existing mask overlay if it exists
             if self.mask_overlay:
                 self.remove_current_masks()
             
-            self.mask_overlay = MaskOverlay(session_path)
+            self.mask_overlay = MaskOverlay(session_path, images, manifest=self.manifest)
             self.mask_overlay.set_slice_planes(self.SlicePlanes)  
             self.mask_overlay.load_masks()
             
@@ -107,7 +163,7 @@ class MRIViewer(MainWindowUI):
     def find_image_files(self, session_path, modalities):
         """
         Find image files for specified modalities in a session directory.
-        Prioritizes 'Lreg_' prefixed files over 'CSreg_' files.
+        Files are looked up in the subject manifest instead of globbing the directory.
         
         Args:
             session_path (str): Path to the session directory
@@ -118,74 +174,57 @@ class MRIViewer(MainWindowUI):
         """
         found_files = {}
         for modality in modalities:
-            # Define file patterns to search for each modality
-            if modality == 't1':
-                pattern = os.path.join(session_path, f"*Lreg_t1.nii.gz")
-            elif modality == 'flair':
-                pattern = os.path.join(session_path, f"*Lreg_flair.nii.gz")
-            elif modality == 'swi_mag':
-                pattern = os.path.join(session_path, f"*Lreg_swiMag.nii.gz")
-            elif modality == 'swi_phase':
-                pattern = os.path.join(session_path, f"*Lreg_swiPhase.nii.gz")
-                
-            matches = glob.glob(pattern)
-            if matches:
-                found_files[modality] = matches[0]
-                print(f"Found {modality}: {os.path.basename(matches[0])}")
+            path = self.manifest.find_file(session_path, modality)
+            if path:
+                found_files[modality] = path
+                print(f"Found {modality}: {os.path.basename(path)}")
             else:
                 raise FileNotFoundError(
-                    f"No {modality} file found matching pattern: {pattern}\n"
+                    f"No {modality} file found matching pattern: {FILE_PATTERNS[modality]}\n"
                     f"in session directory: {session_path}"
                 )
                 
         return found_files
 
-    def setup_file_paths(self, base_path):
+    def find_mask_files(self, session_path):
+        """
+        Find the lesion and PRL mask files of a session directory.
+        
+        Args:
+            session_path (str): Path to the session directory
+            
+        Returns:
+            list: Mask file paths that exist (may be empty)
+        """
+        mask_files = [self.manifest.find_file(session_path, role) for role in ['lesion', 'prl']]
+        return [path for path in mask_files if path]
+
+    def session_files(self, index):
+        """Return every file decoded for a session: modalities first, then masks."""
+        session_path = os.path.join(self.base_path, self.session_dirs[index])
+        found_files = self.find_image_files(session_path, self.modalities)
+        return [found_files[mod] for mod in self.modalities] + self.find_mask_files(session_path)
+
+    def setup_file_paths(self, base_path, manifest=None):
         """
         Set up file paths based on the provided base directory.
         Sessions are sorted chronologically by their dates.
         
         Args:
             base_path (str): Base directory containing session folders
+            manifest (SubjectManifest): Already built manifest of base_path, built here if None
             
         Raises:
             ValueError: If no session directories found or invalid session directory names
         """
         try:
-            # Find all session directories
-            self.session_dirs = []
-            for item in os.listdir(base_path):
-                if item.startswith('ses-'):
-                    full_path = os.path.join(base_path, item)
-                    if os.path.isdir(full_path):
-                        # Verify session directory name format
-                        try:
-                            # Extract date part after 'ses-'
-                            date_str = item[4:]  
-                            # Verify it's a valid 8-digit date (YYYYMMDD)
-                            if len(date_str) == 8 and date_str.isdigit():
-                                year = int(date_str[:4])
-                                month = int(date_str[4:6])
-                                day = int(date_str[6:])
-                                # Basic date validation
-                                if (1900 <= year <= 2100 and 
-                                    1 <= month <= 12 and 
-                                    1 <= day <= 31):
-                                    self.session_dirs.append(item)
-                                else:
-                                    print(f"Warning: Skipping directory with invalid date: {item}")
-                            else:
-                                print(f"Warning: Skipping directory with invalid format: {item}")
-                        except ValueError as ve:
-                            print(f"Warning: Skipping directory with invalid date format: {item}")
-                            continue
+            # Find all session directories through the persistent subject manifest
+            self.manifest = manifest or SubjectManifest(base_path)
+            self.session_dirs = self.manifest.sessions()
             
             if not self.session_dirs:
                 raise ValueError(f"No valid session directories found in {base_path}")
             
-            # Sort sessions chronologically
-            self.session_dirs.sort(key=lambda x: x[4:])  # Sort by date part after 'ses-'
-            
             # Store base path and initialize with first session
             self.base_path = base_path
             self.current_session_index = 0
@@ -222,6 +261,13 @@ class MRIViewer(MainWindowUI):
             # Store the files in order
             self.files = [found_files[mod] for mod in self.modalities]
             
+            # Take decoded volumes from the prefetch store (decodes in parallel on a miss)
+            load_start = time.perf_counter()
+            session_volumes = self.prefetcher.get_session(
+                index, self.files + self.find_mask_files(full_session_path)
+            )
+            load_time = time.perf_counter() - load_start
+            
             # Update UI elements
             self.update_session_display()
             
@@ -229,7 +275,7 @@ class MRIViewer(MainWindowUI):
             self.update_navigation_buttons()
             
             # Re-render the views
-            self.render_modalities(self.files)
+            self.render_modalities(self.files, session_volumes)
             
             # Update Default UI Buttons
             self.axial_button.setChecked(True)
@@ -239,17 +285,64 @@ class MRIViewer(MainWindowUI):
             self.update_thickness()
             
             # Set up mask overlay for new session
-            self.setup_mask_overlay(full_session_path)
+            self.setup_mask_overlay(full_session_path, session_volumes)
+            
+            # Persist intensity statistics recorded while building the pipelines
+            self.manifest.save()
+            
+            # Start decoding the neighbouring sessions in the background
+            self.prefetcher.prefetch_around(index, self.session_files, len(self.session_dirs))
+            stats = self.prefetcher.stats()
+            print(f"Volumes ready in {load_time:.2f} s "
+                  f"(prefetch: {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['memory_mb']:.0f} MB cached)")
             
         except Exception as e:
             raise ValueError(f"Error loading session: {str(e)}")
 
-    def initializeUI(self):
-        """Initialize UI components and connect signals"""
+    def load_subject(self, base_path, manifest=None):
+        """
+        Switch the viewer to another subject, keeping the render windows and pipelines.
+        
+        Args:
+            base_path (str): Subject directory containing session folders
+            manifest (SubjectManifest): Already built manifest of base_path, built here if None
+            
+        Raises:
+            ValueError: If the subject cannot be loaded; the previous subject stays shown
+        """
+        previous_path = self.base_path
+        
+        # The progression window belongs to the previous subject
+        if self.animation_window:
+            self.animation_window.cleanup()
+            self.animation_window.deleteLater()
+            self.animation_window = None
+            
+        # Prefetched sessions are indexed per subject
+        self.prefetcher.clear()
+        
+        try:
+            self.setup_file_paths(base_path, manifest)
+        except ValueError:
+            self.prefetcher.clear()
+            self.setup_file_paths(previous_path)
+            self.update_subject_display()
+            raise
+            
+        self.update_subject_display()
+        
+    def update_subject_display(self):
+        """Update UI elements with current subject info"""
         # Get subject ID from base directory name
         subject_id = os.path.basename(os.path.dirname(os.path.dirname(self.files[0])))
         self.subject_id.setText(subject_id)
         
+    def initializeUI(self):
+        """Initialize UI components and connect signals"""
+        # Get subject ID from base directory name
+        self.update_subject_display()
+        
         # Set session ID
         self.session_id.setText(self.current_session)
         
@@ -272,6 +365,14 @@ class MRIViewer(MainWindowUI):
         
         # Conncct step size controls
         self.step_slider.valueChanged.connect(self.update_stepsize)
+        
+        # Slab display mode
+        self.slab_projection_combo.setCurrentIndex(
+            self.slab_projection_combo.findData(self.slab_projection))
+        self.slab_projection_combo.currentIndexChanged.connect(
+            lambda index: self.set_slab_projection(self.slab_projection_combo.itemData(index)))
+        self.swi_minip_checkbox.setChecked(self.swi_minip)
+        self.swi_minip_checkbox.toggled.connect(self.set_swi_minip)
 
         # Set axial view as default
         self.axial_button.setChecked(True)
@@ -306,9 +407,9 @@ class MRIViewer(MainWindowUI):
         volume_property.SetSpecular(specular_val)
         volume_property.SetSpecularPower(spec_pow_val)
 
-        # Mark volume as modified and render the scene
+        # Mark volume as modified; only its own view needs rendering
         volume.Modified()
-        self.render_all()
+        self.request_render(modality_name)
 
         
 
@@ -336,7 +437,7 @@ class MRIViewer(MainWindowUI):
         self.lighting_sliders[modality_name]["specular"].setValue(20)
         self.lighting_sliders[modality_name]["spec_power"].setValue(10)
 
-        self.render_all()
+        self.request_render(modality_name)
         
     def next_session(self):
         """Load next session if available"""
@@ -358,8 +459,15 @@ class MRIViewer(MainWindowUI):
         self.next_button.setEnabled(self.current_session_index < len(self.session_dirs) - 1)
     
 
-    def render_modalities(self, filenames):
+    def render_modalities(self, filenames, volumes=None):
         """Render all modalities with enhanced visualization."""
+        volumes = volumes or {}
+        
+        # Keep the render windows and pipelines of the previous session
+        if hasattr(self, 't1_renderer'):
+            self.update_modalities(filenames, volumes)
+            return
+            
         try:
             # Set up the slice planes
             self.SlicePlanes = SlicePlanes(self)
@@ -373,7 +481,8 @@ class MRIViewer(MainWindowUI):
                 frame=self.t1_frame,
                 layout=self.t1_layout,
                 filename=filenames[0],
-                modality='t1'
+                modality='t1',
+                image_data=volumes.get(filenames[0])
             )
             self.t1_window, self.t1_iren, self.t1_volume  = self.t1_renderer.get_window_and_interactor()
             self.SlicePlanes.addRenderer(self.t1_renderer)
@@ -384,7 +493,8 @@ class MRIViewer(MainWindowUI):
                 frame=self.flair_frame,
                 layout=self.flair_layout,
                 filename=filenames[1],
-                modality='flair'
+                modality='flair',
+                image_data=volumes.get(filenames[1])
             )
             self.flair_window, self.flair_iren, self.flair_volume = self.flair_renderer.get_window_and_interactor()
             self.SlicePlanes.addRenderer(self.flair_renderer)
@@ -395,7 +505,8 @@ class MRIViewer(MainWindowUI):
                 frame=self.swi_frame,
                 layout=self.swi_layout,
                 filename=filenames[2],
-                modality='swi_mag'
+                modality='swi_mag',
+                image_data=volumes.get(filenames[2])
             )
             self.swi_window, self.swi_iren, self.swi_volume  = self.swi_renderer.get_window_and_interactor()
             self.SlicePlanes.addRenderer(self.swi_renderer)
@@ -406,7 +517,8 @@ class MRIViewer(MainWindowUI):
                 frame=self.phase_frame,
                 layout=self.phase_layout,
                 filename=filenames[3],
-                modality='swi_phase'
+                modality='swi_phase',
+                image_data=volumes.get(filenames[3])
             )
             self.phase_window, self.phase_iren, self.phase_volume = self.phase_renderer.get_window_and_interactor()
             self.SlicePlanes.addRenderer(self.phase_renderer)
@@ -414,10 +526,18 @@ class MRIViewer(MainWindowUI):
             # Initialize slice planes
             self.SlicePlanes.initPlanes()
             
-            # Set up interactors
+            self.apply_slab_projections()
+            
+            for name, window in [('t1', self.t1_window), ('flair', self.flair_window),
+                                 ('swi', self.swi_window), ('phase', self.phase_window)]:
+                self.render_scheduler.add_window(name, window)
+            
+            # Set up interactors; the styles are kept referenced so their Python state outlives this call
             interactors = [self.t1_iren, self.flair_iren, self.swi_iren, self.phase_iren]
+            self.interactor_styles = []
             for iren in interactors:
                 style = SliceInteractor(self)
+                self.interactor_styles.append(style)
                 iren.SetInteractorStyle(style)
                 iren.Initialize()
                 iren.Start()
@@ -426,11 +546,54 @@ class MRIViewer(MainWindowUI):
             print(f"Error in render_modalities: {str(e)}")
             raise
     
+    def update_modalities(self, filenames, volumes):
+        """Swap new volumes into the existing renderers without recreating windows."""
+        renderers = [self.t1_renderer, self.flair_renderer, self.swi_renderer, self.phase_renderer]
+        for renderer, filename in zip(renderers, filenames):
+            bounds = renderer.set_image(filename, volumes.get(filename))
+            self.SlicePlanes.updateWindowBounds(renderer.volume_mapper, bounds)
+            # New sessions start with the MRI shown, matching the reset toggle
+            renderer.set_mri_visible(True)
+            
+        self.SlicePlanes.resetPlanes()
+    
     def render_all(self):
-        """Force rendering"""
-        for window in [self.t1_window, self.flair_window, self.swi_window, self.phase_window]:
-            if window:  # Check if window exists before rendering
-                window.Render()
+        """Schedule all views for the next frame."""
+        self.render_scheduler.request_render()
+    
+    def set_slab_projection(self, projection):
+        """Show slabs as 2D 'mean', 'max' or 'min' projections, or ray cast them (None)."""
+        self.slab_projection = projection
+        self.apply_slab_projections()
+        self.render_all()
+    
+    def set_swi_minip(self, enabled):
+        """Show the SWI magnitude slab as a minimum intensity projection, whatever the other views show."""
+        self.swi_minip = enabled
+        self.apply_slab_projections()
+        self.render_all()
+    
+    def apply_slab_projections(self):
+        """Give every view its slab display mode."""
+        for renderer in self.SlicePlanes.renderer_instances:
+            if self.swi_minip and renderer.modality == 'swi_mag':
+                renderer.set_slab_projection('min')
+            else:
+                renderer.set_slab_projection(self.slab_projection)
+    
+    def schedule_slab_precompute(self):
+        """Project the neighbouring slabs soon; repeated calls while scrolling do not postpone it."""
+        if not self.slab_precompute_timer.isActive():
+            self.slab_precompute_timer.start()
+    
+    def precompute_slabs(self):
+        """Project the slabs a few scroll steps around the current one in every slab-mode view."""
+        for renderer in self.SlicePlanes.renderer_instances:
+            renderer.precompute_slabs()
+    
+    def request_render(self, *windows):
+        """Schedule some views (render windows or names: t1, flair, swi, phase) for the next frame."""
+        self.render_scheduler.request_render(*windows)
     
     def setup_camera(self):
         """Initialize camera settings"""
@@ -669,18 +832,9 @@ class MRIViewer(MainWindowUI):
         else:
             self.mri_toggle.setText("Show MRI + Masks")
             
-        # Update visibility for all modality volumes
-        volumes = [
-            self.t1_volume,
-            self.flair_volume, 
-            self.swi_volume,
-            self.phase_volume
-        ]
-        
-        for volume in volumes:
-            if volume:
-                # Simply toggle the volume's visibility
-                volume.SetVisibility(checked)
+        # Update visibility for all modality volumes, ray cast or projected
+        for renderer in self.SlicePlanes.renderer_instances:
+            renderer.set_mri_visible(checked)
         
         # Force render update
         self.render_all()
@@ -699,13 +853,11 @@ class MRIViewer(MainWindowUI):
                 session_date = session_dir[4:]  # Gets YYYYMMDD portion
                 
                 # Find tumor mask in this session
-                session_path = os.path.join(self.base_path, session_dir)
-                mask_pattern = os.path.join(session_path, "*Lreg_lesionmask.nii.gz")
-                matches = glob.glob(mask_pattern)
+                mask_file = self.manifest.find_file(session_dir, 'lesion')
                 
-                if matches:
+                if mask_file:
                     # Store tuple of (date, file_path) for sorting
-                    tumor_data.append((session_date, matches[0]))
+                    tumor_data.append((session_date, mask_file))
                     print(f"Found tumor mask for session {session_date}")
             
             if not tumor_data:
@@ -729,8 +881,13 @@ class MRIViewer(MainWindowUI):
                 self.animation_window.cleanup()
                 self.animation_window.deleteLater()
             
-            # Pass the chronologically sorted files to the animation window
-            self.animation_window = TumorAnimationWindow(self, tumor_files)
+            # Pass the chronologically sorted files to the animation window;
+            # computed frames persist in the subject folder across openings
+            self.animation_window = TumorAnimationWindow(
+                self, tumor_files,
+                cache_dir=os.path.join(self.base_path, PROGRESSION_CACHE_DIRNAME),
+                interpolation_steps=self.interpolation_steps
+            )
             self.animation_window.show()
             self.animation_window.raise_()
             self.animation_window.activateWindow()
@@ -743,23 +900,246 @@ class MRIViewer(MainWindowUI):
                 f"Could not load tumor progression animation: {str(e)}"
             )
 
+    def closeEvent(self, event):
+        """Stop background work before the window goes away."""
+        stats = self.prefetcher.stats()
+        print(f"Prefetch summary: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['cancelled']} cancelled")
+        cache_stats = get_volume_cache().stats()
+        print(f"Volume cache: {cache_stats['hits']} hits, {cache_stats['misses']} reads, "
+              f"{cache_stats['memory_mb']:.0f} MB resident")
+        render_stats = self.render_scheduler.stats()
+        windows = ", ".join(f"{name} {s['renders']} x {s['mean_ms']:.1f} ms"
+                            for name, s in render_stats['windows'].items())
+        print(f"Rendering: {render_stats['requests']} requests drawn in {render_stats['frames']} frames "
+              f"({windows})")
+        self.render_scheduler.timer.stop()
+        self.interactive_lod.refine_timer.stop()
+        self.slab_precompute_timer.stop()
+        self.prefetcher.shutdown()
+        super().closeEvent(event)
+
+def parse_fraction_list(value):
+    """Parse a comma-separated list of fractions between 0 and 1."""
+    try:
+        fractions = [float(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid fraction list: {value}")
+    if not fractions or any(f < 0 or f > 1 for f in fractions):
+        raise argparse.ArgumentTypeError(f"fractions must lie between 0 and 1: {value}")
+    return fractions
+
+def parse_direction_list(value):
+    """Parse a comma-separated list of slicing directions."""
+    directions = [item.strip().lower() for item in value.split(',') if item.strip()]
+    invalid = [d for d in directions if d not in DIRECTION_AXES]
+    if not directions or invalid:
+        raise argparse.ArgumentTypeError(
+            f"directions must be among {', '.join(DIRECTION_AXES)}: {value}"
+        )
+    return directions
+
+def parse_percentile_pair(value):
+    """Parse a LOW,HIGH pair of percentiles between 0 and 100."""
+    try:
+        low, high = [float(item) for item in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected LOW,HIGH percentiles: {value}")
+    if not 0 <= low < high <= 100:
+        raise argparse.ArgumentTypeError(f"percentiles must satisfy 0 <= LOW < HIGH <= 100: {value}")
+    return low, high
+
+def parse_size(value):
+    """Parse a WIDTHxHEIGHT pixel size."""
+    try:
+        width, height = [int(item) for item in value.lower().split('x')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT: {value}")
+    if width < 1 or height < 1:
+        raise argparse.ArgumentTypeError(f"size must be positive: {value}")
+    return width, height
+
+def parse_args(argv):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Multi-modal MRI viewer")
+    parser.add_argument("subject_paths", nargs='+', metavar="subject_path",
+                        help="Path to the subject directory (several allowed with --batch, "
+                             "cohort root with --cohort)")
+    parser.add_argument("--cohort", action="store_true",
+                        help="Treat the path as a cohort root and review its subjects in one session")
+    parser.add_argument("--prefetch-memory-mb", type=float, default=2048,
+                        help="Memory cap for prefetched sessions in MB (default: 2048)")
+    parser.add_argument("--prefetch-workers", type=int, default=2,
+                        help="Number of background decode threads (default: 2)")
+    parser.add_argument("--load-workers", type=int, default=None,
+                        help="Threads decoding the modalities and masks of a session in parallel "
+                             "(default: one per file, capped at CPU count)")
+    parser.add_argument("--volume-cache-mb", type=float, default=3072,
+                        help="Byte budget of the shared decoded-volume cache in MB (default: 3072)")
+    parser.add_argument("--disk-cache", metavar="DIR", default=None,
+                        help="Keep decompressed, memory-mapped copies of the volumes in DIR "
+                             "(disabled by default)")
+    parser.add_argument("--range-percentiles", type=parse_percentile_pair, default=(1, 99),
+                        metavar="LOW,HIGH",
+                        help="Intensity percentiles mapped to the transfer-function range "
+                             "(default: 1,99)")
+    parser.add_argument("--foreground-stats", action="store_true",
+                        help="Compute the intensity range from non-zero voxels only")
+    parser.add_argument("--max-fps", type=float, default=DEFAULT_MAX_FPS,
+                        help="Cap on how often the views are redrawn; they are only redrawn "
+                             "after a change (default: %g, 0 for no cap)" % DEFAULT_MAX_FPS)
+    parser.add_argument("--interpolation-steps", type=int, default=0,
+                        help="Frames morphed between consecutive timepoints in the tumor animation "
+                             "(default: 0, off)")
+    parser.add_argument("--interactive-frame-ms", type=float, default=DEFAULT_INTERACTIVE_FRAME_MS,
+                        help="Frame time aimed for while scrolling, zooming or rotating; volume "
+                             "rendering quality is lowered until it is met (default: %g, 0 for "
+                             "full quality throughout)" % DEFAULT_INTERACTIVE_FRAME_MS)
+    parser.add_argument("--refine-delay-ms", type=int, default=DEFAULT_REFINE_DELAY_MS,
+                        help="Idle time after the last input before the views are redrawn at "
+                             "full quality (default: %d)" % DEFAULT_REFINE_DELAY_MS)
+    parser.add_argument("--mapper", choices=MAPPER_BACKENDS, default=None,
+                        help="Volume rendering backend: gpu, smart (GPU if supported, else CPU), "
+                             "cpu (multi-threaded ray casting, no GPU needed) or slab (CPU, with "
+                             "slabs shown as 2D mean projections) (default: %s, or $MRI_VIEWER_MAPPER; "
+                             "cpu with --batch unless $MRI_VIEWER_MAPPER is set)" % get_mapper_factory().backend)
+    parser.add_argument("--render-threads", type=int, default=get_mapper_factory().threads,
+                        help="CPU ray casting threads (default: one per core, or "
+                             "$MRI_VIEWER_RENDER_THREADS)")
+    parser.add_argument("--slab-projection", choices=SLAB_PROJECTIONS, default=None,
+                        help="Show the slab as a 2D mean, maximum or minimum intensity projection "
+                             "instead of ray casting the cropped volume (much faster without a GPU)")
+    parser.add_argument("--swi-minip", action="store_true",
+                        help="Start with the SWI magnitude view showing a minimum intensity "
+                             "projection of the slab, for central vein sign reading")
+    
+    batch = parser.add_argument_group("batch snapshots")
+    batch.add_argument("--batch", action="store_true",
+                       help="Render PNG snapshots offscreen instead of opening the viewer")
+    batch.add_argument("--output", default="snapshots",
+                       help="Output directory for --batch (default: ./snapshots)")
+    batch.add_argument("--directions", type=parse_direction_list,
+                       default=list(DIRECTION_AXES),
+                       help="Comma-separated slicing directions (default: axial,coronal,sagittal)")
+    batch.add_argument("--slab-positions", type=parse_fraction_list, default=[0.3, 0.5, 0.7],
+                       help="Comma-separated slab centres as fractions of the volume extent "
+                            "(default: 0.3,0.5,0.7)")
+    batch.add_argument("--thickness", type=float, default=10,
+                       help="Slab thickness for --batch (default: 10)")
+    batch.add_argument("--tile-size", type=int, default=384,
+                       help="Pixel size of each modality tile (default: 384)")
+    batch.add_argument("--batch-workers", type=int, default=None,
+                       help="Worker processes, one subject each (default: CPU count)")
+    batch.add_argument("--no-masks", action="store_true",
+                       help="Do not overlay lesion and PRL masks in snapshots")
+    
+    export = parser.add_argument_group("progression export")
+    export.add_argument("--export-progression", metavar="OUTPUT", default=None,
+                        help="Render the tumor progression offscreen to OUTPUT instead of opening "
+                             "the viewer: a .ogv video (.mp4 etc. with ffmpeg), a .png name for "
+                             "a numbered sequence, or a directory")
+    export.add_argument("--export-size", type=parse_size, default=DEFAULT_EXPORT_SIZE,
+                        metavar="WIDTHxHEIGHT",
+                        help="Frame size of the export (default: %dx%d)" % DEFAULT_EXPORT_SIZE)
+    export.add_argument("--export-fps", type=float, default=10,
+                        help="Video frame rate (default: 10)")
+    export.add_argument("--export-frames-per-timepoint", type=int, default=5,
+                        help="Video frames showing each timepoint (default: 5)")
+    export.add_argument("--export-orbit", type=float, default=0, metavar="DEGREES",
+                        help="Rotate the camera this far around the volume over the video (default: 0)")
+    export.add_argument("--export-workers", type=int, default=None,
+                        help="Render processes (default: CPU count)")
+    return parser.parse_args(argv)
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python render.py <path_to_subject_directory>")
+    args = parse_args(sys.argv[1:])
+    
+    subject_paths = [os.path.abspath(path) for path in args.subject_paths]
+    for subject_path in subject_paths:
+        if not os.path.exists(subject_path):
+            print(f"Error: Directory not found: {subject_path}")
+            sys.exit(1)
+    
+    try:
+        get_mapper_factory().configure(args.mapper or get_mapper_factory().backend, args.render_threads)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
         sys.exit(1)
     
-    subject_path = os.path.abspath(sys.argv[1])
-    if not os.path.exists(subject_path):
-        print(f"Error: Directory not found: {subject_path}")
+    if args.batch:
+        frames = run_batch(
+            subject_paths,
+            os.path.abspath(args.output),
+            args.directions,
+            args.slab_positions,
+            workers=args.batch_workers,
+            thickness=args.thickness,
+            tile_size=args.tile_size,
+            show_masks=not args.no_masks,
+            volume_cache_mb=args.volume_cache_mb,
+            disk_cache_dir=args.disk_cache,
+            range_percentiles=args.range_percentiles,
+            foreground_stats=args.foreground_stats,
+            mapper_backend=args.mapper,
+            render_threads=args.render_threads
+        )
+        sys.exit(0 if frames else 1)
+    
+    if len(subject_paths) != 1:
+        print("Error: The interactive viewer takes exactly one subject or cohort directory")
         sys.exit(1)
+    subject_path = subject_paths[0]
+    
+    if args.export_progression:
+        mask_files = subject_lesion_masks(SubjectManifest(subject_path))
+        start = time.perf_counter()
+        try:
+            output = export_progression(
+                mask_files,
+                args.export_progression,
+                size=args.export_size,
+                fps=args.export_fps,
+                frames_per_timepoint=args.export_frames_per_timepoint,
+                orbit_degrees=args.export_orbit,
+                cache_dir=os.path.join(subject_path, PROGRESSION_CACHE_DIRNAME),
+                workers=args.export_workers
+            )
+        except (ValueError, RuntimeError, OSError) as e:
+            print(f"Error exporting progression: {str(e)}")
+            sys.exit(1)
+        print(f"Progression of {len(mask_files)} timepoints exported to {output} "
+              f"in {time.perf_counter() - start:.1f} s")
+        sys.exit(0)
+    
+    get_volume_cache().set_budget(args.volume_cache_mb)
+    if args.disk_cache:
+        get_volume_cache().set_disk_cache(DiskVolumeCache(args.disk_cache))
+    get_stats_engine().configure(args.range_percentiles, args.foreground_stats)
+    
+    viewer_options = {
+        'prefetch_memory_mb': args.prefetch_memory_mb,
+        'prefetch_workers': args.prefetch_workers,
+        'load_workers': args.load_workers,
+        'interpolation_steps': args.interpolation_steps,
+        'max_fps': args.max_fps,
+        'interactive_frame_ms': args.interactive_frame_ms,
+        'refine_delay_ms': args.refine_delay_ms,
+        'slab_projection': args.slab_projection or get_mapper_factory().slab_projection,
+        'swi_minip': args.swi_minip
+    }
     
     app = QtWidgets.QApplication(sys.argv)
     try:
-        window = MRIViewer(subject_path)
+        if args.cohort:
+            # Imported here because cohort.py builds on MRIViewer from this module
+            from cohort import CohortViewer
+            window = CohortViewer(subject_path, **viewer_options)
+        else:
+            window = MRIViewer(subject_path, **viewer_options)
         sys.exit(app.exec_())
     except Exception as e:
         print(f"Error initializing viewer: {str(e)}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
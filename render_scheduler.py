@@ -0,0 +1,143 @@
+import time
+
+from PyQt5.QtCore import Qt, QTimer
+
+DEFAULT_MAX_FPS = 60
+
+
+class RenderScheduler:
+    """
+    Renders VTK windows only when something they show has changed.
+
+    Changes are reported with request_render, or picked up from watched VTK
+    objects such as a camera shared by several windows, and mark windows
+    dirty. All requests made before the next frame are coalesced into one
+    render per dirty window, and frames are spaced at least 1 / max_fps
+    apart. Every render of a registered window is counted and timed,
+    including the ones VTK interactors trigger themselves, which also
+    clear that window's dirty flag.
+    """
+
+    def __init__(self, parent=None, max_fps=DEFAULT_MAX_FPS):
+        """
+        Args:
+            parent: QObject owning the frame timer
+            max_fps (float): Frame rate cap, 0 for none
+        """
+        self.windows = {}     # name -> vtkRenderWindow
+        self.dirty = set()    # names of windows waiting for the next frame
+        self._rendering = 0   # renders in progress; changes made by rendering itself are ignored
+        self._render_start = {}
+        self._stats = {}
+        self.render_observers = []  # called with (window name, seconds) after every render
+        self.requests = 0
+        self.frames = 0
+        self._last_frame = 0.0
+        self.set_max_fps(max_fps)
+
+        self.timer = QTimer(parent)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.flush)
+
+    def set_max_fps(self, max_fps):
+        """Change the frame rate cap (0 for none)."""
+        self.max_fps = max_fps
+        self.min_interval = 1.0 / max_fps if max_fps and max_fps > 0 else 0.0
+
+    def add_window(self, name, window):
+        """Register a render window under a name used in requests and statistics."""
+        self.windows[name] = window
+        self._stats[name] = {'renders': 0, 'total': 0.0, 'max': 0.0}
+        window.AddObserver('StartEvent', lambda obj, event, name=name: self._on_render_start(name))
+        window.AddObserver('EndEvent', lambda obj, event, name=name: self._on_render_end(name))
+
+    def watch(self, vtk_object, *windows):
+        """
+        Mark windows dirty whenever a VTK object is modified outside a render.
+
+        Args:
+            vtk_object: Any vtkObject, e.g. a shared camera
+            *windows: Names or render windows showing it (default: all)
+        """
+        def modified(obj, event):
+            if not self._rendering:
+                self.request_render(*windows)
+        vtk_object.AddObserver('ModifiedEvent', modified)
+
+    def _name(self, window):
+        """Return the registered name of a window given by name or object."""
+        if isinstance(window, str):
+            return window
+        for name, registered in self.windows.items():
+            if registered is window:
+                return name
+        return None
+
+    def request_render(self, *windows):
+        """
+        Schedule windows for the next frame.
+
+        Args:
+            *windows: Names or render windows (default: all registered windows)
+        """
+        self.requests += 1
+        names = [self._name(window) for window in windows] if windows else list(self.windows)
+        self.dirty.update(name for name in names if name in self.windows)
+        if self.dirty and not self.timer.isActive():
+            delay = self._last_frame + self.min_interval - time.perf_counter()
+            self.timer.start(max(0, int(delay * 1000)))
+
+    def flush(self):
+        """Render every dirty window now."""
+        self.timer.stop()
+        if not self.dirty:
+            return
+        self._last_frame = time.perf_counter()
+        self.frames += 1
+        for name in [name for name in self.windows if name in self.dirty]:
+            self.windows[name].Render()
+        self.dirty.clear()
+
+    def _on_render_start(self, name):
+        self._rendering += 1
+        self._render_start[name] = time.perf_counter()
+
+    def _on_render_end(self, name):
+        self._rendering = max(0, self._rendering - 1)
+        self.dirty.discard(name)
+        start = self._render_start.pop(name, None)
+        if start is None:
+            return
+        seconds = time.perf_counter() - start
+        stats = self._stats[name]
+        stats['renders'] += 1
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
+        for observer in self.render_observers:
+            observer(name, seconds)
+
+    def stats(self):
+        """
+        Summarise rendering since the last reset.
+
+        Returns:
+            dict: 'requests', 'frames' (scheduler frames drawn) and 'windows',
+            mapping each window name to its 'renders', 'mean_ms' and 'max_ms'
+        """
+        windows = {}
+        for name, stats in self._stats.items():
+            renders = stats['renders']
+            windows[name] = {
+                'renders': renders,
+                'mean_ms': 1000 * stats['total'] / renders if renders else 0.0,
+                'max_ms': 1000 * stats['max'],
+            }
+        return {'requests': self.requests, 'frames': self.frames, 'windows': windows}
+
+    def reset_stats(self):
+        """Start counting afresh."""
+        self.requests = 0
+        self.frames = 0
+        for stats in self._stats.values():
+            stats.update(renders=0, total=0.0, max=0.0)
@@ -0,0 +1,212 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from volume_cache import load_volume, load_volumes, image_size_bytes
+
+
+class SessionPrefetcher:
+    """
+    Decodes neighbouring sessions on worker threads into a bounded in-memory store.
+
+    Each stored entry maps file paths to decoded vtkImageData so that switching
+    sessions only has to hand the ready volumes to the renderers. Entries are
+    evicted least-recently-used first once the memory limit is exceeded, and
+    prefetches for sessions that are no longer adjacent are cancelled.
+    """
+
+    def __init__(self, max_workers=2, memory_limit_mb=2048, radius=1, load_workers=None):
+        """
+        Args:
+            max_workers (int): Number of background decode threads
+            memory_limit_mb (float): Upper bound for decoded volumes kept in memory
+            radius (int): How many sessions on each side of the current one to prefetch
+            load_workers (int): Threads decoding a session that has to be loaded
+                immediately (default: one per file, capped at CPU count)
+        """
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.radius = radius
+        self.load_workers = load_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="session-prefetch")
+
+        self._lock = threading.Lock()
+        self._store = OrderedDict()  # session index -> {path: vtkImageData}
+        self._sizes = {}             # session index -> bytes
+        self._pending = {}           # session index -> (Future, token)
+        self._tokens = {}            # session index -> token of the accepted job
+        self._current = None
+
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+
+    def get_session(self, index, files):
+        """
+        Return decoded volumes for a session, decoding all files in parallel on a miss.
+
+        A session that is still being prefetched is waited for rather than
+        decoded a second time.
+
+        Args:
+            index (int): Session index
+            files (list): File paths belonging to the session
+
+        Returns:
+            dict: Mapping of file path to vtkImageData
+        """
+        with self._lock:
+            self._current = index
+            volumes = self._store.get(index)
+            if volumes is not None and all(path in volumes for path in files):
+                self._store.move_to_end(index)
+                self.hits += 1
+                return volumes
+            pending = self._pending.get(index)
+
+        if pending is not None:
+            try:
+                volumes = pending[0].result()
+            except Exception:
+                # A failed prefetch is retried synchronously; a missing file may exist by now
+                volumes = None
+            if volumes is not None and all(path in volumes for path in files):
+                with self._lock:
+                    self.hits += 1
+                return volumes
+
+        with self._lock:
+            self.misses += 1
+
+        volumes = load_volumes(files, max_workers=self.load_workers)
+        self._store_session(index, volumes, token=None)
+        return volumes
+
+    def prefetch_around(self, index, resolve_files, session_count):
+        """
+        Schedule decoding of the sessions adjacent to the given index.
+
+        Pending prefetches for sessions outside the new neighbourhood are
+        cancelled so a jump across the session list does not leave stale work
+        queued ahead of the useful one.
+
+        Args:
+            index (int): Index of the session currently shown
+            resolve_files (callable): Returns the file list for a session index
+            session_count (int): Total number of sessions
+        """
+        wanted = [i for offset in range(1, self.radius + 1)
+                  for i in (index + offset, index - offset)
+                  if 0 <= i < session_count]
+
+        with self._lock:
+            self._current = index
+            for pending_index in list(self._pending):
+                if pending_index not in wanted:
+                    future, _ = self._pending.pop(pending_index)
+                    self._tokens.pop(pending_index, None)
+                    future.cancel()
+                    self.cancelled += 1
+
+            to_schedule = [i for i in wanted
+                           if i not in self._store and i not in self._pending]
+
+        for session_index in to_schedule:
+            try:
+                files = resolve_files(session_index)
+            except FileNotFoundError as e:
+                print(f"Warning: Skipping prefetch of session {session_index} - {str(e)}")
+                continue
+
+            token = object()
+            with self._lock:
+                self._tokens[session_index] = token
+                future = self.executor.submit(self._decode_session, session_index, files, token)
+                self._pending[session_index] = (future, token)
+
+    def _decode_session(self, index, files, token):
+        """Worker: decode all files of a session unless the job was cancelled."""
+        volumes = {}
+        try:
+            for path in files:
+                if self._tokens.get(index) is not token:
+                    return None
+                volumes[path] = load_volume(path)
+        except Exception:
+            # Forget the failed job so the session can be loaded or prefetched again
+            with self._lock:
+                if self._tokens.get(index) is token:
+                    self._tokens.pop(index, None)
+                    self._pending.pop(index, None)
+            raise
+
+        self._store_session(index, volumes, token)
+        return volumes
+
+    def _store_session(self, index, volumes, token):
+        """Insert decoded volumes and evict old sessions beyond the memory limit."""
+        size = sum(image_size_bytes(image) for image in volumes.values())
+
+        with self._lock:
+            if token is not None and self._tokens.get(index) is not token:
+                return
+            self._tokens.pop(index, None)
+            self._pending.pop(index, None)
+
+            if size > self.memory_limit and index != self._current:
+                return
+
+            self._store[index] = volumes
+            self._sizes[index] = size
+            self._store.move_to_end(index)
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used sessions until the store fits the memory limit."""
+        for index in list(self._store):
+            if sum(self._sizes.values()) <= self.memory_limit:
+                break
+            if index == self._current:
+                continue
+            del self._store[index]
+            del self._sizes[index]
+
+    def wait_idle(self, timeout=None):
+        """Block until the scheduled prefetches have finished or were cancelled."""
+        with self._lock:
+            futures = [future for future, _ in self._pending.values()]
+        wait(futures, timeout=timeout)
+
+    def memory_usage(self):
+        """Return the number of bytes currently held by the store."""
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def stats(self):
+        """Return hit/miss counters and store occupancy."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'cancelled': self.cancelled,
+                'stored_sessions': sorted(self._store),
+                'pending_sessions': sorted(self._pending),
+                'memory_mb': sum(self._sizes.values()) / (1024 * 1024),
+            }
+
+    def clear(self):
+        """Cancel outstanding work and drop all stored sessions."""
+        with self._lock:
+            for future, _ in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._tokens.clear()
+            self._store.clear()
+            self._sizes.clear()
+            self._current = None
+
+    def shutdown(self):
+        """Stop the worker threads."""
+        # clear() cancels the queued prefetches (cancel_futures needs Python 3.9)
+        self.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,101 @@
+import numpy as np
+from vtk.util.numpy_support import vtk_to_numpy
+
+SLAB_PROJECTIONS = ['mean', 'max', 'min']
+
+# Order of the [z, y, x] numpy axes that puts the slicing axis first and leaves each
+# plane as rows along the image's vertical axis and columns along its horizontal one
+_PLANE_ORDER = {
+    'x': (2, 1, 0),  # planes of [y, z]
+    'y': (1, 0, 2),  # planes of [z, x]
+    'z': (0, 1, 2),  # planes of [y, x]
+}
+
+
+class SlabProjectionEngine:
+    """
+    Projects any slab of a volume along one axis in constant time per pixel.
+
+    Per axis, a prefix sum over the voxel planes gives the mean of any run
+    of planes from two planes of the sum. Maximum and minimum come from a
+    sparse table: level k holds the extreme of every 2**k consecutive
+    planes, and two overlapping level-k windows cover any run of n planes
+    for k = floor(log2(n)). Levels are built on first use, each from the
+    one below, and kept until the slicing axis changes, so changing the
+    slab thickness never rebuilds them. Each level costs about one volume
+    of memory, and only levels up to the thickest slab shown are built.
+    """
+
+    def __init__(self, image):
+        """
+        Args:
+            image (vtkImageData): Single-component volume to project
+        """
+        nx, ny, nz = image.GetDimensions()
+        # VTK stores x fastest, so the numpy view is indexed [z, y, x]
+        self.voxels = vtk_to_numpy(image.GetPointData().GetScalars()).reshape(nz, ny, nx)
+        self.direction = None
+        self._planes = None   # voxels with the slicing axis first
+        self._prefix = None   # cumulative plane sums, one more plane than the volume
+        self._tables = {}     # 'max'/'min' -> sparse table levels, level 0 being the planes
+
+    def _set_direction(self, direction):
+        """Switch the slicing axis, dropping the structures of the previous one."""
+        if direction == self.direction:
+            return
+        self.direction = direction
+        self._prefix = None
+        self._tables = {}
+        self._planes = self.voxels.transpose(_PLANE_ORDER[direction])
+
+    def _prefix_sum(self):
+        if self._prefix is None:
+            # Integer volumes sum exactly in int64; anything else in float64
+            dtype = np.int64 if np.issubdtype(self._planes.dtype, np.integer) else np.float64
+            prefix = np.zeros((self._planes.shape[0] + 1,) + self._planes.shape[1:], dtype=dtype)
+            np.cumsum(self._planes, axis=0, dtype=dtype, out=prefix[1:])
+            self._prefix = prefix
+        return self._prefix
+
+    def _sparse_level(self, projection, level):
+        """Return the table of 2**level-plane extremes, building the missing levels below it."""
+        levels = self._tables.setdefault(projection, [self._planes])
+        combine = np.maximum if projection == 'max' else np.minimum
+        while len(levels) <= level:
+            width = 1 << (len(levels) - 1)
+            below = levels[-1]
+            levels.append(np.ascontiguousarray(combine(below[:-width], below[width:])))
+        return levels[level]
+
+    def project(self, direction, first, planes, projection):
+        """
+        Project a run of voxel planes.
+
+        Args:
+            direction (str): Slicing axis ('x', 'y' or 'z')
+            first (int): Index of the first plane
+            planes (int): Number of planes
+            projection (str): 'mean', 'max' or 'min'
+
+        Returns:
+            np.ndarray: 2D image, rows along the second and columns along the
+            first in-plane axis of SlabRenderer; float32 for means, the
+            volume's type otherwise
+        """
+        self._set_direction(direction)
+        last = first + planes - 1
+        if projection == 'mean':
+            prefix = self._prefix_sum()
+            image = ((prefix[last + 1] - prefix[first]) / planes).astype(np.float32)
+        else:
+            level = planes.bit_length() - 1
+            table = self._sparse_level(projection, level)
+            combine = np.maximum if projection == 'max' else np.minimum
+            image = combine(table[first], table[last - (1 << level) + 1])
+        return image
+
+    def nbytes(self):
+        """Return the memory held by the current structures in bytes."""
+        total = self._prefix.nbytes if self._prefix is not None else 0
+        # Level 0 is a view of the voxels
+        return total + sum(table.nbytes for levels in self._tables.values() for table in levels[1:])
@@ -0,0 +1,198 @@
+import math
+from collections import OrderedDict
+
+import vtk
+from vtk.util.numpy_support import numpy_to_vtk
+
+from slab_projection import SlabProjectionEngine
+
+# Projected slabs kept per view; one entry is a single 2D image
+SLAB_CACHE_ENTRIES = 64
+
+# Slab positions projected ahead on each side of the current one
+SLAB_PRECOMPUTE_RADIUS = 4
+
+# In-plane axes and normal of the projection image per slicing direction
+_SLAB_AXES = {
+    'x': ((0, 0, 1), (0, 1, 0), (1, 0, 0)),
+    'y': ((1, 0, 0), (0, 0, 1), (0, 1, 0)),
+    'z': ((1, 0, 0), (0, 1, 0), (0, 0, 1)),
+}
+_AXIS_INDEX = {'x': 0, 'y': 1, 'z': 2}
+
+
+def slab_voxel_range(image, direction, slab_start, thickness):
+    """
+    Return the voxel planes whose centres lie in a slab.
+
+    A slab thinner than the voxel spacing that falls between two centres
+    uses the plane nearest to its middle.
+
+    Args:
+        image (vtkImageData): Volume being sliced
+        direction (str): Slicing axis ('x', 'y' or 'z')
+        slab_start (float): World position of the slab's lower face
+        thickness (float): Slab thickness in world units
+
+    Returns:
+        tuple: (first plane index, number of planes)
+    """
+    axis = _AXIS_INDEX[direction]
+    origin = image.GetOrigin()[axis]
+    spacing = image.GetSpacing()[axis]
+    extent = image.GetExtent()
+    low, high = extent[2 * axis], extent[2 * axis + 1]
+
+    first = max(low, math.ceil((slab_start - origin) / spacing - 1e-6))
+    last = min(high, math.floor((slab_start + thickness - origin) / spacing + 1e-6))
+    if first > last:
+        middle = round((slab_start + thickness / 2 - origin) / spacing)
+        first = last = min(high, max(low, middle))
+    return first, last - first + 1
+
+
+class SlabRenderer:
+    """
+    Shows the slab of a volume as a 2D mean, maximum or minimum intensity projection.
+
+    Much cheaper than ray casting a cropped volume: the slab is projected
+    by a SlabProjectionEngine in time independent of its thickness and
+    drawn as a textured image actor lying on the slab's far face.
+    Projections are cached per direction, position, slab size and
+    projection type, so scrolling back and forth reuses them.
+    """
+
+    def __init__(self, renderer, cache_entries=SLAB_CACHE_ENTRIES):
+        """
+        Args:
+            renderer (vtkRenderer): Renderer receiving the image actor
+            cache_entries (int): Projected slabs kept in memory
+        """
+        self.image = None
+        self.engine = None
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()  # (direction, first plane, planes, projection) -> vtkImageData
+        self._shown = None           # cache key of the displayed slab
+        self.precomputed = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.actor = vtk.vtkImageActor()
+        self.actor.GetProperty().UseLookupTableScalarRangeOn()
+        self.actor.GetProperty().SetInterpolationTypeToLinear()
+        self.actor.SetVisibility(False)
+        renderer.AddViewProp(self.actor)
+
+    def set_input(self, image):
+        """Project another volume; its cached slabs and projection structures are dropped."""
+        self.image = image
+        self.engine = SlabProjectionEngine(image)
+        self._cache.clear()
+
+    def set_lookup_table(self, lookup_table):
+        """Colour the projection with a lookup table or colour transfer function."""
+        self.actor.GetProperty().SetLookupTable(lookup_table)
+
+    def show(self, direction, slab_start, thickness, projection):
+        """
+        Display the projection of a slab.
+
+        Args:
+            direction (str): Slicing axis ('x', 'y' or 'z')
+            slab_start (float): World position of the slab's lower face
+            thickness (float): Slab thickness in world units
+            projection (str): 'mean', 'max' or 'min'
+        """
+        if self.image is None:
+            return
+        key = self._key(direction, slab_start, thickness, projection)
+        slab = self._cache.get(key)
+        if slab is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            slab = self._store(key)
+        self._shown = key
+
+        self.actor.GetMapper().SetInputData(slab)
+        # On the slab face away from the default camera, so overlays inside the slab stay in front
+        self.actor.SetUserMatrix(self._axes_matrix(direction, slab_start))
+
+    def precompute(self, direction, slab_starts, thickness, projection):
+        """
+        Project slabs ahead of time so showing them later is a cache hit.
+
+        Args:
+            direction (str): Slicing axis ('x', 'y' or 'z')
+            slab_starts (list): Slab positions, most likely to be shown first
+            thickness (float): Slab thickness in world units
+            projection (str): 'mean', 'max' or 'min'
+
+        Returns:
+            int: Number of slabs projected
+        """
+        if self.image is None:
+            return 0
+        # Never more than fit beside the displayed slab
+        keys = [self._key(direction, start, thickness, projection) for start in slab_starts]
+        keys = list(OrderedDict.fromkeys(key for key in keys if key != self._shown))[:self.cache_entries - 1]
+
+        computed = 0
+        # Least likely first, so the likeliest slabs end up most recently used
+        for key in reversed(keys):
+            if key in self._cache:
+                self._cache.move_to_end(key)
+            else:
+                self._store(key)
+                computed += 1
+        if self._shown in self._cache:
+            self._cache.move_to_end(self._shown)
+        self.precomputed += computed
+        return computed
+
+    def _key(self, direction, slab_start, thickness, projection):
+        """Cache key of a slab: the voxel planes it covers and how they are projected."""
+        first, planes = slab_voxel_range(self.image, direction, slab_start, thickness)
+        return direction, first, planes, projection
+
+    def _store(self, key):
+        """Project a slab into the cache, evicting the least recently used ones beyond its size."""
+        slab = self._project(*key)
+        self._cache[key] = slab
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+        return slab
+
+    def _axes_matrix(self, direction, normal_position):
+        """Matrix whose columns are the image axes and whose origin lies at normal_position on the normal."""
+        u, v, normal = _SLAB_AXES[direction]
+        origin = [0.0, 0.0, 0.0]
+        origin[_AXIS_INDEX[direction]] = normal_position
+
+        matrix = vtk.vtkMatrix4x4()
+        for row in range(3):
+            matrix.SetElement(row, 0, u[row])
+            matrix.SetElement(row, 1, v[row])
+            matrix.SetElement(row, 2, normal[row])
+            matrix.SetElement(row, 3, origin[row])
+        return matrix
+
+    def _project(self, direction, first, planes, projection):
+        """Project a run of voxel planes into a standalone 2D image in the slab's plane coordinates."""
+        pixels = self.engine.project(direction, first, planes, projection)
+        u, v, _ = _SLAB_AXES[direction]
+        u_axis, v_axis = u.index(1), v.index(1)
+        spacing = self.image.GetSpacing()
+        origin = self.image.GetOrigin()
+
+        slab = vtk.vtkImageData()
+        slab.SetDimensions(pixels.shape[1], pixels.shape[0], 1)
+        slab.SetSpacing(spacing[u_axis], spacing[v_axis], spacing[_AXIS_INDEX[direction]])
+        slab.SetOrigin(origin[u_axis], origin[v_axis], 0.0)
+        slab.GetPointData().SetScalars(numpy_to_vtk(pixels.ravel(), deep=True))
+        return slab
+
+    def clear(self):
+        """Drop all cached projections."""
+        self._cache.clear()
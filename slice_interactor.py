@@ -137,6 +137,24 @@ class SlicePlanes:
         if hasattr(self.instance, 'mask_overlay') and self.instance.mask_overlay:
             self.instance.mask_overlay.update_clipping_bounds()
             
+        # Views in slab projection mode show the new slab as a 2D image
+        for renderer in self.renderer_instances:
+            renderer.update_slab()
+            
+    def clampSlice(self, position):
+        """Limit a slab position to the range reachable by scrolling."""
+        min_slice = self.slice_min - self.thickness
+        max_slice = self.slice_max - self.thickness
+        return max(min_slice, min(position, max_slice))
+        
+    def neighbouringSlices(self, radius):
+        """Return the slab positions up to radius scroll steps away, nearest first."""
+        positions = []
+        for distance in range(1, radius + 1):
+            for direction in (1, -1):
+                positions.append(self.clampSlice(self.current_slice + direction * distance * self.step))
+        return positions
+        
     def addWindow(self, mapper, renderer, bounds):
         """Add a new window for synchronized viewing."""
         self.windows.append({
@@ -145,6 +163,17 @@ class SlicePlanes:
             'bounds': bounds
         })
     
+    def updateWindowBounds(self, mapper, bounds):
+        """Replace the stored bounds of a window after its volume changed."""
+        for window in self.windows:
+            if window['mapper'] is mapper:
+                window['bounds'] = bounds
+                
+    def resetPlanes(self, slice_direction='y'):
+        """Recompute bounds and recentre the slab after the windows received new volumes."""
+        self.current_slice = None
+        self.initPlanes(slice_direction)
+    
     def addRenderer(self, renderer_instance):
         """Add a renderer instance for property updates."""
         self.renderer_instances.append(renderer_instance)
@@ -156,9 +185,27 @@ class SliceInteractor(vtk.vtkInteractorStyleTrackballCamera):
         super().__init__()
         self.AddObserver("MouseWheelForwardEvent", self.onScroll)
         self.AddObserver("MouseWheelBackwardEvent", self.onScroll)
+        self.AddObserver("StartInteractionEvent", self.onStartInteraction)
+        self.AddObserver("EndInteractionEvent", self.onEndInteraction)
         self.instance = instance
         self.planes = instance.SlicePlanes
         
+    def _lod(self):
+        """Return the viewer's interactive level-of-detail controller, if any."""
+        return getattr(self.instance, 'interactive_lod', None)
+        
+    def onStartInteraction(self, obj, event):
+        """Render coarsely while rotating, panning or zooming with the mouse."""
+        lod = self._lod()
+        if lod:
+            lod.start_interaction()
+            
+    def onEndInteraction(self, obj, event):
+        """Refine to full quality once the mouse has been released for a moment."""
+        lod = self._lod()
+        if lod:
+            lod.end_interaction()
+        
     def onScroll(self, obj, event):
         """Handle scroll events for slice navigation and zooming."""
         is_forward = event == "MouseWheelForwardEvent"
@@ -173,11 +220,10 @@ class SliceInteractor(vtk.vtkInteractorStyleTrackballCamera):
             direction = 1 if is_forward else -1
             step = self.planes.step * direction
             
-            new_slice = self.planes.current_slice + step
-            min_slice = self.planes.slice_min - self.planes.thickness
-            max_slice = self.planes.slice_max - self.planes.thickness
-            
-            self.planes.current_slice = max(min_slice, min(new_slice, max_slice))
+            self.planes.current_slice = self.planes.clampSlice(self.planes.current_slice + step)
             self.planes._updateCroppingPlanes()
             
+        lod = self._lod()
+        if lod:
+            lod.touch()
         self.instance.render_all()
\ No newline at end of file
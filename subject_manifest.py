@@ -0,0 +1,239 @@
+import os
+import json
+import fnmatch
+import tempfile
+from stat import S_ISDIR
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+MANIFEST_FILENAME = ".mri_viewer_manifest.json"
+MANIFEST_VERSION = 2
+
+# File name patterns of every file role inside a session directory
+FILE_PATTERNS = {
+    't1': "*Lreg_t1.nii.gz",
+    'flair': "*Lreg_flair.nii.gz",
+    'swi_mag': "*Lreg_swiMag.nii.gz",
+    'swi_phase': "*Lreg_swiPhase.nii.gz",
+    'lesion': "*Lreg_lesionmask.nii.gz",
+    'prl': "*Lreg_PRLmask.nii.gz",
+}
+
+
+def is_valid_session_name(name):
+    """
+    Check that a directory name follows the ses-YYYYMMDD convention.
+
+    Returns:
+        tuple: (is_valid, reason) where reason explains a rejection
+    """
+    date_str = name[4:]
+    if len(date_str) != 8 or not date_str.isdigit():
+        return False, "invalid format"
+
+    year = int(date_str[:4])
+    month = int(date_str[4:6])
+    day = int(date_str[6:])
+    if not (1900 <= year <= 2100 and 1 <= month <= 12 and 1 <= day <= 31):
+        return False, "invalid date"
+    return True, None
+
+
+def read_header_info(path):
+    """
+    Read geometry and data type of a NIfTI file from its header only.
+
+    Returns:
+        dict: Dimensions, spacing, dtype and number of components
+    """
+    reader = vtk.vtkNIFTIImageReader()
+    reader.SetFileName(path)
+    reader.UpdateInformation()
+
+    extent = reader.GetDataExtent()
+    dtype = numpy_support.get_vtk_to_numpy_typemap()[reader.GetDataScalarType()]
+    return {
+        'dimensions': [extent[1] - extent[0] + 1,
+                       extent[3] - extent[2] + 1,
+                       extent[5] - extent[4] + 1],
+        'spacing': list(reader.GetDataSpacing()),
+        'dtype': np.dtype(dtype).name,
+        'components': reader.GetNumberOfScalarComponents(),
+    }
+
+
+class SubjectManifest:
+    """
+    Persistent index of a subject's sessions and image files.
+
+    The manifest lists every valid session with the files matching each role,
+    their geometry and data type (read from NIfTI headers only) and, once
+    known, their intensity statistics. It is stored as JSON in the subject
+    directory and refreshed incrementally: the subject directory is listed
+    once, only session directories whose mtime changed are listed again, and
+    only files whose mtime or size changed have their header re-read.
+    """
+
+    def __init__(self, subject_path):
+        """
+        Args:
+            subject_path (str): Subject directory containing ses-YYYYMMDD folders
+        """
+        self.subject_path = os.path.abspath(subject_path)
+        self.manifest_path = os.path.join(self.subject_path, MANIFEST_FILENAME)
+        self.data = self._load()
+        self.dirty = False
+        self.refresh()
+
+    def _load(self):
+        """Load the stored manifest, or start an empty one."""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {'version': MANIFEST_VERSION, 'sessions': {}}
+
+    def refresh(self):
+        """Bring the manifest up to date with the directory tree and save it if anything changed."""
+        sessions = {}
+        for name in sorted(os.listdir(self.subject_path)):
+            if not name.startswith('ses-'):
+                continue
+            session_path = os.path.join(self.subject_path, name)
+            try:
+                stat = os.stat(session_path)
+            except OSError:
+                continue
+            if not S_ISDIR(stat.st_mode):
+                continue
+
+            valid, reason = is_valid_session_name(name)
+            if not valid:
+                print(f"Warning: Skipping directory with {reason}: {name}")
+                continue
+
+            entry = self.data['sessions'].get(name)
+            if entry is None or entry['mtime_ns'] != stat.st_mtime_ns:
+                entry = self._scan_session(session_path, stat.st_mtime_ns, entry)
+                self.dirty = True
+            sessions[name] = entry
+
+        if set(sessions) != set(self.data['sessions']):
+            self.dirty = True
+        self.data['sessions'] = sessions
+        self.save()
+
+    def _scan_session(self, session_path, session_mtime, previous):
+        """Index the files of one session, reusing header info of unchanged files."""
+        previous_files = previous['files'] if previous else {}
+        entries = sorted(os.listdir(session_path))
+
+        files = {}
+        for role, pattern in FILE_PATTERNS.items():
+            matches = fnmatch.filter(entries, pattern)
+            if not matches:
+                continue
+
+            name = matches[0]
+            stat = os.stat(os.path.join(session_path, name))
+            old = previous_files.get(role)
+            if (old and old['name'] == name and old['mtime_ns'] == stat.st_mtime_ns
+                    and old['size'] == stat.st_size):
+                files[role] = old
+                continue
+
+            info = {'name': name, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                    'stats': {}}
+            try:
+                info.update(read_header_info(os.path.join(session_path, name)))
+            except Exception as e:
+                print(f"Warning: Could not read header of {name} - {str(e)}")
+            files[role] = info
+
+        return {'mtime_ns': session_mtime, 'files': files}
+
+    def save(self):
+        """Write the manifest if it changed; an unwritable subject directory keeps it in memory."""
+        if not self.dirty:
+            return
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.subject_path, prefix=MANIFEST_FILENAME,
+                                            suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+            self.dirty = False
+        except OSError as e:
+            print(f"Warning: Could not save subject manifest - {str(e)}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def sessions(self):
+        """Return session directory names sorted chronologically."""
+        return sorted(self.data['sessions'], key=lambda name: name[4:])
+
+    def find_file(self, session, role):
+        """
+        Return the path of a session file by role.
+
+        Args:
+            session (str): Session directory name or full session path
+            role (str): One of the FILE_PATTERNS keys
+
+        Returns:
+            str: Absolute file path, or None if the session has no such file
+        """
+        name = os.path.basename(os.path.normpath(session))
+        entry = self.data['sessions'].get(name)
+        if not entry or role not in entry['files']:
+            return None
+        return os.path.join(self.subject_path, name, entry['files'][role]['name'])
+
+    def _file_entry(self, path):
+        """Return the manifest entry of a file path, or None."""
+        session = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        entry = self.data['sessions'].get(session)
+        if not entry:
+            return None
+        name = os.path.basename(path)
+        for info in entry['files'].values():
+            if info['name'] == name:
+                return info
+        return None
+
+    def file_info(self, path):
+        """Return the stored header info of a file path, or None."""
+        return self._file_entry(path)
+
+    def get_stats(self, path, signature):
+        """Return intensity stats recorded for a file under the given settings, or None if unknown or stale."""
+        info = self._file_entry(path)
+        if not info or signature not in info.get('stats', {}):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_mtime_ns != info['mtime_ns'] or stat.st_size != info['size']:
+            return None
+        return info['stats'][signature]
+
+    def record_stats(self, path, signature, stats):
+        """
+        Store intensity stats computed for a file.
+
+        Args:
+            path (str): File path
+            signature (str): Settings the stats were computed with (IntensityStatsEngine.signature)
+            stats (dict): Stats as returned by compute_intensity_stats
+        """
+        info = self._file_entry(path)
+        if info is not None and info.setdefault('stats', {}).get(signature) != stats:
+            info['stats'][signature] = stats
+            self.dirty = True
@@ -1,25 +1,90 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import vtk
-import numpy as np
-from vtk.util import numpy_support
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QSlider, QLabel, QFrame, QCheckBox
+    QPushButton, QSlider, QLabel, QFrame, QCheckBox, QProgressBar,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QFileDialog, QMessageBox
 )
 from PyQt5.QtCore import Qt, QTimer
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+from progression import ProgressionFrames, create_label_property, set_label_opacity, aim_camera
+from progression_cache import ProgressionCache
+from lesion_tracking import track_lesions, write_lesion_csv
+from progression_export import export_progression, camera_settings, DEFAULT_EXPORT_SIZE
+from progression_interpolation import DEFAULT_INTERPOLATION_STEPS
+from volume_mappers import create_volume_mapper
+
+# Frame rate of exported videos; each timepoint is held for as long as during playback
+EXPORT_FPS = 25
+
+# Columns of the lesion load table: (header, key in the track_lesions session summary)
+LESION_TABLE_COLUMNS = [
+    ("Session", 'session'),
+    ("Volume (mm³)", 'total_volume_mm3'),
+    ("Lesions", 'lesion_count'),
+    ("New", 'new'),
+    ("Enlarging", 'enlarging'),
+    ("Shrinking", 'shrinking'),
+    ("Disappeared", 'disappeared'),
+]
 
 class TumorAnimationWindow(QMainWindow):
-    def __init__(self, parent=None, tumor_files=None):
+    def __init__(self, parent=None, tumor_files=None, max_frames=10, read_ahead=3, workers=None,
+                 cache_dir=None, interpolation_steps=0):
+        """
+        Args:
+            parent: Parent widget
+            tumor_files (list): Chronologically sorted lesion mask paths
+            max_frames (int): Number of computed label frames kept in memory
+            read_ahead (int): Frames computed ahead of the shown one during playback
+            workers (int): Threads decoding masks and computing frames (default: up to 4)
+            cache_dir (str): Directory persisting computed frames across openings, or None
+            interpolation_steps (int): Frames interpolated between consecutive timepoints
+                (0: off; the Interpolate toggle then uses DEFAULT_INTERPOLATION_STEPS)
+        """
         super().__init__(parent)
         self.tumor_files = tumor_files or []
         self.current_frame = 0
         self.is_playing = False
-        self.frame_delay = 500  # milliseconds between frames
-        
-        # Store the processed volumes
-        self.stable_volumes = []
-        self.growth_volumes = []
-        self.reduction_volumes = []
+        self.frame_delay = 100  # milliseconds between frames, matching the initial speed slider value
+        
+        # Label images (see REGION_LABELS) are computed on a worker pool;
+        # the window shows each frame once it is done
+        cache = ProgressionCache(cache_dir) if cache_dir else None
+        self.frames = ProgressionFrames(self.tumor_files, max_frames=max_frames, workers=workers,
+                                        cache=cache, substeps=interpolation_steps)
+        self.frame_workers = workers
+        self.interpolation_steps = interpolation_steps or DEFAULT_INTERPOLATION_STEPS
+        self.read_ahead = read_ahead
+        self.precompute_frames = []
+        self.waiting_frame = None  # Frame requested for display that is still being computed
+        self.camera_initialized = False
+        
+        # One volume per materialized frame, all sharing one property; frames
+        # switch by visibility so their textures stay on the GPU
+        self.frame_volumes = {}  # frame index -> vtkVolume
+        self.visible_frame = None
+        
+        # Frame-time measurement over the most recent frames
+        self.render_times = deque(maxlen=60)
+        self.frame_timestamps = deque(maxlen=60)
+        
+        # Lesion load series, computed once in the background
+        self.lesion_result = None
+        self.lesion_future = None
+        self.lesion_stop = threading.Event()
+        self.lesion_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lesion-load")
+        self.lesion_canvas = None
+        
+        # Video export, run off the GUI thread (it waits on its own render processes)
+        self.export_future = None
+        self.export_progress = None
+        self.export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="progression-export")
         
         # Track visibility states
         self.show_stable = True
@@ -28,8 +93,14 @@ class TumorAnimationWindow(QMainWindow):
         
         # Animation timer
         self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.next_frame)
         
+        # Picks up frames finished by the workers on the GUI thread
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(50)
+        self.progress_timer.timeout.connect(self.poll_frames)
+        
         self.setupUI()
         self.initializeVTK()
         self.loadTumorData()
@@ -174,16 +245,117 @@ class TumorAnimationWindow(QMainWindow):
             }
         """)
         
+        self.fps_label = QLabel("")
+        self.fps_label.setStyleSheet("color: #A0A0A0; font-size: 10pt;")
+        
+        self.interpolate_check = QCheckBox("Interpolate")
+        self.interpolate_check.setToolTip("Morph between timepoints with intermediate frames")
+        self.interpolate_check.setStyleSheet("color: white; font-size: 11pt;")
+        self.interpolate_check.setChecked(self.frames.substeps > 0)
+        self.interpolate_check.toggled.connect(self.toggle_interpolation)
+        
         playback_layout.addWidget(self.play_button)
         playback_layout.addWidget(self.speed_label)
         playback_layout.addWidget(self.speed_slider)
+        playback_layout.addWidget(self.interpolate_check)
+        playback_layout.addWidget(self.fps_label)
         playback_layout.addStretch()
         
+        self.lesion_button = QPushButton("Lesion Load")
+        self.lesion_button.setCheckable(True)
+        self.lesion_button.toggled.connect(self.toggle_lesion_panel)
+        self.lesion_button.setStyleSheet(self.play_button.styleSheet())
+        playback_layout.addWidget(self.lesion_button)
+        
+        self.orbit_check = QCheckBox("Orbit")
+        self.orbit_check.setToolTip("Rotate the camera once around the volume in exported videos")
+        self.orbit_check.setStyleSheet("color: white; font-size: 11pt;")
+        self.export_video_button = QPushButton("Export Video")
+        self.export_video_button.clicked.connect(self.export_video)
+        self.export_video_button.setStyleSheet(self.play_button.styleSheet())
+        playback_layout.addWidget(self.orbit_check)
+        playback_layout.addWidget(self.export_video_button)
+        
+        # Progress of the background frame computation
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFormat("Computing timepoints: %v/%m")
+        self.progress_bar.setStyleSheet("""
+            QProgressBar {
+                background-color: #404040;
+                color: white;
+                border: none;
+                border-radius: 4px;
+                text-align: center;
+                font-size: 10pt;
+            }
+            QProgressBar::chunk {
+                background-color: #0078D7;
+                border-radius: 4px;
+            }
+        """)
+        self.progress_bar.hide()
+        
         # Add all controls to layout
+        controls_layout.addWidget(self.progress_bar)
         controls_layout.addLayout(visibility_layout)
         controls_layout.addLayout(slider_layout)
         controls_layout.addLayout(playback_layout)
         layout.addWidget(controls)
+        
+        self.setupLesionPanel(layout)
+
+    def setupLesionPanel(self, layout):
+        """Create the hidden lesion load panel: per-session table, plot and CSV export."""
+        self.lesion_panel = QWidget()
+        self.lesion_panel.setMinimumHeight(240)
+        panel_layout = QHBoxLayout(self.lesion_panel)
+        panel_layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.lesion_table = QTableWidget(0, len(LESION_TABLE_COLUMNS))
+        self.lesion_table.setHorizontalHeaderLabels([header for header, _ in LESION_TABLE_COLUMNS])
+        self.lesion_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.lesion_table.verticalHeader().setVisible(False)
+        self.lesion_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.lesion_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.lesion_table.cellClicked.connect(
+            lambda row, _: self.frame_slider.setValue(self.frames.keyframe(row))
+        )
+        self.lesion_table.setStyleSheet("""
+            QTableWidget {
+                background-color: #1E1E1E;
+                color: white;
+                gridline-color: #404040;
+                font-size: 10pt;
+            }
+            QHeaderView::section {
+                background-color: #404040;
+                color: white;
+                border: none;
+                padding: 4px;
+            }
+            QTableWidget::item:selected {
+                background-color: #0078D7;
+            }
+        """)
+        
+        side_layout = QVBoxLayout()
+        self.lesion_plot_layout = QVBoxLayout()
+        self.lesion_status = QLabel("Computing lesion load...")
+        self.lesion_status.setStyleSheet("color: #A0A0A0; font-size: 10pt;")
+        self.export_button = QPushButton("Export CSV")
+        self.export_button.setEnabled(False)
+        self.export_button.clicked.connect(self.export_lesion_csv)
+        self.export_button.setStyleSheet(self.play_button.styleSheet())
+        
+        side_layout.addLayout(self.lesion_plot_layout, 1)
+        side_layout.addWidget(self.lesion_status)
+        side_layout.addWidget(self.export_button)
+        
+        panel_layout.addWidget(self.lesion_table, 3)
+        panel_layout.addLayout(side_layout, 2)
+        
+        self.lesion_panel.hide()
+        layout.addWidget(self.lesion_panel)
 
     def initializeVTK(self):
         """Initialize VTK pipeline with proper resource management."""
@@ -212,191 +384,385 @@ class TumorAnimationWindow(QMainWindow):
         
         self.interactor.Initialize()
         self.interactor.Start()
-
-    def create_volume_property(self, color, opacity=0.6):
-        """Create a volume property with specified color and opacity."""
-        volume_property = vtk.vtkVolumeProperty()
-        volume_property.ShadeOn()
-        
-        # Create color transfer function
-        color_tf = vtk.vtkColorTransferFunction()
-        color_tf.AddRGBPoint(0, 0, 0, 0)  # Transparent for 0 values
-        color_tf.AddRGBPoint(1, *color)   # Specified color for mask values
-        
-        # Create opacity transfer function
-        opacity_tf = vtk.vtkPiecewiseFunction()
-        opacity_tf.AddPoint(0, 0)         # Transparent for 0 values
-        opacity_tf.AddPoint(1, opacity)    # Semi-transparent for mask values
-        
-        volume_property.SetColor(color_tf)
-        volume_property.SetScalarOpacity(opacity_tf)
-        volume_property.SetInterpolationTypeToLinear()
-        
-        # Enhanced lighting for better depth perception
-        volume_property.SetAmbient(0.4)
-        volume_property.SetDiffuse(0.6)
-        volume_property.SetSpecular(0.2)
-        volume_property.SetSpecularPower(10)
         
+        # Shared by the label volumes of all frames
+        self.volume_property = self.create_volume_property()
+
+    def create_volume_property(self, opacity=0.6):
+        """Create the label volume property with one colour per region type."""
+        self.label_opacity = opacity
+        volume_property, self.opacity_tf = create_label_property(opacity, self.visible_regions())
         return volume_property
 
-    def compute_difference_volumes(self):
-        """
-        Compute difference volumes between consecutive timepoints.
-        Creates three sets of volumes: stable regions, growth, and reduction.
-        """
-        self.stable_volumes = []
-        self.growth_volumes = []
-        self.reduction_volumes = []
-        
-        # Load first timepoint to get dimensions and initial data
-        prev_reader = vtk.vtkNIFTIImageReader()
-        prev_reader.SetFileName(self.tumor_files[0])
-        prev_reader.Update()
-        
-        # Store the image dimensions for reuse
-        self.image_dims = prev_reader.GetOutput().GetDimensions()
-        
-        # Get the data and reshape it to match image dimensions
-        prev_data = numpy_support.vtk_to_numpy(
-            prev_reader.GetOutput().GetPointData().GetScalars()
-        ).reshape(self.image_dims)
-        
-        # Store first timepoint as initial stable volume
-        self.stable_volumes.append(self.create_volume_from_array(prev_data))
-        self.growth_volumes.append(None)  # No growth for first timepoint
-        self.reduction_volumes.append(None)  # No reduction for first timepoint
-        
-        # Process subsequent timepoints
-        for i in range(1, len(self.tumor_files)):
-            curr_reader = vtk.vtkNIFTIImageReader()
-            curr_reader.SetFileName(self.tumor_files[i])
-            curr_reader.Update()
-            
-            # Reshape the current data to match dimensions
-            curr_data = numpy_support.vtk_to_numpy(
-                curr_reader.GetOutput().GetPointData().GetScalars()
-            ).reshape(self.image_dims)
-            
-            # Compute differences
-            stable = np.logical_and(prev_data > 0, curr_data > 0)
-            growth = np.logical_and(curr_data > 0, prev_data == 0)
-            reduction = np.logical_and(prev_data > 0, curr_data == 0)
-            
-            # Create volumes
-            self.stable_volumes.append(self.create_volume_from_array(stable))
-            self.growth_volumes.append(self.create_volume_from_array(growth))
-            self.reduction_volumes.append(self.create_volume_from_array(reduction))
-            
-            prev_data = curr_data
+    def visible_regions(self):
+        """Return region type -> shown, as set by the visibility toggles."""
+        return {
+            'stable': self.show_stable,
+            'growth': self.show_growth,
+            'reduction': self.show_reduction,
+        }
+
+    def update_label_opacity(self):
+        """Make the labels of hidden region types fully transparent."""
+        set_label_opacity(self.opacity_tf, self.label_opacity, self.visible_regions())
+
+    def loadTumorData(self):
+        """Start computing the tumor progression frames in the background."""
+        if not self.tumor_files:
+            return
             
         # Configure frame slider
-        self.frame_slider.setMaximum(len(self.tumor_files) - 1)
+        self.frame_slider.setMaximum(len(self.frames) - 1)
         self.frame_slider.setValue(0)
-        self.frame_label.setText(f"Timepoint: 1/{len(self.tumor_files)}")
-
-    def create_volume_from_array(self, numpy_array):
-        """
-        Create a VTK volume from a numpy array.
         
-        Args:
-            numpy_array: 3D numpy array with the same dimensions as the original image
-            
-        Returns:
-            vtk.vtkVolume: Volume ready for rendering
-        """
-        if numpy_array is None:
-            return None
-            
-        # Create VTK array from flattened numpy array
-        vtk_data = numpy_support.numpy_to_vtk(
-            numpy_array.ravel().astype(np.float32),
-            deep=True,
-            array_type=vtk.VTK_FLOAT
+        # Precompute as many timepoints as the frame cache holds, first one first
+        self.precompute_frames = [self.frames.keyframe(timepoint) for timepoint in
+                                  range(min(len(self.tumor_files), self.frames.max_frames))]
+        self.frames.schedule(self.precompute_frames)
+        self.frames.schedule_supports()
+        self.progress_bar.setMaximum(len(self.precompute_frames))
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        
+        # Lesion load numbers come from the same masks and are cheap next to rendering
+        self.lesion_future = self.lesion_executor.submit(
+            track_lesions, self.tumor_files, should_stop=self.lesion_stop.is_set
         )
         
-        # Create image data with proper dimensions
-        img = vtk.vtkImageData()
-        img.SetDimensions(self.image_dims)  # Use stored dimensions
-        img.GetPointData().SetScalars(vtk_data)
-        
-        # Set proper spacing and origin
-        img.SetSpacing(1.0, 1.0, 1.0)  # Use actual spacing if available from NIFTI
-        img.SetOrigin(0.0, 0.0, 0.0)   # Use actual origin if available from NIFTI
-        
-        # Create mapper
-        mapper = vtk.vtkGPUVolumeRayCastMapper()
-        mapper.SetInputData(img)
-        
-        # Create volume
-        volume = vtk.vtkVolume()
-        volume.SetMapper(mapper)
+        self.show_frame(0)
+        self.progress_timer.start()
+        
+    def poll_frames(self):
+        """Update the progress indicator and show a requested frame once it is computed."""
+        done = sum(1 for i in self.precompute_frames
+                   if self.frames.is_ready(i) or self.frames.error(i) is not None)
+        self.progress_bar.setValue(done)
+        if done == len(self.precompute_frames):
+            self.progress_bar.hide()
+        
+        if self.waiting_frame is not None:
+            frame = self.waiting_frame
+            if self.frames.is_ready(frame):
+                self.show_frame(frame)
+            elif self.frames.error(frame) is not None:
+                self.waiting_frame = None
+                print(f"Warning: Could not compute frame {frame + 1} - {str(self.frames.error(frame))}")
+                self.frame_label.setText(f"{self.frame_text(frame)} (failed)")
+        
+        if self.lesion_future is not None and self.lesion_future.done():
+            self.finish_lesion_load()
+        
+        if self.export_future is not None:
+            self.poll_export()
+        
+        if (self.waiting_frame is None and done == len(self.precompute_frames)
+                and self.lesion_future is None and self.export_future is None):
+            self.progress_timer.stop()
+
+    def finish_lesion_load(self):
+        """Take over the lesion load series computed in the background."""
+        future, self.lesion_future = self.lesion_future, None
+        try:
+            self.lesion_result = future.result()
+        except Exception as e:
+            print(f"Warning: Could not compute lesion load - {str(e)}")
+            self.lesion_status.setText(f"Lesion load unavailable: {str(e)}")
+            return
+        if self.lesion_result is None:
+            return
         
-        return volume
+        sessions = self.lesion_result['sessions']
+        self.lesion_table.setRowCount(len(sessions))
+        for row, summary in enumerate(sessions):
+            for column, (_, key) in enumerate(LESION_TABLE_COLUMNS):
+                value = summary[key]
+                text = f"{value:.1f}" if isinstance(value, float) else str(value)
+                item = QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.lesion_table.setItem(row, column, item)
+        timepoint, _ = self.frames.frame_time(self.current_frame)
+        if self.lesion_table.rowCount() > timepoint:
+            self.lesion_table.selectRow(timepoint)
+        
+        tracks = len({row['track_id'] for row in self.lesion_result['lesions']})
+        self.lesion_status.setText(f"{tracks} lesions tracked over {len(sessions)} sessions")
+        self.export_button.setEnabled(True)
+        self.update_lesion_plot()
 
-    def loadTumorData(self):
-        """Load and process tumor mask data for animation."""
-        if not self.tumor_files:
+    def toggle_lesion_panel(self, checked):
+        """Show or hide the lesion load panel."""
+        self.lesion_panel.setVisible(checked)
+        if checked:
+            self.update_lesion_plot()
+
+    def update_lesion_plot(self):
+        """Plot total lesion volume and count per session once the panel is visible."""
+        if self.lesion_result is None or not self.lesion_panel.isVisible():
             return
-            
-        # Compute difference volumes
-        self.compute_difference_volumes()
         
-        # Show first timepoint
-        self.show_frame(0)
+        if self.lesion_canvas is None:
+            # Imported on first use so opening the window does not pay for matplotlib
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+            self.lesion_figure = Figure(figsize=(4, 2.4), facecolor='#000000')
+            self.lesion_canvas = FigureCanvasQTAgg(self.lesion_figure)
+            self.lesion_plot_layout.addWidget(self.lesion_canvas)
+        
+        sessions = self.lesion_result['sessions']
+        labels = [summary['session'][4:] for summary in sessions]
+        positions = list(range(len(sessions)))
+        
+        self.lesion_figure.clear()
+        volume_axis = self.lesion_figure.add_subplot(111)
+        count_axis = volume_axis.twinx()
+        count_axis.bar(positions, [summary['lesion_count'] for summary in sessions],
+                       color='#404040', width=0.6)
+        volume_axis.plot(positions, [summary['total_volume_mm3'] for summary in sessions],
+                         color='#FF4040', marker='o')
+        # Keep the volume line in front of the count bars
+        volume_axis.set_zorder(count_axis.get_zorder() + 1)
+        volume_axis.patch.set_visible(False)
+        
+        volume_axis.set_ylabel("Volume (mm³)", color='#FF4040')
+        count_axis.set_ylabel("Lesions", color='#A0A0A0')
+        volume_axis.set_xticks(positions)
+        volume_axis.set_xticklabels(labels, rotation=45, ha='right', fontsize=7)
+        for axis in (volume_axis, count_axis):
+            axis.set_facecolor('#000000')
+            axis.tick_params(colors='white', labelsize=7)
+            for spine in axis.spines.values():
+                spine.set_color('#404040')
+        self.lesion_figure.tight_layout()
+        self.lesion_canvas.draw_idle()
+
+    def export_lesion_csv(self):
+        """Write the lesion load series to CSV (session summary plus a per-lesion file)."""
+        if self.lesion_result is None:
+            return
+        subject_dir = os.path.dirname(os.path.dirname(os.path.abspath(self.tumor_files[0])))
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Export Lesion Load", os.path.join(subject_dir, "lesion_load.csv"), "CSV files (*.csv)"
+        )
+        if not filename:
+            return
+        try:
+            session_csv, lesion_csv = write_lesion_csv(self.lesion_result, filename)
+            print(f"Lesion load saved to {session_csv} and {lesion_csv}")
+        except OSError as e:
+            print(f"Error saving lesion load: {str(e)}")
+            QMessageBox.warning(self, "Export Error", f"Could not save lesion load: {str(e)}")
+        
+    def export_video(self):
+        """Render the progression offscreen into a video or PNG sequence chosen by the user."""
+        if not self.tumor_files or self.export_future is not None:
+            return
+        subject_dir = os.path.dirname(os.path.dirname(os.path.abspath(self.tumor_files[0])))
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Export Progression", os.path.join(subject_dir, "progression.ogv"),
+            "Ogg video (*.ogv);;MP4 video, requires ffmpeg (*.mp4);;PNG sequence (*.png)"
+        )
+        if not filename:
+            return
         
-        # Reset camera to show full volume
-        self.reset_camera()
+        # Same view, regions and pace as on screen
+        timepoint_rate = 1000 / self.frame_delay
+        options = {
+            'size': DEFAULT_EXPORT_SIZE,
+            'fps': EXPORT_FPS,
+            'frames_per_timepoint': max(1, round(EXPORT_FPS / timepoint_rate)),
+            'orbit_degrees': 360 if self.orbit_check.isChecked() else 0,
+            'camera': camera_settings(self.camera) if self.camera_initialized else None,
+            'visible': self.visible_regions(),
+            'opacity': self.label_opacity,
+            'cache_dir': self.frames.cache.cache_dir if self.frames.cache else None,
+        }
+        self.export_progress = (0, len(self.tumor_files) * options['frames_per_timepoint'])
+        self.export_future = self.export_executor.submit(self.run_export, filename, options)
+        self.export_video_button.setEnabled(False)
+        self.export_video_button.setText("Exporting...")
+        if not self.progress_timer.isActive():
+            self.progress_timer.start()
+
+    def run_export(self, filename, options):
+        """Worker: export the progression and report where it went."""
+        def progress(written, total):
+            self.export_progress = (written, total)
+        
+        start = time.perf_counter()
+        output = export_progression(self.tumor_files, filename, progress=progress, **options)
+        print(f"Progression exported to {output} ({self.export_progress[1]} frames "
+              f"in {time.perf_counter() - start:.1f} s)")
+        return output
+
+    def poll_export(self):
+        """Show export progress and report the outcome once the export is done."""
+        if not self.export_future.done():
+            written, total = self.export_progress
+            self.export_video_button.setText(f"Exporting {written}/{total}")
+            return
         
+        future, self.export_future = self.export_future, None
+        self.export_video_button.setEnabled(True)
+        self.export_video_button.setText("Export Video")
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error exporting progression: {str(e)}")
+            QMessageBox.warning(self, "Export Error", f"Could not export progression: {str(e)}")
+
     def reset_camera(self):
         """Reset camera to show full volume."""
-        if self.stable_volumes:
-            volume = self.stable_volumes[0]
-            bounds = volume.GetBounds()
-            
-            # Set up camera for optimal viewing
-            self.camera.SetViewUp(0, 0, -1)
-            center = [
-                (bounds[1] + bounds[0])/2,
-                (bounds[3] + bounds[2])/2,
-                (bounds[5] + bounds[4])/2
-            ]
-            position = [
-                center[0],
-                bounds[3] + (bounds[3] - bounds[2]),
-                center[2]
-            ]
-            
-            self.camera.SetPosition(position)
-            self.camera.SetFocalPoint(center)
+        if self.visible_frame is not None:
+            aim_camera(self.camera, self.frame_volumes[self.visible_frame].GetBounds())
             self.renderer.ResetCamera()
             self.window.Render()
 
     def show_frame(self, frame_index):
-        """Display the specified animation frame with difference visualization."""
-        # Remove current volumes
-        self.renderer.RemoveAllViewProps()
-        
-        # Add volumes for current frame if they exist and are visible
-        if self.stable_volumes[frame_index] and self.show_stable:
-            volume = self.stable_volumes[frame_index]
-            volume.SetProperty(self.create_volume_property((1.0, 0.5, 1.0)))  # Magenta
-            self.renderer.AddVolume(volume)
-            
-        if frame_index > 0:  # Show growth/reduction only for frames after first
-            if self.growth_volumes[frame_index] and self.show_growth:
-                volume = self.growth_volumes[frame_index]
-                volume.SetProperty(self.create_volume_property((1.0, 0.25, 0.25)))  # Red
-                self.renderer.AddVolume(volume)
-                
-            if self.reduction_volumes[frame_index] and self.show_reduction:
-                volume = self.reduction_volumes[frame_index]
-                volume.SetProperty(self.create_volume_property((0.25, 0.5, 1.0)))  # Blue
-                self.renderer.AddVolume(volume)
+        """
+        Display the specified animation frame with difference visualization.
+        
+        A frame that is still being computed is shown by poll_frames once it is done.
+        """
+        if not self.tumor_files:
+            return
         
         self.current_frame = frame_index
-        self.frame_label.setText(f"Timepoint: {frame_index + 1}/{len(self.tumor_files)}")
+        self.frame_label.setText(self.frame_text(frame_index))
+        timepoint, _ = self.frames.frame_time(frame_index)
+        if self.lesion_table.rowCount() > timepoint:
+            self.lesion_table.selectRow(timepoint)
+        
+        image = self.frames.peek(frame_index)
+        if image is None:
+            self.frames.schedule([frame_index])
+            self.waiting_frame = frame_index
+            self.frame_label.setText(f"{self.frame_text(frame_index)} (computing...)")
+            if not self.progress_timer.isActive():
+                self.progress_timer.start()
+            return
+        self.waiting_frame = None
+        
+        start = time.perf_counter()
+        volume = self.get_frame_volume(frame_index, image)
+        if self.visible_frame in self.frame_volumes and self.visible_frame != frame_index:
+            self.frame_volumes[self.visible_frame].SetVisibility(False)
+        volume.SetVisibility(True)
+        self.visible_frame = frame_index
+        
+        # Compute the upcoming frames while this one is on screen
+        if self.is_playing:
+            self.frames.read_ahead(frame_index + 1, self.read_ahead_frames())
+        
+        if not self.camera_initialized:
+            self.camera_initialized = True
+            self.reset_camera()
         self.window.Render()
+        self.record_frame_time(time.perf_counter() - start)
+
+    def frame_text(self, frame_index):
+        """Describe a frame as its timepoint, or the pair of timepoints it interpolates between."""
+        timepoint, fraction = self.frames.frame_time(frame_index)
+        if fraction < 1.0:
+            return f"Timepoint: {timepoint}→{timepoint + 1}/{len(self.tumor_files)}"
+        return f"Timepoint: {timepoint + 1}/{len(self.tumor_files)}"
+
+    def read_ahead_frames(self):
+        """Return how many frames to compute ahead during playback, covering read_ahead timepoints."""
+        return self.read_ahead * (self.frames.substeps + 1)
+
+    def frame_interval(self):
+        """Return the playback timer interval; intermediate frames share the time of a timepoint."""
+        return max(1, self.frame_delay // (self.frames.substeps + 1))
+
+    def toggle_interpolation(self, checked):
+        """Switch between showing the timepoints only and morphing between them."""
+        self.set_interpolation_steps(self.interpolation_steps if checked else 0)
+
+    def set_interpolation_steps(self, steps):
+        """
+        Rebuild the frame sequence with a number of interpolated frames between timepoints.
+        
+        The disk cache and the shown timepoint carry over; frames in memory are recomputed.
+        """
+        if steps == self.frames.substeps:
+            return
+        # Stay on the timepoint nearest to the shown frame
+        timepoint, fraction = self.frames.frame_time(self.current_frame)
+        if fraction < 0.5:
+            timepoint -= 1
+        
+        self.frames.shutdown()
+        for volume in self.frame_volumes.values():
+            self.renderer.RemoveVolume(volume)
+        self.frame_volumes.clear()
+        self.visible_frame = None
+        self.waiting_frame = None
+        
+        self.frames = ProgressionFrames(self.tumor_files, max_frames=self.frames.max_frames,
+                                        workers=self.frame_workers, cache=self.frames.cache,
+                                        substeps=steps)
+        self.precompute_frames = []
+        
+        self.frame_slider.blockSignals(True)
+        self.frame_slider.setMaximum(len(self.frames) - 1)
+        self.frame_slider.setValue(self.frames.keyframe(timepoint))
+        self.frame_slider.blockSignals(False)
+        self.show_frame(self.frames.keyframe(timepoint))
+        self.frames.schedule_supports(timepoint + 1)
+        if self.is_playing:
+            self.frames.read_ahead(self.current_frame + 1, self.read_ahead_frames())
+            self.timer.setInterval(self.frame_interval())
+
+    def get_frame_volume(self, frame_index, image):
+        """Return the volume showing a frame, creating it on first display."""
+        volume = self.frame_volumes.get(frame_index)
+        if volume is None:
+            mapper = create_volume_mapper()
+            volume = vtk.vtkVolume()
+            volume.SetMapper(mapper)
+            volume.SetProperty(self.volume_property)
+            volume.SetVisibility(False)
+            self.renderer.AddVolume(volume)
+            self.frame_volumes[frame_index] = volume
+            
+        if volume.GetMapper().GetInput() is not image:
+            volume.GetMapper().SetInputData(image)
+            
+        # Volumes of frames evicted from the frame cache release their textures
+        for index in [i for i in self.frame_volumes if i != frame_index and not self.frames.is_ready(i)]:
+            self.renderer.RemoveVolume(self.frame_volumes.pop(index))
+            if self.visible_frame == index:
+                self.visible_frame = None
+        return volume
+
+    def record_frame_time(self, seconds):
+        """Record how long a frame switch took and update the frame rate display during playback."""
+        self.render_times.append(seconds)
+        self.frame_timestamps.append(time.perf_counter())
+        if self.is_playing:
+            stats = self.frame_stats()
+            self.fps_label.setText(
+                f"{stats['fps']:.1f} fps (target {1000 / self.frame_interval():.0f}), "
+                f"{stats['render_ms']:.1f} ms/frame"
+            )
+
+    def frame_stats(self):
+        """
+        Summarise the most recent frames.
+        
+        Returns:
+            dict: 'render_ms' (mean time to switch and render a frame),
+            'max_render_ms' and 'fps' (achieved frame rate, 0 if unknown)
+        """
+        times = list(self.render_times)
+        stamps = list(self.frame_timestamps)
+        elapsed = stamps[-1] - stamps[0] if len(stamps) > 1 else 0
+        return {
+            'render_ms': 1000 * sum(times) / len(times) if times else 0.0,
+            'max_render_ms': 1000 * max(times) if times else 0.0,
+            'fps': (len(stamps) - 1) / elapsed if elapsed > 0 else 0.0,
+        }
 
     def toggle_visibility(self, region_type, visible):
         """Toggle visibility of specific region type."""
@@ -407,8 +773,9 @@ class TumorAnimationWindow(QMainWindow):
         elif region_type == 'reduction':
             self.show_reduction = visible
             
-        # Update current frame to reflect visibility changes
-        self.show_frame(self.current_frame)
+        # Hidden regions only change the opacity transfer function
+        self.update_label_opacity()
+        self.window.Render()
 
     def on_slider_change(self, value):
         """Handle manual frame selection."""
@@ -419,20 +786,31 @@ class TumorAnimationWindow(QMainWindow):
         self.is_playing = checked
         if checked:
             self.play_button.setText("Pause")
-            self.timer.start(self.frame_delay)
+            self.render_times.clear()
+            self.frame_timestamps.clear()
+            self.frames.read_ahead(self.current_frame + 1, self.read_ahead_frames())
+            self.timer.start(self.frame_interval())
         else:
             self.play_button.setText("Play")
             self.timer.stop()
+            stats = self.frame_stats()
+            if stats['fps']:
+                print(f"Playback: {stats['fps']:.1f} fps (target {1000 / self.frame_interval():.0f}), "
+                      f"{stats['render_ms']:.1f} ms mean / {stats['max_render_ms']:.1f} ms max per frame")
 
     def update_speed(self, value):
         """Update animation playback speed."""
         self.frame_delay = 1000 // value  # Convert slider value to milliseconds
         if self.is_playing:
-            self.timer.setInterval(self.frame_delay)
+            self.timer.setInterval(self.frame_interval())
 
     def next_frame(self):
         """Advance to next frame in animation sequence."""
-        next_frame = (self.current_frame + 1) % len(self.tumor_files)
+        # Hold playback on a frame that is still being computed
+        if self.waiting_frame is not None:
+            return
+        
+        next_frame = (self.current_frame + 1) % len(self.frames)
         self.frame_slider.setValue(next_frame)
         
         # Stop at end of sequence
@@ -443,20 +821,29 @@ class TumorAnimationWindow(QMainWindow):
         """Properly clean up VTK resources."""
         if self.is_playing:
             self.toggle_playback(False)
-            
-        # Clean up all volumes
-        self.renderer.RemoveAllViewProps()
         
-        self.stable_volumes.clear()
-        self.growth_volumes.clear()
-        self.reduction_volumes.clear()
+        # Outstanding frame computations are cancelled, not finished in the background
+        self.progress_timer.stop()
+        self.frames.shutdown()
+        self.lesion_stop.set()
+        if self.lesion_future is not None:
+            self.lesion_future.cancel()
+        self.lesion_executor.shutdown(wait=False)
+        # A running export finishes in the background and prints where it went
+        self.export_executor.shutdown(wait=False)
+        
+        # Clean up all volumes
+        if self.renderer is not None:
+            self.renderer.RemoveAllViewProps()
+        self.frame_volumes.clear()
+        self.visible_frame = None
         
         # Clean up VTK widget and renderer
-        if hasattr(self, 'interactor'):
+        if getattr(self, 'interactor', None) is not None:
             self.interactor.GetRenderWindow().Finalize()
             self.interactor.TerminateApp()
             
-        if hasattr(self, 'vtk_widget'):
+        if getattr(self, 'vtk_widget', None) is not None:
             self.vtk_widget.close()
             self.vtk_widget.deleteLater()
             
@@ -3,7 +3,7 @@ from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QGridLayout,
     QLabel, QGroupBox, QRadioButton, QPushButton, QSlider,
     QCheckBox, QPlainTextEdit, QFrame, QSizePolicy, QScrollArea,
-    QApplication, QToolButton
+    QApplication, QToolButton, QComboBox
 )
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont, QPalette, QColor
@@ -133,6 +133,7 @@ class MainWindowUI(QMainWindow):
         control_panel.setMinimumWidth(300)
         layout = QVBoxLayout(control_panel)
         layout.setSpacing(15)
+        self.control_layout = layout  # Lets subclasses add their own control groups
 
         # Add all control groups
         self.addCaseInfo(layout)
@@ -470,6 +471,41 @@ class MainWindowUI(QMainWindow):
         thickness_controls.addWidget(self.thickness_slider)
         thickness_controls.addWidget(self.thickness_value)
         thickness_layout.addLayout(thickness_controls)
+        
+        # Ray cast the cropped volume, or project the slab into a 2D image
+        projection_controls = QHBoxLayout()
+        projection_label = QLabel("Slab:")
+        projection_label.setStyleSheet("color: white; font-size: 11pt;")
+        self.slab_projection_combo = QComboBox()
+        for text, projection in [("Volume rendering", None), ("Mean projection", 'mean'),
+                                 ("Maximum projection (MIP)", 'max'),
+                                 ("Minimum projection (MinIP)", 'min')]:
+            self.slab_projection_combo.addItem(text, projection)
+        self.slab_projection_combo.setStyleSheet("""
+            QComboBox {
+                background-color: #404040;
+                color: white;
+                border: none;
+                padding: 4px 8px;
+                font-size: 11pt;
+                border-radius: 4px;
+            }
+            QComboBox QAbstractItemView {
+                background-color: #404040;
+                color: white;
+                selection-background-color: #0078D7;
+            }
+        """)
+        projection_controls.addWidget(projection_label)
+        projection_controls.addWidget(self.slab_projection_combo, 1)
+        thickness_layout.addLayout(projection_controls)
+        
+        # Minimum intensity projection of SWI magnitude for central vein sign reading
+        self.swi_minip_checkbox = QCheckBox("SWI minIP")
+        self.swi_minip_checkbox.setStyleSheet("color: white; font-size: 11pt;")
+        self.swi_minip_checkbox.setToolTip(
+            "Show the SWI magnitude slab as a minimum intensity projection")
+        thickness_layout.addWidget(self.swi_minip_checkbox)
         layout.addWidget(thickness_group)
 
         # Connect the value change signal
@@ -0,0 +1,195 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import vtk
+
+
+def read_nifti_image(filename):
+    """
+    Decode a NIfTI file into a standalone vtkImageData.
+
+    The output is shallow-copied so the reader (and its pipeline) can be
+    released while the decoded voxels stay alive.
+    """
+    reader = vtk.vtkNIFTIImageReader()
+    reader.SetFileName(filename)
+    reader.Update()
+
+    image = vtk.vtkImageData()
+    image.ShallowCopy(reader.GetOutput())
+    return image
+
+
+def image_size_bytes(image):
+    """Return the memory held by a vtkImageData in bytes."""
+    return image.GetActualMemorySize() * 1024
+
+
+def file_key(filename):
+    """
+    Build a cache key that changes whenever the file on disk changes.
+
+    Returns:
+        tuple: (absolute path, modification time in ns, size in bytes)
+    """
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class VolumeCache:
+    """
+    Process-wide cache of decoded volumes shared by all viewports and windows.
+
+    Volumes are keyed by path plus mtime/size so an edited file is re-read,
+    and evicted least-recently-used first once the byte budget is exceeded.
+    Concurrent requests for the same file wait for a single decode. When a
+    disk cache is attached, misses are served from it instead of the .nii.gz.
+    """
+
+    def __init__(self, budget_mb=3072):
+        """
+        Args:
+            budget_mb (float): Upper bound for cached voxel data in MB
+        """
+        self.budget = int(budget_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (vtkImageData, bytes)
+        self._loading = {}             # key -> threading.Event
+        self.disk_cache = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, filename):
+        """
+        Return the decoded volume for a file, reading it on first use.
+
+        Args:
+            filename (str): Path to a NIfTI file
+
+        Returns:
+            vtkImageData: Shared decoded volume (treat as read-only)
+        """
+        key = file_key(filename)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+
+                event = self._loading.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._loading[key] = event
+                    self.misses += 1
+                    break
+
+            # Another thread is decoding this file; use its result
+            event.wait()
+
+        try:
+            if self.disk_cache is not None:
+                image = self.disk_cache.load(key[0])
+            else:
+                image = read_nifti_image(key[0])
+            self._insert(key, image)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+
+        return image
+
+    def _insert(self, key, image):
+        """Add a decoded volume, dropping stale versions and evicting to the budget."""
+        size = image_size_bytes(image)
+
+        with self._lock:
+            # A file that changed on disk leaves its old version behind
+            for old_key in [k for k in self._entries if k[0] == key[0]]:
+                del self._entries[old_key]
+
+            if size > self.budget:
+                return
+
+            self._entries[key] = (image, size)
+            while self._total_bytes() > self.budget:
+                self._entries.popitem(last=False)
+
+    def _total_bytes(self):
+        return sum(size for _, size in self._entries.values())
+
+    def set_disk_cache(self, disk_cache):
+        """Attach a DiskVolumeCache used to serve misses (None to detach)."""
+        self.disk_cache = disk_cache
+
+    def set_budget(self, budget_mb):
+        """Change the byte budget, evicting immediately if it shrank."""
+        with self._lock:
+            self.budget = int(budget_mb * 1024 * 1024)
+            while self._entries and self._total_bytes() > self.budget:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'memory_mb': self._total_bytes() / (1024 * 1024),
+            }
+
+    def clear(self):
+        """Drop all cached volumes."""
+        with self._lock:
+            self._entries.clear()
+
+
+_volume_cache = VolumeCache()
+
+
+def get_volume_cache():
+    """Return the process-wide volume cache."""
+    return _volume_cache
+
+
+def load_volume(filename):
+    """Return the decoded volume for a file through the process-wide cache."""
+    return _volume_cache.get(filename)
+
+
+def default_load_workers(file_count):
+    """Return a worker count that decodes every file at once when cores allow."""
+    return max(1, min(file_count, os.cpu_count() or 1))
+
+
+def load_volumes(filenames, max_workers=None):
+    """
+    Decode several volumes concurrently through the process-wide cache.
+
+    Gzip inflation and the VTK reader release the GIL, so a thread pool lets
+    the total load time approach that of the slowest single file.
+
+    Args:
+        filenames (list): Paths to NIfTI files
+        max_workers (int): Number of decode threads (default: one per file, capped at CPU count)
+
+    Returns:
+        dict: Mapping of file path to vtkImageData
+    """
+    filenames = list(dict.fromkeys(filenames))
+    if max_workers is None:
+        max_workers = default_load_workers(len(filenames))
+
+    if max_workers <= 1 or len(filenames) <= 1:
+        return {path: _volume_cache.get(path) for path in filenames}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="volume-load") as pool:
+        images = pool.map(_volume_cache.get, filenames)
+        return dict(zip(filenames, images))
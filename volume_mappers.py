@@ -0,0 +1,121 @@
+import os
+
+import vtk
+
+# 'gpu': OpenGL ray casting; 'smart': GPU where supported, CPU ray casting otherwise;
+# 'cpu': multi-threaded fixed-point ray casting; 'slab': CPU ray casting for 3D volumes,
+# with the MRI views starting in 2D slab projection mode
+MAPPER_BACKENDS = ['gpu', 'smart', 'cpu', 'slab']
+DEFAULT_MAPPER_BACKEND = 'gpu'
+
+# Backend of offscreen rendering (batch snapshots, benchmark suite) when none is chosen;
+# render nodes and CI machines rarely have a GPU, and emulating one is far slower
+OFFSCREEN_MAPPER_BACKEND = 'cpu'
+
+# Projection the MRI views start with under the 'slab' backend
+SLAB_BACKEND_PROJECTION = 'mean'
+
+# Environment variables giving the defaults, e.g. on GPU-less render nodes and CI machines
+MAPPER_BACKEND_ENV = 'MRI_VIEWER_MAPPER'
+MAPPER_THREADS_ENV = 'MRI_VIEWER_RENDER_THREADS'
+
+
+class VolumeMapperFactory:
+    """
+    Creates the volume mappers of the MRI views, mask overlays and tumor animation.
+
+    The backend and the number of CPU ray casting threads are process-wide
+    settings, taken from MRI_VIEWER_MAPPER and MRI_VIEWER_RENDER_THREADS
+    when set and overridden by the command line. Every backend supports
+    the cropping the slab display relies on.
+    """
+
+    def __init__(self, backend=DEFAULT_MAPPER_BACKEND, threads=None):
+        """
+        Args:
+            backend (str): One of MAPPER_BACKENDS
+            threads (int): CPU ray casting threads (default: VTK's choice, one per core)
+        """
+        self.configure(backend, threads)
+
+    def configure(self, backend=DEFAULT_MAPPER_BACKEND, threads=None):
+        """
+        Change the backend of mappers created from now on.
+
+        Raises:
+            ValueError: If the backend is unknown or threads is not positive
+        """
+        if backend not in MAPPER_BACKENDS:
+            raise ValueError(f"Unknown mapper backend '{backend}', choose from {', '.join(MAPPER_BACKENDS)}")
+        if threads is not None and threads < 1:
+            raise ValueError(f"Render threads must be at least 1: {threads}")
+        self.backend = backend
+        self.threads = threads
+        if threads:
+            # Also caps the CPU fallback of the smart mapper and other threaded VTK filters
+            vtk.vtkMultiThreader.SetGlobalMaximumNumberOfThreads(threads)
+
+    @property
+    def slab_projection(self):
+        """Slab projection the MRI views start with, None to ray cast them."""
+        return SLAB_BACKEND_PROJECTION if self.backend == 'slab' else None
+
+    def create(self):
+        """Return a new volume mapper of the configured backend."""
+        if self.backend == 'gpu':
+            return vtk.vtkGPUVolumeRayCastMapper()
+        if self.backend == 'smart':
+            mapper = vtk.vtkSmartVolumeMapper()
+            mapper.SetRequestedRenderModeToDefault()
+            return mapper
+        mapper = vtk.vtkFixedPointVolumeRayCastMapper()
+        if self.threads:
+            mapper.SetNumberOfThreads(self.threads)
+        return mapper
+
+    def describe(self):
+        """Return a short description such as 'cpu (4 threads)'."""
+        if self.backend == 'gpu':
+            return self.backend
+        threads = self.threads or vtk.vtkMultiThreader.GetGlobalDefaultNumberOfThreads()
+        return f"{self.backend} ({threads} threads)"
+
+
+def _factory_from_environment():
+    """Build the process-wide factory from the environment, ignoring invalid values."""
+    backend = os.environ.get(MAPPER_BACKEND_ENV, DEFAULT_MAPPER_BACKEND).strip().lower()
+    threads = os.environ.get(MAPPER_THREADS_ENV)
+    try:
+        return VolumeMapperFactory(backend, int(threads) if threads else None)
+    except ValueError as e:
+        print(f"Warning: Ignoring mapper settings from the environment - {str(e)}")
+        return VolumeMapperFactory()
+
+
+_mapper_factory = _factory_from_environment()
+
+
+def offscreen_mapper_backend(backend=None):
+    """
+    Return the backend of offscreen rendering.
+
+    Args:
+        backend (str): Backend chosen on the command line, if any
+
+    Returns:
+        str: backend if given, else a valid MRI_VIEWER_MAPPER, else OFFSCREEN_MAPPER_BACKEND
+    """
+    if backend:
+        return backend
+    environment = os.environ.get(MAPPER_BACKEND_ENV, '').strip().lower()
+    return environment if environment in MAPPER_BACKENDS else OFFSCREEN_MAPPER_BACKEND
+
+
+def get_mapper_factory():
+    """Return the process-wide volume mapper factory."""
+    return _mapper_factory
+
+
+def create_volume_mapper():
+    """Return a new volume mapper of the process-wide backend."""
+    return _mapper_factory.create()
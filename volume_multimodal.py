@@ -1,6 +1,10 @@
 import vtk
 import math
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+from volume_cache import load_volume
+from intensity_stats import get_stats_engine
+from slab_renderer import SlabRenderer, SLAB_PRECOMPUTE_RADIUS
+from volume_mappers import create_volume_mapper
 
 class VolumePropertyManager:
     """
@@ -119,20 +123,35 @@ class VolumePropertyManager:
 
 
 class VolumeRenderer:
-    """Handles 3D volume rendering of NIFTI images with optimized visualization parameters."""
+    """
+    Handles 3D volume rendering of NIFTI images with optimized visualization parameters.
+    
+    Renders into a QVTKRenderWindowInteractor placed in the given frame, or into an
+    offscreen render window of offscreen_size when no frame is given (batch mode).
+    """
     
-    def __init__(self, viewer_instance, frame, layout, filename, show_bounds=False, modality=None):
+    def __init__(self, viewer_instance, frame, layout, filename, show_bounds=False, modality=None,
+                 image_data=None, offscreen_size=(512, 512)):
         self.modality = modality
         self.viewer = viewer_instance
         self.frame = frame
         self.layout = layout
         self.filename = filename
         self.show_bounds = show_bounds
+        self.image_data = image_data  # Pre-decoded volume, read from filename if None
+        self.offscreen_size = offscreen_size
+        self.outline = None
+        self.slab = None              # SlabRenderer, created when a slab projection is first used
+        self.slab_projection = None   # 'mean', 'max' or 'min' to show the slab in 2D, None to ray cast
+        self.mri_visible = True
         
         self.property_manager = VolumePropertyManager(self.modality)
         
-        self._clear_layout()
-        self._setup_vtk_widget()
+        if self.frame is None:
+            self._setup_offscreen_window()
+        else:
+            self._clear_layout()
+            self._setup_vtk_widget()
         self._create_pipeline()
         
     def _clear_layout(self):
@@ -158,19 +177,32 @@ class VolumeRenderer:
         
         self.interactor = self.window.GetInteractor()
         
+    def _setup_offscreen_window(self):
+        """Create an offscreen render window that needs no display."""
+        self.vtk_widget = None
+        
+        self.renderer = vtk.vtkRenderer()
+        self.renderer.SetBackground(0.0, 0.0, 0.0)
+        
+        self.window = vtk.vtkRenderWindow()
+        self.window.SetOffScreenRendering(1)
+        self.window.SetSize(*self.offscreen_size)
+        self.window.AddRenderer(self.renderer)
+        
+        self.interactor = None
+        
     def _create_pipeline(self):
         """Create complete volume rendering pipeline with optimal visualization."""
         try:
-            self.reader = vtk.vtkNIFTIImageReader()
-            self.reader.SetFileName(self.filename)
-            self.reader.Update()
+            if self.image_data is None:
+                self.image_data = load_volume(self.filename)
             
             if self.modality == 'swi_phase':
                 self._setup_phase_pipeline()
             else:
                 self._setup_standard_pipeline()
             
-            bounds = self.reader.GetOutput().GetBounds()
+            bounds = self.image_data.GetBounds()
             current_thickness = self.viewer.SlicePlanes.thickness if hasattr(self.viewer, 'SlicePlanes') else 10.0
             
             volume_property = self.property_manager.create_volume_property(current_thickness)
@@ -195,58 +227,78 @@ class VolumeRenderer:
         except Exception as e:
             raise RuntimeError(f"Error creating volume pipeline: {str(e)}")
             
+    def set_image(self, filename, image_data=None):
+        """
+        Show another volume of the same modality in the existing pipeline.
+        
+        The widget, render window, mapper, volume and property objects are kept;
+        only the mapper input and the transfer-function ranges are replaced.
+        
+        Args:
+            filename (str): Path to the new NIFTI file
+            image_data (vtkImageData): Pre-decoded volume, read from filename if None
+            
+        Returns:
+            tuple: Bounds of the new volume
+        """
+        self.filename = filename
+        self.image_data = image_data if image_data is not None else load_volume(filename)
+        
+        if self.modality == 'swi_phase':
+            self.normalizer.SetInputData(self.image_data)
+            self.normalizer.Update()
+        else:
+            self._update_optimal_range()
+            self.volume_mapper.SetInputData(self.image_data)
+            
+        if self.outline is not None:
+            self.outline.SetInputData(self.image_data)
+            
+        if self.slab is not None:
+            self.slab.set_input(self.image_data)
+            
+        # Rebuilds the transfer functions of the existing volume property in place
+        current_thickness = self.viewer.SlicePlanes.thickness if hasattr(self.viewer, 'SlicePlanes') else 10.0
+        self.property_manager.create_volume_property(current_thickness)
+        
+        return self.image_data.GetBounds()
+        
+    def _update_optimal_range(self):
+        """Set the transfer-function range of the current volume."""
+        self.property_manager.set_optimal_range(*self._calculate_optimal_range())
+        
     def _setup_standard_pipeline(self):
         """Set up pipeline for standard modalities using optimal range."""
-        optimal_range = self._calculate_optimal_range()
-        self.property_manager.set_optimal_range(*optimal_range)
+        self._update_optimal_range()
         
-        self.volume_mapper = vtk.vtkGPUVolumeRayCastMapper()
-        self.volume_mapper.SetInputConnection(self.reader.GetOutputPort())
+        self.volume_mapper = create_volume_mapper()
+        self.volume_mapper.SetInputData(self.image_data)
         self.volume_mapper.CroppingOn()
         self.volume_mapper.SetCroppingRegionFlags(vtk.VTK_CROP_SUBVOLUME)
         
     def _setup_phase_pipeline(self):
         """Set up specialized pipeline for SWI phase data."""
-        normalizer = vtk.vtkImageShiftScale()
-        normalizer.SetInputConnection(self.reader.GetOutputPort())
-        normalizer.SetOutputScalarTypeToFloat()
-        normalizer.SetShift(math.pi)
-        normalizer.SetScale(1.0/(2.0 * math.pi))
-        normalizer.Update()
-        
-        self.volume_mapper = vtk.vtkGPUVolumeRayCastMapper()
-        self.volume_mapper.SetInputConnection(normalizer.GetOutputPort())
+        self.normalizer = vtk.vtkImageShiftScale()
+        self.normalizer.SetInputData(self.image_data)
+        self.normalizer.SetOutputScalarTypeToFloat()
+        self.normalizer.SetShift(math.pi)
+        self.normalizer.SetScale(1.0/(2.0 * math.pi))
+        self.normalizer.Update()
+        
+        self.volume_mapper = create_volume_mapper()
+        self.volume_mapper.SetInputConnection(self.normalizer.GetOutputPort())
         self.volume_mapper.CroppingOn()
         self.volume_mapper.SetCroppingRegionFlags(vtk.VTK_CROP_SUBVOLUME)
         
     def _calculate_optimal_range(self):
-        """Calculate optimal intensity range using percentile analysis."""
-        data = self.reader.GetOutput()
-        histogram = vtk.vtkImageAccumulate()
-        histogram.SetInputData(data)
-        histogram.SetComponentExtent(0, 255, 0, 0, 0, 0)
-        
-        scalar_range = data.GetScalarRange()
-        histogram.SetComponentOrigin(scalar_range[0], 0, 0)
-        histogram.SetComponentSpacing((scalar_range[1] - scalar_range[0])/255, 0, 0)
-        histogram.Update()
-        
-        hist_output = histogram.GetOutput()
-        total_voxels = sum(hist_output.GetScalarComponentAsFloat(i, 0, 0, 0) for i in range(256))
-        
-        cumsum = 0
-        p1_value = scalar_range[0]
-        p99_value = scalar_range[1]
-        
-        for i in range(256):
-            cumsum += hist_output.GetScalarComponentAsFloat(i, 0, 0, 0)
-            if cumsum >= total_voxels * 0.01 and p1_value == scalar_range[0]:
-                p1_value = scalar_range[0] + (i/255.0) * (scalar_range[1] - scalar_range[0])
-            if cumsum >= total_voxels * 0.99:
-                p99_value = scalar_range[0] + (i/255.0) * (scalar_range[1] - scalar_range[0])
-                break
-                
-        return p1_value, p99_value
+        """
+        Calculate optimal intensity range using percentile analysis.
+        
+        Statistics come from the process-wide engine, which reuses results
+        memoized in memory or in the subject manifest from an earlier load.
+        """
+        manifest = getattr(self.viewer, 'manifest', None)
+        return get_stats_engine().optimal_range(self.filename, self.image_data, manifest)
         
     def _ensure_initial_cropping(self):
         """Set initial cropping planes."""
@@ -258,11 +310,11 @@ class VolumeRenderer:
                 
     def _add_bounds_outline(self):
         """Add white outline showing volume bounds."""
-        outline = vtk.vtkOutlineFilter()
-        outline.SetInputConnection(self.reader.GetOutputPort())
+        self.outline = vtk.vtkOutlineFilter()
+        self.outline.SetInputData(self.image_data)
         
         mapper = vtk.vtkPolyDataMapper()
-        mapper.SetInputConnection(outline.GetOutputPort())
+        mapper.SetInputConnection(self.outline.GetOutputPort())
         
         actor = vtk.vtkActor()
         actor.SetMapper(mapper)
@@ -275,7 +327,59 @@ class VolumeRenderer:
         if hasattr(self, 'volume') and self.modality:
             new_property = self.property_manager.create_volume_property(thickness)
             self.volume.SetProperty(new_property)
-            self.window.Render()
+            # Drawn by the viewer's render scheduler; headless scenes render when snapshotting
+            request_render = getattr(self.viewer, 'request_render', None)
+            if request_render:
+                request_render(self.window)
+        
+    def set_slab_projection(self, projection):
+        """
+        Show the slab as a 2D projection instead of ray casting the cropped volume.
+        
+        Args:
+            projection (str): 'mean', 'max' or 'min', or None for volume rendering
+        """
+        self.slab_projection = projection
+        if projection and self.slab is None:
+            self.slab = SlabRenderer(self.renderer)
+            self.slab.set_input(self.image_data)
+        self.set_mri_visible(self.mri_visible)
+        self.update_slab()
+        
+    def set_mri_visible(self, visible):
+        """Show or hide the MRI, whether it is ray cast or projected."""
+        self.mri_visible = visible
+        self.volume.SetVisibility(visible and not self.slab_projection)
+        if self.slab is not None:
+            self.slab.actor.SetVisibility(visible and bool(self.slab_projection))
+            
+    def update_slab(self):
+        """Project the current slab of the viewer's slice planes, if in slab projection mode."""
+        planes = getattr(self.viewer, 'SlicePlanes', None)
+        if not self.slab_projection or planes is None or not planes.global_bounds:
+            return
+        # Transfer functions are rebuilt with the intensity range; follow the current one
+        self.slab.set_lookup_table(self.volume.GetProperty().GetRGBTransferFunction())
+        self.slab.show(planes.slice_direction, planes.current_slice, planes.thickness,
+                       self.slab_projection)
+        
+        # Neighbouring slabs are projected ahead once the viewer is idle
+        schedule = getattr(self.viewer, 'schedule_slab_precompute', None)
+        if schedule:
+            schedule()
+            
+    def precompute_slabs(self, radius=SLAB_PRECOMPUTE_RADIUS):
+        """
+        Project the slabs up to radius scroll steps around the current one.
+        
+        Returns:
+            int: Number of slabs projected (0 if all were cached or not in slab mode)
+        """
+        planes = getattr(self.viewer, 'SlicePlanes', None)
+        if not self.slab_projection or planes is None or not planes.global_bounds:
+            return 0
+        return self.slab.precompute(planes.slice_direction, planes.neighbouringSlices(radius),
+                                    planes.thickness, self.slab_projection)
         
     def get_window_and_interactor(self):
         """Return render window, interactor, and volume."""